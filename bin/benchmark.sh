@@ -0,0 +1,8 @@
+#!/bin/bash
+
+main() {
+    cd "$(dirname "$0")"/..
+    poetry run python -m pytch.benchmark "$@"
+}
+
+main "$@"
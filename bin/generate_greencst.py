@@ -15,22 +15,139 @@ PREAMBLE = """\
 
 Run `make` to re-generate. Do not edit!
 \"\"\"
-from typing import List, Optional, Sequence, Union
+from typing import Any, List, Optional, Sequence, Union
 
 from .lexer import Token
 
 
 class Node:
+    # Large files have hundreds of thousands of nodes, so we don't give each of
+    # them a `__dict__`.
+    __slots__ = (
+        "_children",
+        "_first_present_child",
+        "_last_present_child",
+        "_full_width",
+        "_leading_width",
+        "_trailing_width",
+        "_width",
+        "_child_offsets",
+    )
+
+    child_names: Sequence[str] = []
+
+    _child_offsets: Sequence[int]
+    \"\"\"Set by the `__init__` of each subclass. See `child_offsets`.\"\"\"
+
     def __init__(
         self,
         children: Sequence[Union["Node", Optional["Token"]]],
     ) -> None:
         self._children = children
 
+        # Green nodes are immutable, so we compute their widths and boundary
+        # tokens once here, rather than re-walking the subtree every time
+        # they're asked for. The children have already done the same, so we
+        # only need to look at the immediate children.
+        self._first_present_child = self._find_present_child(children, first=True)
+        self._last_present_child = self._find_present_child(
+            list(reversed(children)), first=False
+        )
+        self._full_width = sum(
+            child.full_width if child is not None else 0
+            for child in children
+        )
+        if self._first_present_child is None:
+            self._leading_width = 0
+        else:
+            self._leading_width = self._first_present_child.leading_width
+        if self._last_present_child is None:
+            self._trailing_width = 0
+        else:
+            self._trailing_width = self._last_present_child.trailing_width
+        if not children:
+            self._width = 0
+        else:
+            self._width = (
+                self._full_width
+                - self._leading_width
+                - self._trailing_width
+            )
+
+    @staticmethod
+    def _find_present_child(
+        children: Sequence[Union["Node", Optional["Token"]]],
+        first: bool,
+    ) -> Optional["Token"]:
+        for child in children:
+            if child is None:
+                continue
+            if isinstance(child, Token):
+                if not child.is_dummy:
+                    return child
+            else:
+                if first:
+                    present_child = child.first_present_child
+                else:
+                    present_child = child.last_present_child
+                if present_child is not None:
+                    return present_child
+        return None
+
+    @staticmethod
+    def _get_child_offsets(
+        children: Sequence[
+            Union["Node", Optional["Token"], Optional[Sequence["Node"]]]
+        ],
+    ) -> Sequence[int]:
+        offsets = []
+        offset = 0
+        for child in children:
+            offsets.append(offset)
+            if child is None:
+                continue
+            elif isinstance(child, (Node, Token)):
+                offset += child.full_width
+            else:
+                offset += sum(element.full_width for element in child)
+        return tuple(offsets)
+
+    @staticmethod
+    def _get_element_offsets(
+        elements: Optional[Sequence["Node"]],
+        offset: int,
+    ) -> Sequence[int]:
+        offsets = []
+        if elements is not None:
+            for element in elements:
+                offsets.append(offset)
+                offset += element.full_width
+        return tuple(offsets)
+
     @property
     def children(self) -> Sequence[Union["Node", Optional["Token"]]]:
         return self._children
 
+    @property
+    def child_offsets(self) -> Sequence[int]:
+        \"\"\"The offset of each child in `child_names`, relative to the start of
+        this node.
+
+        This lets red nodes compute the offsets of their children without
+        looking at the preceding children.
+        \"\"\"
+        return self._child_offsets
+
+    def update(self, **kwargs: Any) -> "Node":
+        \"\"\"Create a copy of this node with the given children replaced.
+
+        The children which aren't replaced are shared with this node.
+        \"\"\"
+        for name in self.child_names:
+            if name not in kwargs:
+                kwargs[name] = getattr(self, name)
+        return self.__class__(**kwargs)
+
     @property
     def leading_text(self) -> str:
         first_child = self.first_present_child
@@ -78,63 +195,28 @@ class Node:
         )
 
     @property
-    def first_present_child(self) -> Optional[Union["Node", "Token"]]:
-        for child in self.children:
-            if child is None:
-                continue
-            if isinstance(child, Token):
-                if not child.is_dummy:
-                    return child
-            else:
-                child_first_present_child = child.first_present_child
-                if child_first_present_child is not None:
-                    return child_first_present_child
-        return None
+    def first_present_child(self) -> Optional["Token"]:
+        return self._first_present_child
 
     @property
-    def last_present_child(self) -> Optional[Union["Node", "Token"]]:
-        for child in reversed(self.children):
-            if child is None:
-                continue
-            if isinstance(child, Token):
-                if not child.is_dummy:
-                    return child
-            else:
-                child_last_present_child = child.last_present_child
-                if child_last_present_child is not None:
-                    return child_last_present_child
-        return None
+    def last_present_child(self) -> Optional["Token"]:
+        return self._last_present_child
 
     @property
     def leading_width(self) -> int:
-        child = self.first_present_child
-        if child is None:
-            return 0
-        return child.leading_width
+        return self._leading_width
 
     @property
     def trailing_width(self) -> int:
-        child = self.last_present_child
-        if child is None:
-            return 0
-        return child.trailing_width
+        return self._trailing_width
 
     @property
     def width(self) -> int:
-        if not self.children:
-            return 0
-        return (
-            self.full_width
-            - self.leading_width
-            - self.trailing_width
-        )
+        return self._width
 
     @property
     def full_width(self) -> int:
-        return sum(
-            child.full_width if child is not None else 0
-            for child in self.children
-        )
+        return self._full_width
 
 
 """
@@ -172,9 +254,24 @@ def get_class_def(node_type: NodeType, children: List[Child]) -> str:
     class_header += ":\n"
 
     if not children:
-        class_body = textwrap.indent("pass\n", prefix="    ")
+        class_body = textwrap.indent("__slots__ = ()\n", prefix="    ")
         return class_header + class_body
 
+    # fields
+    class_header += "    __slots__ = (\n"
+    for child in children:
+        class_header += f'        "_{child.name}",\n'
+    for child in children:
+        if child.is_optional_sequence_type:
+            class_header += f'        "_{child.name}_offsets",\n'
+    class_header += "    )\n\n"
+
+    # child names, for `Node.update`
+    class_header += "    child_names = [\n"
+    for child in children:
+        class_header += f'        "{child.name}",\n'
+    class_header += "    ]\n\n"
+
     # __init__
     init_header = "def __init__(\n"
     init_header += "    self,\n"
@@ -188,6 +285,17 @@ def get_class_def(node_type: NodeType, children: List[Child]) -> str:
     init_body = f"super().__init__({get_children_parameter_list(children)})\n"
     for child in children:
         init_body += f"self._{child.name} = {child.name}\n"
+    init_body += "self._child_offsets = self._get_child_offsets([\n"
+    for child in children:
+        init_body += f"    {child.name},\n"
+    init_body += "])\n"
+    for i, child in enumerate(children):
+        if child.is_optional_sequence_type:
+            init_body += (
+                f"self._{child.name}_offsets = self._get_element_offsets(\n"
+                + f"    {child.name}, self._child_offsets[{i}]\n"
+                + ")\n"
+            )
     init_body = textwrap.indent(init_body, prefix="    " * 2)
     class_header += init_body
 
@@ -200,6 +308,16 @@ def get_class_def(node_type: NodeType, children: List[Child]) -> str:
         property_body += "@property\n"
         property_body += f"def {child.name}(self) -> {child.type.name}:\n"
         property_body += f"    return self._{child.name}\n"
+        if child.is_optional_sequence_type:
+            property_body += "\n"
+            property_body += "@property\n"
+            property_body += f"def {child.name}_offsets(self) -> Sequence[int]:\n"
+            property_body += (
+                f'    """The offset of each element of `{child.name}`, relative to '
+                + 'the start\n'
+                + '    of this node."""\n'
+            )
+            property_body += f"    return self._{child.name}_offsets\n"
         class_body += textwrap.indent(property_body, prefix="    ")
 
     return class_header + class_body
@@ -15,7 +15,8 @@ PREAMBLE = """\
 
 Run `make` to re-generate. Do not edit!
 \"\"\"
-from typing import List, Optional, Sequence, Union
+import bisect
+from typing import Any, Callable, Generic, Iterator, List, Optional, Sequence, TypeVar, Union
 
 import pytch.greencst as greencst
 from .lexer import Token
@@ -23,6 +24,16 @@ from .utils import OffsetRange
 
 
 class Node:
+    # Large files have hundreds of thousands of nodes, so we don't give each of
+    # them a `__dict__`.
+    __slots__ = ("_parent",)
+
+    kind: int
+    \"\"\"An integer uniquely identifying this node's class. See `Visitor`.\"\"\"
+
+    offset: int
+    \"\"\"The offset of the start of this node, including its leading trivia.\"\"\"
+
     def __init__(
         self,
         parent: Optional["Node"],
@@ -63,6 +74,88 @@ class Node:
             f"class {self.__class__.__name__} should implement `offset_range`",
         )
 
+    def iter_materialized_children(self) -> Iterator["Node"]:
+        \"\"\"Iterate over the child nodes which have been constructed so far,
+        without constructing any others.\"\"\"
+        return iter([])
+
+    def find_node_at_offset(self, offset: int) -> Optional["Node"]:
+        \"\"\"Find the innermost node whose range, including its trivia,
+        contains the given offset, or `None` if it's outside of this node.
+
+        This descends using the widths cached in the green nodes, so it only
+        constructs the nodes on the path to the result, and takes time
+        proportional to the depth of the result rather than the size of the
+        tree.
+        \"\"\"
+        if not (self.offset <= offset < self.offset + self.full_width):
+            return None
+        node = self
+        while True:
+            child = node._get_child_at_offset(offset)
+            if not isinstance(child, Node):
+                return node
+            node = child
+
+    def find_token_at_offset(self, offset: int) -> Optional[Token]:
+        \"\"\"Find the token whose range, including its trivia, contains the
+        given offset. See `find_node_at_offset`.\"\"\"
+        node = self.find_node_at_offset(offset)
+        if node is None:
+            return None
+        child = node._get_child_at_offset(offset)
+        if isinstance(child, Token):
+            return child
+        return None
+
+    def find_nodes_in_range(self, offset_range: OffsetRange) -> List["Node"]:
+        \"\"\"Find the outermost nodes whose text lies within the given range,
+        in order.
+
+        Only the nodes which straddle the start or end of the range are
+        descended into, so this doesn't visit the rest of the tree.
+        \"\"\"
+        result = []
+        stack: List[Node] = [self]
+        while stack:
+            node = stack.pop()
+            node_range = node.offset_range
+            if (
+                offset_range.start <= node_range.start
+                and node_range.end <= offset_range.end
+            ):
+                result.append(node)
+            elif (
+                node.offset < offset_range.end
+                and offset_range.start < node.offset + node.full_width
+            ):
+                stack.extend(
+                    child
+                    for child in reversed(node.children)
+                    if isinstance(child, Node)
+                )
+        return result
+
+    def _get_child_at_offset(self, offset: int) -> Optional[Union["Node", Token]]:
+        \"\"\"Get the child whose range, including its trivia, contains the
+        given offset, which must be inside of this node.\"\"\"
+        return None
+
+    @staticmethod
+    def _get_element_index_at_offset(
+        elements: Optional[Sequence[greencst.Node]],
+        element_offsets: Sequence[int],
+        offset: int,
+    ) -> Optional[int]:
+        \"\"\"Get the index of the element whose range, including its trivia,
+        contains the given offset, relative to the start of the parent node.\"\"\"
+        if elements is None:
+            return None
+        index = bisect.bisect_right(element_offsets, offset) - 1
+        if index < 0 or offset >= element_offsets[index] + elements[index].full_width:
+            return None
+        return index
+
 
 """
 
@@ -71,11 +164,84 @@ def main() -> None:
     lines = sys.stdin.read().splitlines()
     sections = get_node_types(lines)
     class_defs = [
-        get_class_def(name, sections, children) for name, children in sections.items()
+        get_class_def(name, kind, sections, children)
+        for kind, (name, children) in enumerate(sections.items())
     ]
     sys.stdout.write(PREAMBLE)
     sys.stdout.write("\n\n".join(class_defs) + "\n\n")
-    sys.stdout.write(get_green_to_red_node_map(sections))
+    sys.stdout.write(get_green_to_red_node_map(sections) + "\n\n")
+    sys.stdout.write(get_visitor(sections))
+
+
+def get_visit_method_name(node_type: NodeType) -> str:
+    """Convert a class name like `LetExpr` to a method name like
+    `visit_let_expr`."""
+    words = []
+    word = ""
+    for c in node_type.name:
+        if c.isupper() and word:
+            words.append(word)
+            word = ""
+        word += c.lower()
+    words.append(word)
+    return "visit_" + "_".join(words)
+
+
+def get_visitor(node_types: Mapping[NodeType, List[Child]]) -> str:
+    visitor = """\
+T_visit = TypeVar("T_visit")
+
+
+class Visitor(Generic[T_visit]):
+    \"\"\"Base class for operations which dispatch on the class of a node.
+
+    Calling `visit` on a node calls the `visit_*` method for the node's class,
+    such as `visit_let_expr` for a `LetExpr`, with any additional arguments
+    passed along. By default, each `visit_*` method calls the method for the
+    node's superclass, up to `visit_node`, which raises `NotImplementedError`.
+
+    Each subclass has a table of its `visit_*` methods indexed by node kind, so
+    dispatching doesn't need to check the node against each class in turn.
+    \"\"\"
+
+    _dispatch_table: List[Callable[..., T_visit]]
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)  # type: ignore
+        cls._dispatch_table = [
+            getattr(cls, method_name) for method_name in VISIT_METHOD_NAMES
+        ]
+
+    def visit(self, node: Node, *args: Any) -> T_visit:
+        return self._dispatch_table[node.kind](self, node, *args)
+
+    def visit_node(self, node: Node, *args: Any) -> T_visit:
+        raise NotImplementedError(
+            f"class {self.__class__.__name__} should implement visiting "
+            + f"{node.__class__.__name__}"
+        )
+"""
+    for node_type in node_types:
+        method_name = get_visit_method_name(node_type)
+        if node_type.supertype is None or node_type.supertype == "Node":
+            super_method_name = "visit_node"
+        else:
+            super_method_name = get_visit_method_name(
+                NodeType(name=node_type.supertype, supertype=None)
+            )
+        visitor += "\n"
+        visitor += f"    def {method_name}(\n"
+        visitor += f"        self, node: {node_type.name}, *args: Any\n"
+        visitor += f"    ) -> T_visit:\n"
+        visitor += f"        return self.{super_method_name}(node, *args)\n"
+
+    visitor += "\n\n"
+    visitor += "VISIT_METHOD_NAMES = [\n"
+    for node_type in node_types:
+        visitor += f"    {get_visit_method_name(node_type)!r},\n"
+    visitor += "]\n"
+    visitor += '"""The name of the `Visitor` method for each node kind."""\n'
+    return visitor
 
 
 def get_green_to_red_node_map(node_types: Mapping[NodeType, List[Child]],) -> str:
@@ -89,6 +255,7 @@ def get_green_to_red_node_map(node_types: Mapping[NodeType, List[Child]],) -> st
 
 def get_class_def(
     node_type: NodeType,
+    kind: int,
     node_types: Mapping[NodeType, List[Child]],
     children: List[Child],
 ) -> str:
@@ -107,13 +274,23 @@ def get_class_def(
     if node_type.supertype:
         class_header += f"({node_type.supertype})"
     class_header += ":\n"
+    class_header += f"    kind = {kind}\n"
 
     if not children:
-        class_body = textwrap.indent("pass\n", prefix="    ")
-        return class_header + class_body
+        class_header += "    __slots__ = ()\n"
+        return class_header
+
+    # fields
+    class_header += "    __slots__ = (\n"
+    class_header += '        "origin",\n'
+    class_header += '        "offset",\n'
+    for child in children:
+        if child.base_type != TOKEN_TYPE:
+            class_header += f'        "_{child.name}",\n'
+    class_header += "    )\n"
 
     # __init__
-    init_header = "def __init__(\n"
+    init_header = "\ndef __init__(\n"
     init_header += f"    self,\n"
     init_header += f"    parent: Optional[Node],\n"
     init_header += f"    origin: greencst.{node_type.name},\n"
@@ -127,7 +304,13 @@ def get_class_def(
     init_body += "self.origin = origin\n"
     init_body += "self.offset = offset\n"
     for child in children:
-        if child.base_type != TOKEN_TYPE:
+        if child.is_optional_sequence_type:
+            # The elements are constructed individually as they're needed.
+            init_body += (
+                f"self._{child.name}: "
+                + f"Optional[List[Optional[{child.base_type.name}]]] = None\n"
+            )
+        elif child.base_type != TOKEN_TYPE:
             init_body += f"self._{child.name}: {child.type.name} = None\n"
     init_body = textwrap.indent(init_body, prefix="    " * 2)
     class_header += init_body
@@ -143,6 +326,32 @@ def get_class_def(
         if child.base_type == TOKEN_TYPE:
             # Tokens don't need to construct a new red node.
             property_body += f"    return self.origin.{child.name}\n"
+        elif child.is_optional_sequence_type:
+            assert leaf_children is not None
+            property_body += f"""\
+    if self.origin.{child.name} is None:
+        return None
+    return [
+        self._get_{child.name}_element(index)
+        for index in range(len(self.origin.{child.name}))
+    ]
+
+def _get_{child.name}_element(self, index: int) -> {child.base_type.name}:
+    assert self.origin.{child.name} is not None
+    if self._{child.name} is None:
+        self._{child.name} = [None] * len(self.origin.{child.name})
+    element = self._{child.name}[index]
+    if element is None:
+        # Look up the offset in the green node, rather than constructing red
+        # nodes for each of the previous elements to get their widths.
+        element = {child.base_type.name}(
+            parent=self,
+            origin=self.origin.{child.name}[index],
+            offset=self.offset + self.origin.{child.name}_offsets[index],
+        )
+        self._{child.name}[index] = element
+    return element
+"""
         else:
             property_body += f"    if self.origin.{child.name} is None:\n"
             property_body += f"        return None\n"
@@ -150,40 +359,20 @@ def get_class_def(
             property_body += f"    if self._{child.name} is not None:\n"
             property_body += f"        return self._{child.name}\n"
 
-            property_body += f"    offset = (\n"
-            property_body += f"        self.offset\n"
-            for previous_child in children[:i]:
-                child_width = (
-                    "+ (\n"
-                    + f"    self.{previous_child.name}.full_width\n"
-                    + f"    if self.{previous_child.name} is not None else\n"
-                    + f"    0\n"
-                    + ")\n"
-                )
-                property_body += textwrap.indent(child_width, "    " * 2)
-            property_body += f"    )\n"
+            # Look up the offset in the green node, rather than constructing
+            # red nodes for each of the previous children to get their widths.
+            property_body += (
+                f"    offset = self.offset + self.origin.child_offsets[{i}]\n"
+            )
 
             if leaf_children is not None:
-                if not child.is_optional_sequence_type:
-                    # A specific class to construct, like `FunctionCallExpr`.
-                    property_body += f"""\
+                # A specific class to construct, like `FunctionCallExpr`.
+                property_body += f"""\
     result = {child.base_type.name}(
         parent=self,
         origin=self.origin.{child.name},
         offset=offset,
     )
-"""
-                else:
-                    # A list of specific classes to construct.
-                    property_body += f"""\
-    result = []
-    for child in self.origin.{child.name}:
-        result.append({child.base_type.name}(
-            parent=self,
-            origin=child,
-            offset=offset,
-        ))
-        offset += child.full_width
 """
             else:
                 # An abstract class to construct, like `Expr`, whose concrete
@@ -246,6 +435,52 @@ def get_class_def(
     children_prop_body += "    ]\n"
     class_body += textwrap.indent(children_prop_body, prefix="    ")
 
+    # Children whose ranges contain the given offset. Zero-width children share
+    # their offsets with the next child, so we take the last child starting at
+    # or before the offset.
+    child_at_offset_body = "\n"
+    child_at_offset_body += "def _get_child_at_offset(\n"
+    child_at_offset_body += "    self, offset: int\n"
+    child_at_offset_body += ") -> Optional[Union[Node, Token]]:\n"
+    child_at_offset_body += "    index = bisect.bisect_right(\n"
+    child_at_offset_body += "        self.origin.child_offsets, offset - self.offset\n"
+    child_at_offset_body += "    ) - 1\n"
+    for i, child in enumerate(children):
+        child_at_offset_body += f"    if index == {i}:\n"
+        if child.is_optional_sequence_type:
+            child_at_offset_body += f"""\
+        element_index = self._get_element_index_at_offset(
+            self.origin.{child.name},
+            self.origin.{child.name}_offsets,
+            offset - self.offset,
+        )
+        if element_index is None:
+            return None
+        return self._get_{child.name}_element(element_index)
+"""
+        else:
+            child_at_offset_body += f"        return self.{child.name}\n"
+    child_at_offset_body += "    return None\n"
+    class_body += textwrap.indent(child_at_offset_body, prefix="    ")
+
+    node_children = [child for child in children if child.base_type != TOKEN_TYPE]
+    if node_children:
+        materialized_body = "\n"
+        materialized_body += (
+            "def iter_materialized_children(self) -> Iterator[Node]:\n"
+        )
+        for child in node_children:
+            materialized_body += f"    if self._{child.name} is not None:\n"
+            if child.is_optional_sequence_type:
+                materialized_body += (
+                    f"        for element in self._{child.name}:\n"
+                    + "            if element is not None:\n"
+                    + "                yield element\n"
+                )
+            else:
+                materialized_body += f"        yield self._{child.name}\n"
+        class_body += textwrap.indent(materialized_body, prefix="    ")
+
     return class_header + class_body
 
 
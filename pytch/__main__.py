@@ -1,23 +1,131 @@
+import contextlib
+import json
+import os.path
 import sys
-from typing import Sequence, TextIO
+from typing import Callable, ContextManager, List, Optional, Sequence, TextIO, TypeVar
 
 import click
 
 from .lexer import lex
 from .parser import dump_syntax_tree, parse
-from .repl import compile_file, interact, print_errors, run_file
+from .profiling import Profile, Profiler
+from .repl import (
+    compile_file,
+    compile_file_to_stream,
+    interact,
+    print_errors,
+    run_file,
+)
 from .utils import FileInfo
 
 
+T = TypeVar("T")
+
+
+def profile_options(f: Callable[..., T]) -> Callable[..., T]:
+    f = click.option(
+        "--profile-json",
+        type=click.File("w"),
+        help="Write the measurements from `--profile` to this file as JSON.",
+    )(f)
+    f = click.option(
+        "--profile-memory",
+        is_flag=True,
+        help=(
+            "Also measure the peak memory allocated by each phase with "
+            + "`--profile` or `--profile-json`. This slows down the compiler, "
+            + "so the times measured in the same run are inflated."
+        ),
+    )(f)
+    f = click.option(
+        "--profile",
+        is_flag=True,
+        help=(
+            "Print the time taken and other measurements for each phase of the "
+            + "compiler."
+        ),
+    )(f)
+    return f
+
+
+def make_profiler(
+    file_info: FileInfo,
+    profile: bool,
+    profile_memory: bool,
+    profile_json: Optional[TextIO],
+) -> Optional[Profiler]:
+    if profile or profile_json is not None:
+        return Profiler(file_path=file_info.file_path, trace_memory=profile_memory)
+    else:
+        return None
+
+
+def report_profiles(
+    profiles: List[Profile], profile: bool, profile_json: Optional[TextIO]
+) -> None:
+    if profile:
+        for profile_ in profiles:
+            sys.stderr.write(
+                "".join(line + "\n" for line in profile_.get_table_lines())
+            )
+    if profile_json is not None:
+        json.dump([profile_.to_json() for profile_ in profiles], profile_json, indent=2)
+        profile_json.write("\n")
+
+
 @click.group()
 def cli() -> None:
     pass
 
 
+def open_output_stream(
+    source_file: TextIO, output_dir: Optional[str]
+) -> Optional[Callable[[], ContextManager[TextIO]]]:
+    """Get a function to open the stream which the compiled output for the given
+    source file should be written to, if any."""
+    if output_dir is not None:
+        (file_name, _extension) = os.path.splitext(os.path.basename(source_file.name))
+        output_path = os.path.join(output_dir, file_name + ".py")
+        return lambda: open(output_path, "w")
+    elif source_file.name == "<stdin>":
+        # Click wraps standard input, so we can't compare with `sys.stdin`.
+        return lambda: contextlib.nullcontext(sys.stdout)
+    else:
+        return None
+
+
 @cli.command("compile")
 @click.argument("source_files", type=click.File(), nargs=-1)
 @click.option("--dump-tree", is_flag=True)
-def compile(source_files: Sequence[TextIO], dump_tree: bool) -> None:
+@click.option(
+    "--explain-reasons",
+    is_flag=True,
+    help=(
+        "Print the reason that each expression typechecked, for debugging the "
+        + "typechecker."
+    ),
+)
+@click.option(
+    "-o",
+    "--output-dir",
+    type=click.Path(file_okay=False, exists=True),
+    help=(
+        "Write the compiled output for each `foo.pytch` to `foo.py` in this "
+        + "directory. (Otherwise, it's only written to standard output when "
+        + "compiling standard input.)"
+    ),
+)
+@profile_options
+def compile(
+    source_files: Sequence[TextIO],
+    dump_tree: bool,
+    explain_reasons: bool,
+    output_dir: Optional[str],
+    profile: bool,
+    profile_memory: bool,
+    profile_json: Optional[TextIO],
+) -> None:
+    profiles = []
     for source_file in source_files:
         file_info = FileInfo(file_path=source_file.name, source_code=source_file.read())
         if dump_tree:
@@ -33,18 +141,47 @@ def compile(source_files: Sequence[TextIO], dump_tree: bool) -> None:
             )
             sys.stdout.write("".join(line + "\n" for line in lines))
         else:
-            (compiled_output, errors) = compile_file(file_info=file_info)
+            profiler = make_profiler(file_info, profile, profile_memory, profile_json)
+            open_stream = open_output_stream(source_file, output_dir)
+            if open_stream is not None:
+                errors = compile_file_to_stream(
+                    file_info=file_info,
+                    open_stream=open_stream,
+                    profiler=profiler,
+                    explain_reasons=explain_reasons,
+                )
+            else:
+                (_compiled_output, errors) = compile_file(
+                    file_info=file_info,
+                    profiler=profiler,
+                    explain_reasons=explain_reasons,
+                )
             print_errors(errors)
-            if compiled_output is not None and source_file is sys.stdin:
-                sys.stdout.write(compiled_output)
+            if profiler is not None:
+                profiles.append(profiler.finish())
+    report_profiles(profiles, profile, profile_json)
 
 
 @cli.command("run")
 @click.argument("source_file", type=click.File())
-def run(source_file: TextIO) -> None:
-    run_file(
-        file_info=FileInfo(file_path=source_file.name, source_code=source_file.read())
-    )
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Don't read or write the cached compiled code for the file.",
+)
+@profile_options
+def run(
+    source_file: TextIO,
+    no_cache: bool,
+    profile: bool,
+    profile_memory: bool,
+    profile_json: Optional[TextIO],
+) -> None:
+    file_info = FileInfo(file_path=source_file.name, source_code=source_file.read())
+    profiler = make_profiler(file_info, profile, profile_memory, profile_json)
+    run_file(file_info=file_info, profiler=profiler, use_cache=not no_cache)
+    if profiler is not None:
+        report_profiles([profiler.finish()], profile, profile_json)
 
 
 @cli.command("repl")
@@ -0,0 +1,278 @@
+"""Benchmarks for the compiler phases on large generated programs.
+
+The generated programs are a long sequence of top-level bindings, which is
+the shape of generated configuration modules. Each binding nests the rest of
+the program inside of it, so these programs also make sure that none of the
+phases is limited by Python's recursion limit.
+"""
+import time
+import tracemalloc
+from typing import (
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import click
+
+from .binder import bind, GLOBAL_SCOPE as BINDER_GLOBAL_SCOPE
+from .codegen import codegen
+from .errors import Error
+import pytch.greencst as greencst
+from .lexer import lex, Token
+from .parser import parse
+import pytch.redcst as redcst
+from .redcst import SyntaxTree as RedSyntaxTree
+from .typesystem import typecheck
+from .typesystem.builtins import GLOBAL_SCOPE as TYPESYSTEM_GLOBAL_SCOPE
+from .utils import FileInfo
+
+
+T = TypeVar("T")
+
+DEFAULT_NUM_BINDINGS = [10_000, 100_000]
+
+
+def make_program(num_bindings: int) -> str:
+    """Make a valid program with `num_bindings` top-level bindings.
+
+    The bindings cycle through integer `let`s, function definitions, function
+    calls and `if`-expressions, each referring to earlier bindings.
+    """
+    lines = ["let x0 = 0"]
+    for i in range(1, num_bindings):
+        kind = i % 4
+        if kind == 0:
+            lines.append(f"let x{i} = x{i - 4} + {i}")
+        elif kind == 1:
+            lines.append(f"def f{i}(a, b) =>\n  let c = a + b\n  c")
+        elif kind == 2:
+            lines.append(f"let y{i} = f{i - 1}(x{i - 2}, {i})")
+        else:
+            lines.append(f"let z{i} =\n  if True\n  then x{i - 3}\n  else {i}")
+    lines.append(f"print(x{(num_bindings - 1) // 4 * 4})")
+    return "".join(line + "\n" for line in lines)
+
+
+def make_defs_program(num_defs: int) -> str:
+    """Make a valid program with `num_defs` top-level function definitions.
+
+    Each function's parameters start out with existential types, which are
+    solved while typechecking its body, so this mostly exercises the
+    existential solver.
+    """
+    lines = [f"def f{i}(a, b) =>\n  a + b" for i in range(num_defs)]
+    lines.append(f"print(f{num_defs - 1}(1, 2))")
+    return "".join(line + "\n" for line in lines)
+
+
+def time_phase(timings: List[Tuple[str, float]], phase: str, f: Callable[[], T]) -> T:
+    start = time.perf_counter()
+    result = f()
+    timings.append((phase, time.perf_counter() - start))
+    return result
+
+
+def check_no_errors(phase: str, errors: Sequence[Error]) -> None:
+    if errors:
+        raise click.ClickException(
+            f"The generated program had {len(errors)} error(s) during {phase}, "
+            + f"the first of which was: {errors[0].message}"
+        )
+
+
+def run_benchmark(file_info: FileInfo) -> List[Tuple[str, float]]:
+    """Compile a generated program, and return how long each phase took, in
+    seconds."""
+    timings: List[Tuple[str, float]] = []
+
+    lexation = time_phase(timings, "lex", lambda: lex(file_info=file_info))
+    check_no_errors("lexing", lexation.errors)
+    parsation = time_phase(
+        timings, "parse", lambda: parse(file_info=file_info, tokens=lexation.tokens)
+    )
+    check_no_errors("parsing", parsation.errors)
+
+    syntax_tree = RedSyntaxTree(parent=None, origin=parsation.green_cst, offset=0)
+    bindation = time_phase(
+        timings,
+        "bind",
+        lambda: bind(
+            file_info=file_info,
+            syntax_tree=syntax_tree,
+            global_scope=BINDER_GLOBAL_SCOPE,
+        ),
+    )
+    check_no_errors("binding", bindation.errors)
+    typeation = time_phase(
+        timings,
+        "typecheck",
+        lambda: typecheck(
+            file_info=file_info,
+            syntax_tree=syntax_tree,
+            bindation=bindation,
+            global_scope=TYPESYSTEM_GLOBAL_SCOPE,
+        ),
+    )
+    check_no_errors("typechecking", typeation.errors)
+    codegenation = time_phase(
+        timings,
+        "codegen",
+        lambda: codegen(
+            syntax_tree=syntax_tree, bindation=bindation, typeation=typeation
+        ),
+    )
+    check_no_errors("codegen", codegenation.errors)
+    time_phase(timings, "output", codegenation.get_compiled_output)
+    return timings
+
+
+def iter_nodes(
+    node: Union[greencst.Node, redcst.Node]
+) -> Iterator[Union[greencst.Node, redcst.Node]]:
+    """Iterate over all of the nodes in the tree rooted at `node`.
+
+    This constructs every red node in a red tree.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        for child in node.children:
+            if isinstance(child, (greencst.Node, redcst.Node)):
+                stack.append(child)
+
+
+def measure_tree(f: Callable[[], T]) -> Tuple[T, int]:
+    """Call `f`, and return its result along with the number of bytes which it
+    allocated and which were still allocated when it returned."""
+    tracemalloc.start()
+    try:
+        result = f()
+        (num_bytes, _peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (result, num_bytes)
+
+
+def run_memory_benchmark(file_info: FileInfo) -> List[Tuple[str, int, int]]:
+    """Build the green and red syntax trees for a generated program, and return
+    the number of objects of each kind and how many bytes they take up.
+
+    The tokens are reported separately from the green nodes which hold them,
+    so that the figure for the green nodes isn't dominated by the tokens.
+    """
+    lexation = lex(file_info=file_info)
+    check_no_errors("lexing", lexation.errors)
+    tokens = lexation.tokens
+
+    # Parsing materializes each token from the token stream, so measure how
+    # much memory that takes on its own.
+    materialized_tokens: List[Optional[Token]] = [None] * len(tokens)
+
+    def materialize_tokens() -> None:
+        for i in range(len(tokens)):
+            materialized_tokens[i] = tokens[i]
+
+    (_result, token_bytes) = measure_tree(materialize_tokens)
+
+    (parsation, parse_bytes) = measure_tree(
+        lambda: parse(file_info=file_info, tokens=tokens)
+    )
+    check_no_errors("parsing", parsation.errors)
+    num_green_nodes = 0
+    num_green_tokens = 0
+    for node in iter_nodes(parsation.green_cst):
+        num_green_nodes += 1
+        num_green_tokens += sum(1 for child in node.children if isinstance(child, Token))
+    green_bytes = parse_bytes - token_bytes * num_green_tokens // len(tokens)
+
+    def make_red_tree() -> RedSyntaxTree:
+        syntax_tree = RedSyntaxTree(parent=None, origin=parsation.green_cst, offset=0)
+        for _node in iter_nodes(syntax_tree):
+            pass
+        return syntax_tree
+
+    (syntax_tree, red_bytes) = measure_tree(make_red_tree)
+    num_red_nodes = sum(1 for _node in iter_nodes(syntax_tree))
+    return [
+        ("tokens", len(tokens), token_bytes),
+        ("green", num_green_nodes, green_bytes),
+        ("red", num_red_nodes, red_bytes),
+    ]
+
+
+@click.command()
+@click.option(
+    "--bindings",
+    "num_bindings_list",
+    type=int,
+    multiple=True,
+    help=(
+        "The number of top-level bindings in the generated program. "
+        + "Can be passed multiple times. "
+        + f"(default: {', '.join(str(n) for n in DEFAULT_NUM_BINDINGS)})"
+    ),
+)
+@click.option(
+    "--defs",
+    "num_defs_list",
+    type=int,
+    multiple=True,
+    help=(
+        "The number of top-level function definitions in a generated program "
+        + "which consists only of them. Can be passed multiple times."
+    ),
+)
+@click.option(
+    "--memory",
+    is_flag=True,
+    help=(
+        "Report how many bytes each token and syntax tree node takes up, "
+        + "rather than timing each phase."
+    ),
+)
+def main(
+    num_bindings_list: Sequence[int], num_defs_list: Sequence[int], memory: bool
+) -> None:
+    """Time each compiler phase on large generated programs."""
+    programs = [
+        (f"{num_bindings} bindings", make_program(num_bindings))
+        for num_bindings in num_bindings_list
+    ]
+    programs.extend(
+        (f"{num_defs} defs", make_defs_program(num_defs))
+        for num_defs in num_defs_list
+    )
+    if not programs:
+        programs = [
+            (f"{num_bindings} bindings", make_program(num_bindings))
+            for num_bindings in DEFAULT_NUM_BINDINGS
+        ]
+
+    for (description, source_code) in programs:
+        click.echo(f"{description}:")
+        file_info = FileInfo(
+            file_path=f"<benchmark {description}>", source_code=source_code
+        )
+        if memory:
+            for (kind, num_objects, num_bytes) in run_memory_benchmark(file_info):
+                click.echo(
+                    f"  {kind:<10} {num_objects:10} objects "
+                    + f"{num_bytes / num_objects:10.1f} bytes each"
+                )
+        else:
+            timings = run_benchmark(file_info)
+            for (phase, seconds) in timings:
+                click.echo(f"  {phase:<10} {seconds:10.3f}s")
+            total = sum(seconds for (_phase, seconds) in timings)
+            click.echo(f"  {'total':<10} {total:10.3f}s")
+
+
+if __name__ == "__main__":
+    main()
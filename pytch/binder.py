@@ -4,11 +4,12 @@ In a valid program, every `IdentifierExpr` refers to at least one
 `VariablePattern` somewhere. (In a pattern-match, there may be more than one
 source `VariablePattern`.)
 """
-from typing import Dict, List, Mapping, Optional, Tuple
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
 
 import attr
 import distance
 
+from .containers import PMap
 from .errors import Error, ErrorCode, Note, Severity
 from .redcst import (
     DefExpr,
@@ -18,6 +19,7 @@ from .redcst import (
     Pattern,
     SyntaxTree,
     VariablePattern,
+    Visitor,
 )
 from .utils import FileInfo, Range
 
@@ -41,6 +43,176 @@ class Bindation:
         return self.bindings.get(node)
 
 
+MAX_SUGGESTION_DISTANCE = 2
+"""The maximum edit distance between an unbound name and the names suggested
+in its place."""
+
+
+def get_deletions(word: str, max_deletions: int) -> Set[str]:
+    """Get the strings which can be made by deleting at most `max_deletions`
+    characters from `word`, including `word` itself."""
+    deletions = {word}
+    frontier = {word}
+    for _ in range(max_deletions):
+        frontier = {
+            deletion[:i] + deletion[i + 1 :]
+            for deletion in frontier
+            for i in range(len(deletion))
+        }
+        deletions.update(frontier)
+    return deletions
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class _IndexedNames:
+    """The names indexed under some string, as a linked list.
+
+    Adding a name to the front shares the rest of the list, rather than copying
+    it, so indexing many names under the same string takes linear time.
+    """
+
+    name: str
+    rest: Optional["_IndexedNames"]
+
+    def __iter__(self) -> Iterator[str]:
+        indexed_names: Optional[_IndexedNames] = self
+        while indexed_names is not None:
+            yield indexed_names.name
+            indexed_names = indexed_names.rest
+
+
+class SuggestionIndex:
+    """An index of the names to suggest in place of a misspelled name.
+
+    Each name is indexed under every string which can be made by deleting up
+    to `MAX_SUGGESTION_DISTANCE` characters from it. Two names are within that
+    edit distance of each other only if they have such a string in common, so
+    only the names which share one with the misspelled name have to be
+    compared against it, rather than every name in scope.
+
+    Like scopes, indexes form a chain: each one adds some names to its
+    parent. Most programs don't have any unbound names, so an index isn't
+    built until it's first queried. Then it and each unbuilt ancestor index
+    only the names that they add to their parent, and keep the result, so
+    sibling indexes (such as the scopes of successive functions) share the
+    work done for their common ancestors.
+    """
+
+    def __init__(
+        self, parent: Optional["SuggestionIndex"], names: Sequence[str]
+    ) -> None:
+        self._parent = parent
+        self._names = names
+        self._deletions: Optional[PMap[str, _IndexedNames]] = None
+
+    def extend(self, names: Sequence[str]) -> "SuggestionIndex":
+        if not names:
+            return self
+        return SuggestionIndex(parent=self, names=names)
+
+    def get_candidates(self, name: str) -> Set[str]:
+        """Get the indexed names which might be within
+        `MAX_SUGGESTION_DISTANCE` of `name`."""
+        deletions = self._get_deletions()
+        candidates: Set[str] = set()
+        for deletion in get_deletions(name, MAX_SUGGESTION_DISTANCE):
+            indexed_names = deletions.get(deletion)
+            if indexed_names is not None:
+                candidates.update(indexed_names)
+        return candidates
+
+    def _get_deletions(self) -> PMap[str, _IndexedNames]:
+        unbuilt_indexes = []
+        index: Optional[SuggestionIndex] = self
+        while index is not None and index._deletions is None:
+            unbuilt_indexes.append(index)
+            index = index._parent
+
+        deletions: PMap[str, _IndexedNames] = PMap()
+        if index is not None:
+            assert index._deletions is not None
+            deletions = index._deletions
+        for unbuilt_index in reversed(unbuilt_indexes):
+            new_deletions: Dict[str, _IndexedNames] = {}
+            for name in unbuilt_index._names:
+                for deletion in get_deletions(name, MAX_SUGGESTION_DISTANCE):
+                    rest = new_deletions.get(deletion)
+                    if rest is None:
+                        rest = deletions.get(deletion)
+                    new_deletions[deletion] = _IndexedNames(name=name, rest=rest)
+            deletions = deletions.update(new_deletions)
+            unbuilt_index._deletions = deletions
+        return deletions
+
+
+class Scope(Mapping[str, List[VariablePattern]]):
+    """The names in scope at some point in the program.
+
+    Scopes are persistent: extending a scope with new names doesn't copy or
+    modify the original scope, so it takes time logarithmic (rather than
+    linear) in the number of names in scope. Otherwise, a program with many
+    nested bindings would take quadratic time to bind.
+
+    Iterating over a scope yields names in the order in which they were first
+    bound, like a `dict` which is updated with each new binding.
+    """
+
+    def __init__(
+        self,
+        names: PMap[str, Tuple[int, List[VariablePattern]]],
+        suggestion_index: SuggestionIndex,
+    ) -> None:
+        # Each name maps to the order in which it was first bound, and the
+        # variables it currently refers to.
+        self._names = names
+        self._suggestion_index = suggestion_index
+
+    @classmethod
+    def of_mapping(cls, mapping: Mapping[str, List[VariablePattern]]) -> "Scope":
+        return cls(PMap(), SuggestionIndex(parent=None, names=[])).extend(mapping)
+
+    def __getitem__(self, name: str) -> List[VariablePattern]:
+        (_order, binding) = self._names[name]
+        return binding
+
+    def __iter__(self) -> Iterator[str]:
+        names = sorted(self._names.items(), key=lambda item: item[1][0])
+        return (name for (name, _entry) in names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def extend(self, mapping: Mapping[str, List[VariablePattern]]) -> "Scope":
+        """Get a new scope with the names in `mapping` bound, shadowing any
+        existing names."""
+        if not mapping:
+            return self
+        names = self._names
+        new_names = []
+        for (name, binding) in mapping.items():
+            entry = names.get(name)
+            if entry is not None:
+                order = entry[0]
+            else:
+                # Names are never removed from a scope, so the number of names
+                # is a unique order for a new name.
+                order = len(names)
+                new_names.append(name)
+            names = names.set(name, (order, binding))
+        return Scope(names, self._suggestion_index.extend(new_names))
+
+    def get_suggestions(self, name: str) -> List[str]:
+        """Get the names in scope within `MAX_SUGGESTION_DISTANCE` of `name`,
+        in the order in which they were first bound."""
+        suggestions = [
+            candidate
+            for candidate in self._suggestion_index.get_candidates(name)
+            if distance.levenshtein(name, candidate) <= MAX_SUGGESTION_DISTANCE
+        ]
+        suggestions.sort(key=lambda suggestion: self._names[suggestion][0])
+        return suggestions
+
+
 def get_names_bound_for_let_expr_body(
     n_let_expr: LetExpr,
 ) -> Mapping[str, List[VariablePattern]]:
@@ -102,25 +274,30 @@ def get_names_bound_by_pattern(
         assert False, f"Unhandled pattern type: {n_pattern.__class__.__name__}"
 
 
-def bind(
-    file_info: FileInfo,
-    syntax_tree: SyntaxTree,
-    global_scope: Mapping[str, List[VariablePattern]],
-) -> Bindation:
+class Binder(Visitor[None]):
+    """Binds a node in the scope of the names given for it.
+
+    Rather than visiting its children recursively, a node pushes them onto
+    `stack` along with the names in scope for each, since the tree may be
+    arbitrarily deep. See `bind`.
+    """
+
+    def __init__(self, file_info: FileInfo) -> None:
+        self.file_info = file_info
+        self.bindings: Dict[IdentifierExpr, List[VariablePattern]] = {}
+        self.errors: List[Error] = []
+        self.stack: List[Tuple[Node, Scope]] = []
+
     def get_binding_referred_to_by_name(
-        node: Node, name: str, names_in_scope: Mapping[str, List[VariablePattern]]
+        self, node: Node, name: str, names_in_scope: Scope
     ) -> Tuple[Optional[List[VariablePattern]], List[Error]]:
+        file_info = self.file_info
         binding = names_in_scope.get(name)
         if binding is not None:
             return (binding, [])
 
-        suggestions = [
-            candidate
-            for candidate in names_in_scope
-            if distance.levenshtein(name, candidate) <= 2
-        ]
         notes = []
-        for suggestion in suggestions:
+        for suggestion in names_in_scope.get_suggestions(name):
             suggestion_nodes = names_in_scope.get(suggestion)
             range: Optional[Range]
             if suggestion_nodes:
@@ -154,76 +331,61 @@ def bind(
         ]
         return (None, errors)
 
-    def bind_node(
-        node: Node, names_in_scope: Mapping[str, List[VariablePattern]]
-    ) -> Tuple[Mapping[IdentifierExpr, List[VariablePattern]], List[Error]]:
-        bindings = {}
-        errors = []
-        if isinstance(node, IdentifierExpr):
-            node_identifier = node.t_identifier
-            if node_identifier is not None:
-                name = node_identifier.text
-                (
-                    identifier_binding,
-                    identifier_errors,
-                ) = get_binding_referred_to_by_name(
-                    node=node, name=name, names_in_scope=names_in_scope
-                )
-                if identifier_binding is not None:
-                    bindings[node] = identifier_binding
-                errors.extend(identifier_errors)
-
-        elif isinstance(node, LetExpr):
-            if node.n_value is not None:
-                (value_bindings, value_errors) = bind_node(
-                    node=node.n_value, names_in_scope=names_in_scope
-                )
-                bindings.update(value_bindings)
-                errors.extend(value_errors)
-
-            if node.n_body is not None:
-                body_names_in_scope = {
-                    **names_in_scope,
-                    **get_names_bound_for_let_expr_body(node),
-                }
-                (body_bindings, body_errors) = bind_node(
-                    node=node.n_body, names_in_scope=body_names_in_scope
-                )
-                bindings.update(body_bindings)
-                errors.extend(body_errors)
-
-        elif isinstance(node, DefExpr):
-            if node.n_definition is not None:
-                value_names_in_scope = {
-                    **names_in_scope,
-                    **get_names_bound_for_def_expr(node),
-                }
-                (value_bindings, value_errors) = bind_node(
-                    node=node.n_definition, names_in_scope=value_names_in_scope
-                )
-                bindings.update(value_bindings)
-                errors.extend(value_errors)
-
-            if node.n_next is not None:
-                next_names_in_scope = {
-                    **names_in_scope,
-                    **get_names_bound_for_def_expr_next(node),
-                }
-                (next_bindings, next_errors) = bind_node(
-                    node=node.n_next, names_in_scope=next_names_in_scope
-                )
-                bindings.update(next_bindings)
-                errors.extend(next_errors)
-        else:
-            for child in node.children:
-                if isinstance(child, Node):
-                    (child_bindings, child_errors) = bind_node(
-                        node=child, names_in_scope=names_in_scope
-                    )
-                    bindings.update(child_bindings)
-                    errors.extend(child_errors)
-
-        return (bindings, errors)
-
-    (bindings, errors) = bind_node(node=syntax_tree, names_in_scope=global_scope)
-    return Bindation(bindings=bindings, errors=errors)
+    def visit_identifier_expr(
+        self, node: IdentifierExpr, names_in_scope: Scope
+    ) -> None:
+        node_identifier = node.t_identifier
+        if node_identifier is not None:
+            name = node_identifier.text
+            (
+                identifier_binding,
+                identifier_errors,
+            ) = self.get_binding_referred_to_by_name(
+                node=node, name=name, names_in_scope=names_in_scope
+            )
+            if identifier_binding is not None:
+                self.bindings[node] = identifier_binding
+            self.errors.extend(identifier_errors)
+
+    def visit_let_expr(self, node: LetExpr, names_in_scope: Scope) -> None:
+        if node.n_body is not None:
+            body_names_in_scope = names_in_scope.extend(
+                get_names_bound_for_let_expr_body(node)
+            )
+            self.stack.append((node.n_body, body_names_in_scope))
+
+        if node.n_value is not None:
+            self.stack.append((node.n_value, names_in_scope))
+
+    def visit_def_expr(self, node: DefExpr, names_in_scope: Scope) -> None:
+        if node.n_next is not None:
+            next_names_in_scope = names_in_scope.extend(
+                get_names_bound_for_def_expr_next(node)
+            )
+            self.stack.append((node.n_next, next_names_in_scope))
+
+        if node.n_definition is not None:
+            value_names_in_scope = names_in_scope.extend(
+                get_names_bound_for_def_expr(node)
+            )
+            self.stack.append((node.n_definition, value_names_in_scope))
+
+    def visit_node(self, node: Node, names_in_scope: Scope) -> None:
+        # Children are pushed in reverse order so that they're bound (and
+        # report errors) from left to right.
+        for child in reversed(node.children):
+            if isinstance(child, Node):
+                self.stack.append((child, names_in_scope))
+
+
+def bind(
+    file_info: FileInfo,
+    syntax_tree: SyntaxTree,
+    global_scope: Mapping[str, List[VariablePattern]],
+) -> Bindation:
+    binder = Binder(file_info=file_info)
+    binder.stack.append((syntax_tree, Scope.of_mapping(global_scope)))
+    while binder.stack:
+        (node, names_in_scope) = binder.stack.pop()
+        binder.visit(node, names_in_scope)
+    return Bindation(bindings=binder.bindings, errors=binder.errors)
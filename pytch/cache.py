@@ -0,0 +1,156 @@
+"""Cache of compiled Pytch files.
+
+Like Python's own `__pycache__`, the compiled code object for `foo.pytch` is
+stored in `__pycache__/foo.pytch.<tag>.pyc` next to it, so that running an
+unchanged file doesn't need to compile it again. The cache file starts with a
+key which covers everything that the compiled output depends on: the source
+code, the compiler itself and the Python bytecode version. A cache file with a
+different key is ignored, and overwritten the next time that the file is
+compiled.
+
+The compiler is identified by a hash of the Pytch package's own source files,
+rather than by its version number, so that changing any part of the compiler
+(including the builtins) invalidates the cache without having to remember to
+bump the version.
+
+Several processes may compile the same file at once, so cache files are
+written to a temporary file and then renamed into place. Readers therefore
+never see a partially-written cache file. Like Python's own cache files, the
+cache file gets the same permissions as the source file, so that it can be
+shared by anyone who can read the source file.
+"""
+import hashlib
+import importlib.util
+import marshal
+import os
+import os.path
+import sys
+import tempfile
+from types import CodeType
+from typing import Optional
+
+from . import __version__
+from .utils import FileInfo
+
+
+CACHE_DIR_NAME = "__pycache__"
+
+CACHE_TAG = f"pytch-{__version__}.{sys.implementation.cache_tag}"
+
+
+COMPILER_SOURCE_EXTENSIONS = (".py", ".txt")
+
+
+def get_compiler_fingerprint() -> bytes:
+    """Hash the source files of the Pytch package.
+
+    Compiled code depends on every part of the compiler, so the cached code
+    for a file is invalid if any of them change.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    source_paths = []
+    for (directory, dir_names, file_names) in os.walk(package_dir):
+        dir_names[:] = sorted(
+            dir_name for dir_name in dir_names if dir_name != CACHE_DIR_NAME
+        )
+        for file_name in file_names:
+            if file_name.endswith(COMPILER_SOURCE_EXTENSIONS):
+                source_paths.append(os.path.join(directory, file_name))
+
+    hasher = hashlib.sha256()
+    for source_path in sorted(source_paths):
+        with open(source_path, "rb") as f:
+            source = f.read()
+        relative_path = os.path.relpath(source_path, package_dir).encode()
+        for part in [relative_path, source]:
+            hasher.update(len(part).to_bytes(8, "little"))
+            hasher.update(part)
+    return hasher.digest()
+
+
+COMPILER_FINGERPRINT = get_compiler_fingerprint()
+
+
+def get_cache_key(file_info: FileInfo) -> bytes:
+    hasher = hashlib.sha256()
+    for part in [
+        COMPILER_FINGERPRINT,
+        importlib.util.MAGIC_NUMBER,
+        file_info.source_code.encode(),
+    ]:
+        # Include the length of each part so that they can't run together.
+        hasher.update(len(part).to_bytes(8, "little"))
+        hasher.update(part)
+    return hasher.digest()
+
+
+def get_cache_path(file_path: str) -> Optional[str]:
+    """Get the path of the cache file for the given source file, or `None` if
+    the source file isn't on disk, such as for standard input."""
+    if not os.path.isfile(file_path):
+        return None
+    (directory, file_name) = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, CACHE_DIR_NAME, f"{file_name}.{CACHE_TAG}.pyc")
+
+
+def load_code(file_info: FileInfo) -> Optional[CodeType]:
+    """Load the cached code for the given file, if it's up-to-date."""
+    cache_path = get_cache_path(file_info.file_path)
+    if cache_path is None:
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    key = get_cache_key(file_info)
+    if not data.startswith(key):
+        return None
+    try:
+        code = marshal.loads(data[len(key) :])
+    except (EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(code, CodeType):
+        return None
+    # The code records the path of the file that it was compiled from, for
+    # tracebacks, so it's stale if the file is now being loaded from elsewhere.
+    if code.co_filename != file_info.file_path:
+        return None
+    return code
+
+
+def store_code(file_info: FileInfo, code: CodeType) -> None:
+    """Cache the compiled code for the given file.
+
+    Failing to write the cache isn't an error, since the file can always be
+    compiled again.
+    """
+    cache_path = get_cache_path(file_info.file_path)
+    if cache_path is None:
+        return
+    data = get_cache_key(file_info) + marshal.dumps(code)
+    try:
+        mode = os.stat(file_info.file_path).st_mode & 0o666
+    except OSError:
+        return
+
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        (fd, temp_path) = tempfile.mkstemp(
+            dir=cache_dir, prefix=os.path.basename(cache_path) + "."
+        )
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # `mkstemp` creates the file readable only by its owner.
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
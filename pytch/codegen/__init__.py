@@ -1,9 +1,14 @@
+import ast
+import io
 import keyword
-from typing import Dict, List, Optional, Set, Tuple
+from types import CodeType
+from typing import List, Optional, TextIO, Tuple, Union
 
 import attr
 
 from .py3ast import (
+    Emitter,
+    lower_statements,
     PyArgument,
     PyAssignmentStmt,
     PyBinaryExpr,
@@ -19,6 +24,7 @@ from .py3ast import (
     PyUnavailableExpr,
 )
 from ..binder import Bindation
+from ..containers import PMap, PSet, PVector
 from ..errors import Error
 from ..lexer import TokenKind
 from ..redcst import (
@@ -34,21 +40,69 @@ from ..redcst import (
     StringLiteralExpr,
     SyntaxTree,
     VariablePattern,
+    Visitor,
 )
 from ..typesystem import Typeation
+from ..utils import MaybeTrampoline, run_trampoline, Trampoline
 
 
 @attr.s(auto_attribs=True, frozen=True)
 class Scope:
-    pytch_bindings: Dict[VariablePattern, str]
-    python_bindings: Set[str]
+    pytch_bindings: PMap[VariablePattern, str]
+    """The Python name of each Pytch variable bound in this scope."""
+
+    python_bindings: PSet[str]
+    """The names of the temporaries bound in this scope."""
+
+    used_names: PSet[str]
+    """All of the Python names bound in this scope, both for Pytch variables and
+    for temporaries."""
+
+    next_suffixes: PMap[str, int]
+    """For each preferred name, the suffix from which to start looking for an
+    unused name the next time it's preferred. (All of the names with smaller
+    suffixes are already taken.)"""
 
     def update(self, **kwargs) -> "Scope":
         return attr.evolve(self, **kwargs)
 
     @staticmethod
     def empty() -> "Scope":
-        return Scope(pytch_bindings={}, python_bindings=set())
+        return Scope(
+            pytch_bindings=PMap(),
+            python_bindings=PSet(),
+            used_names=PSet(),
+            next_suffixes=PMap(),
+        )
+
+    def allocate_name(self, preferred_name: str) -> Tuple["Scope", str]:
+        """Get an unused name based on `preferred_name`, and mark it as used.
+
+        Names are never freed in a scope, so rather than probing every suffix
+        from 2 each time, we keep track of where the previous search for the
+        same preferred name left off.
+        """
+        if is_available_name(preferred_name, self.used_names):
+            return (
+                self.update(used_names=self.used_names.add(preferred_name)),
+                preferred_name,
+            )
+
+        suffix = self.next_suffixes.get(preferred_name, 2)
+        while not is_available_name(preferred_name + str(suffix), self.used_names):
+            suffix += 1
+        name = preferred_name + str(suffix)
+        return (
+            self.update(
+                used_names=self.used_names.add(name),
+                next_suffixes=self.next_suffixes.set(preferred_name, suffix + 1),
+            ),
+            name,
+        )
+
+
+def is_available_name(name: str, used_names: PSet[str]) -> bool:
+    return not keyword.iskeyword(name) and name not in used_names
 
 
 @attr.s(auto_attribs=True, frozen=True)
@@ -63,7 +117,7 @@ class Env:
     """
 
     bindation: Bindation
-    scopes: List[Scope]
+    scopes: PVector[Scope]
 
     def _update(self, **kwargs) -> "Env":
         return attr.evolve(self, **kwargs)
@@ -76,11 +130,14 @@ class Env:
         variable names when they're not in the same scope, such as if two
         functions use a local variable of the same name.
         """
-        return self._update(scopes=self.scopes + [Scope.empty()])
+        return self._update(scopes=self.scopes.append(Scope.empty()))
 
     def pop_scope(self) -> "Env":
         assert self.scopes
-        return self._update(scopes=self.scopes[:-1])
+        return self._update(scopes=PVector(self.scopes[:-1]))
+
+    def _update_current_scope(self, scope: Scope) -> "Env":
+        return self._update(scopes=self.scopes.set(len(self.scopes) - 1, scope))
 
     def add_binding(
         self, variable_pattern: VariablePattern, preferred_name: str
@@ -91,19 +148,21 @@ class Env:
         non-colliding name will be generated if there is already such a name
         in the current Python scope.
         """
-        python_name = self._get_name(preferred_name)
-        current_pytch_bindings = dict(self.scopes[-1].pytch_bindings)
-        current_pytch_bindings[variable_pattern] = python_name
-        current_scope = self.scopes[-1].update(pytch_bindings=current_pytch_bindings)
-        return (self._update(scopes=self.scopes[:-1] + [current_scope]), python_name)
+        (current_scope, python_name) = self.scopes[-1].allocate_name(preferred_name)
+        current_scope = current_scope.update(
+            pytch_bindings=current_scope.pytch_bindings.set(
+                variable_pattern, python_name
+            )
+        )
+        return (self._update_current_scope(current_scope), python_name)
 
     def make_temporary(self, preferred_name: str) -> Tuple["Env", str]:
-        python_name = self._get_name(preferred_name)
-        current_python_bindings = set(self.scopes[-1].python_bindings)
-        assert python_name not in current_python_bindings
-        current_python_bindings.add(python_name)
-        current_scope = self.scopes[-1].update(python_bindings=current_python_bindings)
-        return (self._update(scopes=self.scopes[:-1] + [current_scope]), python_name)
+        (current_scope, python_name) = self.scopes[-1].allocate_name(preferred_name)
+        assert python_name not in current_scope.python_bindings
+        current_scope = current_scope.update(
+            python_bindings=current_scope.python_bindings.add(python_name)
+        )
+        return (self._update_current_scope(current_scope), python_name)
 
     def lookup_binding(self, variable_pattern: VariablePattern) -> Optional[str]:
         for scope in reversed(self.scopes):
@@ -111,23 +170,6 @@ class Env:
                 return scope.pytch_bindings[variable_pattern]
         return None
 
-    def _get_name(self, preferred_name: str) -> str:
-        for suggested_name in self._suggest_names(preferred_name):
-            if (
-                not keyword.iskeyword(suggested_name)
-                and suggested_name not in self.scopes[-1].python_bindings
-                and suggested_name not in self.scopes[-1].pytch_bindings.values()
-            ):
-                return suggested_name
-        assert False, "`suggest_names` should loop forever"
-
-    def _suggest_names(self, preferred_name: str):
-        yield preferred_name
-        i = 2
-        while True:
-            yield preferred_name + str(i)
-            i += 1
-
 
 @attr.s(auto_attribs=True, frozen=True)
 class Codegenation:
@@ -135,15 +177,38 @@ class Codegenation:
     errors: List[Error]
 
     def get_compiled_output(self) -> str:
-        compiled_output_lines = []
+        stream = io.StringIO()
+        self.emit_compiled_output(stream)
+        return stream.getvalue()
+
+    def emit_compiled_output(self, stream: TextIO) -> None:
+        """Write the compiled output to `stream` as it's generated, rather than
+        building it up in memory first."""
+        emitter = Emitter(stream)
         for statement in self.statements:
-            compiled_output_lines.extend(statement.compile())
-        return "".join(line + "\n" for line in compiled_output_lines)
+            statement.emit(emitter)
+
+    def get_compiled_module(self) -> ast.Module:
+        """Get the compiled output as a Python AST, without generating its
+        source code.
+
+        The line numbers in the AST are those of the lines in
+        `get_compiled_output`.
+        """
+        (body, _lineno) = lower_statements(self.statements, lineno=1, col_offset=0)
+        return ast.Module(body=body, type_ignores=[])
 
+    def get_compiled_code(self, filename: str = "<string>") -> CodeType:
+        """Compile the output into a Python code object, which can be passed to
+        `exec`.
 
-def compile_expr(
-    env: Env, expr: Expr
-) -> Tuple[
+        This skips generating the Python source code, and having Python parse
+        it again.
+        """
+        return compile(self.get_compiled_module(), filename=filename, mode="exec")
+
+
+CompiledExpr = Tuple[
     Env,
     # A Python expression that evaluates to its corresponding Pytch expression.
     PyExpr,
@@ -161,33 +226,55 @@ def compile_expr(
     # In this case, the expression `helper` would be the `PyExpr` above, and
     # the definition of the helper function would be the `PyStmtList`.
     PyStmtList,
-]:
-    if isinstance(expr, LetExpr):
+]
+
+
+class ExprCompiler(Visitor[MaybeTrampoline[CompiledExpr]]):
+    def visit_let_expr(self, expr: LetExpr, env: Env) -> Trampoline[CompiledExpr]:
         return compile_let_expr(env, expr)
-    elif isinstance(expr, DefExpr):
+
+    def visit_def_expr(self, expr: DefExpr, env: Env) -> Trampoline[CompiledExpr]:
         return compile_def_expr(env, expr)
-    elif isinstance(expr, IfExpr):
+
+    def visit_if_expr(self, expr: IfExpr, env: Env) -> Trampoline[CompiledExpr]:
         return compile_if_expr(env, expr)
-    elif isinstance(expr, FunctionCallExpr):
+
+    def visit_function_call_expr(
+        self, expr: FunctionCallExpr, env: Env
+    ) -> Trampoline[CompiledExpr]:
         return compile_function_call_expr(env, expr)
-    elif isinstance(expr, BinaryExpr):
+
+    def visit_binary_expr(self, expr: BinaryExpr, env: Env) -> Trampoline[CompiledExpr]:
         return compile_binary_expr(env, expr)
-    elif isinstance(expr, IdentifierExpr):
+
+    def visit_identifier_expr(self, expr: IdentifierExpr, env: Env) -> CompiledExpr:
         return compile_identifier_expr(env, expr)
-    elif isinstance(expr, IntLiteralExpr):
+
+    def visit_int_literal_expr(self, expr: IntLiteralExpr, env: Env) -> CompiledExpr:
         return compile_int_literal_expr(env, expr)
-    elif isinstance(expr, StringLiteralExpr):
+
+    def visit_string_literal_expr(
+        self, expr: StringLiteralExpr, env: Env
+    ) -> CompiledExpr:
         return compile_string_literal_expr(env, expr)
-    else:
+
+    def visit_expr(self, expr: Expr, env: Env) -> CompiledExpr:
         raise NotImplementedError(f"Unhandled expr type {expr.__class__.__name__}")
 
 
+EXPR_COMPILER = ExprCompiler()
+
+
+def compile_expr(env: Env, expr: Expr) -> MaybeTrampoline[CompiledExpr]:
+    return EXPR_COMPILER.visit(expr, env)
+
+
 PY_EXPR_NO_TARGET = PyUnavailableExpr("should have been directly stored already")
 
 
 def compile_expr_target(
     env: Env, expr: Expr, target: PyIdentifierExpr, preferred_name: str
-) -> Tuple[Env, PyStmtList]:
+) -> MaybeTrampoline[Tuple[Env, PyStmtList]]:
     """Like `compile_expr`, but store the result in the given target.
 
     This cleans up the generated code by avoiding temporary stores that make
@@ -223,51 +310,117 @@ def compile_expr_target(
     print(foo)
     ```
     """
-    if isinstance(expr, LetExpr):
-        (env, _py_expr, statements) = compile_let_expr(
+    return EXPR_TARGET_COMPILER.visit(expr, env, target)
+
+
+class ExprTargetCompiler(Visitor[MaybeTrampoline[Tuple[Env, PyStmtList]]]):
+    def visit_let_expr(
+        self, expr: LetExpr, env: Env, target: PyIdentifierExpr
+    ) -> Trampoline[Tuple[Env, PyStmtList]]:
+        (env, _py_expr, statements) = yield compile_let_expr(
             env, let_expr=expr, target=target
         )
         return (env, statements)
-    elif isinstance(expr, IfExpr):
-        (env, _py_expr, statements) = compile_if_expr(env, if_expr=expr, target=target)
+
+    def visit_if_expr(
+        self, expr: IfExpr, env: Env, target: PyIdentifierExpr
+    ) -> Trampoline[Tuple[Env, PyStmtList]]:
+        (env, _py_expr, statements) = yield compile_if_expr(
+            env, if_expr=expr, target=target
+        )
         return (env, statements)
-    elif isinstance(expr, IntLiteralExpr):
+
+    def visit_int_literal_expr(
+        self, expr: IntLiteralExpr, env: Env, target: PyIdentifierExpr
+    ) -> Tuple[Env, PyStmtList]:
         (env, _py_expr, statements) = compile_int_literal_expr(env, expr, target=target)
         return (env, statements)
-    else:
-        (env, py_expr, statements) = compile_expr(env, expr)
+
+    def visit_expr(
+        self, expr: Expr, env: Env, target: PyIdentifierExpr
+    ) -> Trampoline[Tuple[Env, PyStmtList]]:
+        (env, py_expr, statements) = yield compile_expr(env, expr)
         statements = statements + [PyAssignmentStmt(lhs=target, rhs=py_expr)]
         return (env, statements)
 
 
+EXPR_TARGET_COMPILER = ExprTargetCompiler()
+
+
 def compile_let_expr(
     env: Env, let_expr: LetExpr, target: PyIdentifierExpr = None
-) -> Tuple[Env, PyExpr, PyStmtList]:
+) -> Trampoline[CompiledExpr]:
+    return compile_binding_sequence(env, let_expr, target=target)
+
+
+def compile_binding_sequence(
+    env: Env,
+    expr: Union[LetExpr, DefExpr],
+    target: Optional[PyIdentifierExpr] = None,
+) -> Trampoline[CompiledExpr]:
+    """Compile a let- or def-expression, along with any let- and
+    def-expressions directly in its body, and so on.
+
+    A file's top-level bindings are nested in each other's bodies, so
+    compiling each binding's body separately and prepending the binding's
+    statements to the result would copy the statements of the rest of the
+    file once per binding. Instead, the statements for the whole sequence are
+    appended to a single list.
+    """
+    statements: PyStmtList = []
+    while True:
+        binding_statements: PyStmtList
+        if isinstance(expr, LetExpr):
+            (env, binding_statements) = yield compile_let_binding(
+                env, expr, target=target
+            )
+            n_body = expr.n_body
+        else:
+            (env, binding_statements) = yield compile_def_binding(env, expr)
+            n_body = expr.n_next
+        statements.extend(binding_statements)
+        # Only the outermost expression is compiled with `target`, as though
+        # the bodies had been compiled with `compile_expr`.
+        target = None
+
+        if isinstance(n_body, (LetExpr, DefExpr)):
+            expr = n_body
+            continue
+        if n_body is not None:
+            (env, body_expr, body_statements) = yield compile_expr(env, n_body)
+            statements.extend(body_statements)
+        else:
+            body_expr = PyUnavailableExpr("missing let-expr body")
+        return (env, body_expr, statements)
+
+
+def compile_let_binding(
+    env: Env, let_expr: LetExpr, target: Optional[PyIdentifierExpr]
+) -> Trampoline[Tuple[Env, PyStmtList]]:
     n_pattern = let_expr.n_pattern
     n_value = let_expr.n_value
-    py_binding_statements: PyStmtList
+    py_binding_statements: PyStmtList = []
     if n_pattern is not None and n_value is not None:
         if target is not None:
-            (env, py_binding_statements) = compile_expr_target(
+            (env, py_binding_statements) = yield compile_expr_target(
                 env, n_value, target=target, preferred_name="_tmp_let"
             )
         else:
-            (env, py_binding_statements) = compile_assign_to_pattern(
+            (env, py_binding_statements) = yield compile_assign_to_pattern(
                 env, expr=n_value, pattern=n_pattern
             )
-
-    if let_expr.n_body is not None:
-        (env, body_expr, body_statements) = compile_expr(env, let_expr.n_body)
-    else:
-        body_expr = PyUnavailableExpr("missing let-expr body")
-        body_statements = []
-
-    return (env, body_expr, py_binding_statements + body_statements)
+    return (env, py_binding_statements)
 
 
 def compile_def_expr(
     env: Env, def_expr: DefExpr, target: PyIdentifierExpr = None
-) -> Tuple[Env, PyExpr, PyStmtList]:
+) -> Trampoline[CompiledExpr]:
+    return compile_binding_sequence(env, def_expr, target=target)
+
+
+def compile_def_binding(
+    env: Env, def_expr: DefExpr
+) -> Trampoline[Tuple[Env, PyStmtList]]:
     n_name = def_expr.n_name
     function_name = None
     if n_name is not None:
@@ -313,9 +466,11 @@ def compile_def_expr(
                 )
                 py_parameters.append(PyParameter(name=parameter_name))
 
-        (env, py_function_body_return_expr, py_function_body_statements) = compile_expr(
-            env, n_definition
-        )
+        (
+            env,
+            py_function_body_return_expr,
+            py_function_body_statements,
+        ) = yield compile_expr(env, n_definition)
         env = env.pop_scope()
         py_binding_statements = [
             PyFunctionStmt(
@@ -326,25 +481,19 @@ def compile_def_expr(
             )
         ]
 
-    n_next = def_expr.n_next
-    if n_next is not None:
-        (env, next_expr, next_statements) = compile_expr(env, n_next)
-    else:
-        next_expr = PyUnavailableExpr("missing let-expr body")
-        next_statements = []
-    return (env, next_expr, py_binding_statements + next_statements)
+    return (env, py_binding_statements)
 
 
 def compile_if_expr(
     env: Env, if_expr: IfExpr, target: PyIdentifierExpr = None
-) -> Tuple[Env, PyExpr, PyStmtList]:
+) -> Trampoline[CompiledExpr]:
     n_if_expr = if_expr.n_if_expr
     n_then_expr = if_expr.n_then_expr
     n_else_expr = if_expr.n_else_expr
 
     if n_if_expr is None:
         return (env, PyUnavailableExpr("missing if condition"), [])
-    (env, py_if_expr, py_if_statements) = compile_expr(env, n_if_expr)
+    (env, py_if_expr, py_if_statements) = yield compile_expr(env, n_if_expr)
 
     # Check `n_then_expr` here to avoid making a temporary and not using it.
     if target is None and n_then_expr is not None:
@@ -356,7 +505,7 @@ def compile_if_expr(
         return (env, PyUnavailableExpr("missing then expression"), [])
     if n_else_expr is not None:
         assert target is not None
-        (env, py_then_statements) = compile_expr_target(
+        (env, py_then_statements) = yield compile_expr_target(
             env, n_then_expr, target=target, preferred_name="_tmp_if"
         )
     else:
@@ -377,14 +526,14 @@ def compile_if_expr(
         #     else:
         #         _tmp_if = None
         #     _tmp_if
-        (env, py_body_expr, py_then_statements) = compile_expr(env, n_then_expr)
+        (env, py_body_expr, py_then_statements) = yield compile_expr(env, n_then_expr)
         py_then_statements = py_then_statements + [PyExprStmt(expr=py_body_expr)]
         target = None
 
     py_else_statements: Optional[PyStmtList] = None
     if n_else_expr is not None:
         assert target is not None
-        (env, py_else_statements) = compile_expr_target(
+        (env, py_else_statements) = yield compile_expr_target(
             env, n_else_expr, target=target, preferred_name="_tmp_if"
         )
 
@@ -403,7 +552,7 @@ def compile_if_expr(
 
 def compile_assign_to_pattern(
     env: Env, expr: Expr, pattern: Pattern
-) -> Tuple[Env, PyStmtList]:
+) -> Trampoline[Tuple[Env, PyStmtList]]:
     if isinstance(pattern, VariablePattern):
         t_identifier = pattern.t_identifier
         if t_identifier is None:
@@ -421,8 +570,10 @@ def compile_assign_to_pattern(
         preferred_name = t_identifier.text
         (env, name) = env.add_binding(pattern, preferred_name=preferred_name)
         target = PyIdentifierExpr(name=name)
-        return compile_expr_target(
-            env, expr=expr, target=target, preferred_name=preferred_name
+        return (
+            yield compile_expr_target(
+                env, expr=expr, target=target, preferred_name=preferred_name
+            )
         )
     else:
         assert False, f"unimplemented pattern: {pattern.__class__.__name__}"
@@ -430,10 +581,12 @@ def compile_assign_to_pattern(
 
 def compile_function_call_expr(
     env: Env, function_call_expr: FunctionCallExpr
-) -> Tuple[Env, PyExpr, PyStmtList]:
+) -> Trampoline[CompiledExpr]:
     n_callee = function_call_expr.n_callee
     if n_callee is not None:
-        (env, py_callee_expr, py_receiver_statements) = compile_expr(env, n_callee)
+        (env, py_callee_expr, py_receiver_statements) = yield compile_expr(
+            env, n_callee
+        )
     else:
         return (env, PyUnavailableExpr("missing function callee"), [])
 
@@ -446,7 +599,7 @@ def compile_function_call_expr(
     for argument in n_argument_list.arguments:
         if argument.n_expr is None:
             return (env, PyUnavailableExpr("missing argument"), [])
-        (env, py_argument_expr, py_argument_statements) = compile_expr(
+        (env, py_argument_expr, py_argument_statements) = yield compile_expr(
             env, argument.n_expr
         )
         py_arguments.append(PyArgument(value=py_argument_expr))
@@ -464,7 +617,7 @@ def compile_function_call_expr(
 
 def compile_binary_expr(
     env: Env, binary_expr: BinaryExpr
-) -> Tuple[Env, PyExpr, PyStmtList]:
+) -> Trampoline[CompiledExpr]:
     n_lhs = binary_expr.n_lhs
     if n_lhs is None:
         return (env, PyUnavailableExpr("missing lhs"), [])
@@ -477,8 +630,8 @@ def compile_binary_expr(
     if n_rhs is None:
         return (env, PyUnavailableExpr("missing rhs"), [])
 
-    (env, py_lhs_expr, lhs_statements) = compile_expr(env, expr=n_lhs)
-    (env, py_rhs_expr, rhs_statements) = compile_expr(env, expr=n_rhs)
+    (env, py_lhs_expr, lhs_statements) = yield compile_expr(env, expr=n_lhs)
+    (env, py_rhs_expr, rhs_statements) = yield compile_expr(env, expr=n_rhs)
 
     if t_operator.kind == TokenKind.DUMMY_SEMICOLON:
         statements = lhs_statements + [PyExprStmt(expr=py_lhs_expr)] + rhs_statements
@@ -494,7 +647,7 @@ def compile_binary_expr(
 
 def compile_identifier_expr(
     env: Env, identifier_expr: IdentifierExpr
-) -> Tuple[Env, PyExpr, PyStmtList]:
+) -> CompiledExpr:
     sources = env.bindation.get(identifier_expr)
     if not sources:
         t_identifier = identifier_expr.t_identifier
@@ -518,7 +671,7 @@ def compile_identifier_expr(
 
 def compile_int_literal_expr(
     env: Env, int_literal_expr: IntLiteralExpr, target: PyIdentifierExpr = None
-) -> Tuple[Env, PyExpr, PyStmtList]:
+) -> CompiledExpr:
     t_int_literal = int_literal_expr.t_int_literal
     if t_int_literal is None:
         return (env, PyUnavailableExpr("missing int literal"), [])
@@ -534,7 +687,7 @@ def compile_int_literal_expr(
 
 def compile_string_literal_expr(
     env: Env, string_literal_expr: StringLiteralExpr, target: PyIdentifierExpr = None
-) -> Tuple[Env, PyExpr, PyStmtList]:
+) -> CompiledExpr:
     t_string_literal = string_literal_expr.t_string_literal
     if t_string_literal is None:
         return (env, PyUnavailableExpr("missing string literal"), [])
@@ -550,8 +703,8 @@ def compile_string_literal_expr(
 def codegen(
     syntax_tree: SyntaxTree, bindation: Bindation, typeation: Typeation
 ) -> Codegenation:
-    env = Env(bindation=bindation, scopes=[Scope.empty()])
+    env = Env(bindation=bindation, scopes=PVector([Scope.empty()]))
     if syntax_tree.n_expr is None:
         return Codegenation(statements=[], errors=[])
-    (env, expr, statements) = compile_expr(env, syntax_tree.n_expr)
+    (env, expr, statements) = run_trampoline(compile_expr(env, syntax_tree.n_expr))
     return Codegenation(statements=statements + [PyExprStmt(expr=expr)], errors=[])
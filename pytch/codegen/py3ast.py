@@ -1,4 +1,7 @@
-from typing import List, Optional
+import ast
+import contextlib
+import io
+from typing import Iterator, List, Optional, TextIO, Tuple, Union
 
 import attr
 
@@ -7,6 +10,29 @@ from pytch import ISSUE_TRACKER_URL
 
 CompiledOutput = List[str]
 
+LiteralValue = Union[str, bytes, bool, int, float, complex, None]
+"""The values of the Python literals which `PyLiteralExpr` can hold."""
+
+LoweredStmts = Tuple[
+    List[ast.stmt],
+    # The line number of the line after the statements, as they would appear in
+    # the compiled output.
+    int,
+]
+
+PY_CONSTANT_NAMES = {"True": True, "False": False, "None": None}
+"""Names which are keywords in Python 3, and so are constants rather than
+variables in its AST."""
+
+# AST nodes without fields can be shared between their parents, the same as
+# Python itself does when parsing.
+PY_LOAD = ast.Load()
+PY_STORE = ast.Store()
+
+PY_BINARY_OPERATORS = {"+": ast.Add(), "-": ast.Sub()}
+
+PY_BOOLEAN_OPERATORS = {"and": ast.And(), "or": ast.Or()}
+
 
 class PyExpr:
     def compile(self) -> str:
@@ -14,6 +40,15 @@ class PyExpr:
             f"`PyExpr.compile` not implemented by {self.__class__.__name__}"
         )
 
+    def lower(self, lineno: int, col_offset: int) -> ast.expr:
+        """Convert this expression into a node of Python's own AST.
+
+        The position is that of the statement containing the expression.
+        """
+        raise NotImplementedError(
+            f"`PyExpr.lower` not implemented by {self.__class__.__name__}"
+        )
+
 
 @attr.s(auto_attribs=True, frozen=True)
 class PyUnavailableExpr(PyExpr):
@@ -21,13 +56,20 @@ class PyUnavailableExpr(PyExpr):
 
     reason: str
 
-    def compile(self) -> str:
+    @property
+    def message(self) -> str:
         return (
-            f'"<Bug in Pytch compilation -- '
+            f"<Bug in Pytch compilation -- "
             + f"please report it at {ISSUE_TRACKER_URL} ! "
-            + f'Message: unavailable expr: {self.reason}>"'
+            + f"Message: unavailable expr: {self.reason}>"
         )
 
+    def compile(self) -> str:
+        return f'"{self.message}"'
+
+    def lower(self, lineno: int, col_offset: int) -> ast.expr:
+        return ast.Constant(value=self.message, lineno=lineno, col_offset=col_offset)
+
 
 @attr.s(auto_attribs=True, frozen=True)
 class PyIdentifierExpr(PyExpr):
@@ -36,6 +78,21 @@ class PyIdentifierExpr(PyExpr):
     def compile(self) -> str:
         return self.name
 
+    def lower(self, lineno: int, col_offset: int) -> ast.expr:
+        if self.name in PY_CONSTANT_NAMES:
+            return ast.Constant(
+                value=PY_CONSTANT_NAMES[self.name],
+                lineno=lineno,
+                col_offset=col_offset,
+            )
+        return ast.Name(id=self.name, ctx=PY_LOAD, lineno=lineno, col_offset=col_offset)
+
+    def lower_target(self, lineno: int, col_offset: int) -> ast.expr:
+        assert self.name not in PY_CONSTANT_NAMES
+        return ast.Name(
+            id=self.name, ctx=PY_STORE, lineno=lineno, col_offset=col_offset
+        )
+
 
 @attr.s(auto_attribs=True, frozen=True)
 class PyLiteralExpr(PyExpr):
@@ -44,6 +101,22 @@ class PyLiteralExpr(PyExpr):
     def compile(self) -> str:
         return self.value
 
+    def lower(self, lineno: int, col_offset: int) -> ast.expr:
+        # The value is the source code of a Python literal. Most of them are
+        # integers, which we can convert without invoking Python's parser.
+        # (Python doesn't allow integer literals with leading zeros, and
+        # `isdigit` also accepts non-ASCII digits, which Python doesn't.)
+        value: LiteralValue
+        if (
+            self.value.isascii()
+            and self.value.isdigit()
+            and not self.value.startswith("0")
+        ):
+            value = int(self.value)
+        else:
+            value = ast.literal_eval(self.value)
+        return ast.Constant(value=value, lineno=lineno, col_offset=col_offset)
+
 
 @attr.s(auto_attribs=True, frozen=True)
 class PyArgument:
@@ -52,6 +125,9 @@ class PyArgument:
     def compile(self) -> str:
         return self.value.compile()
 
+    def lower(self, lineno: int, col_offset: int) -> ast.expr:
+        return self.value.lower(lineno, col_offset)
+
 
 @attr.s(auto_attribs=True, frozen=True)
 class PyFunctionCallExpr(PyExpr):
@@ -65,6 +141,15 @@ class PyFunctionCallExpr(PyExpr):
         compiled_arguments_str = ", ".join(compiled_arguments)
         return f"{self.callee.compile()}({compiled_arguments_str})"
 
+    def lower(self, lineno: int, col_offset: int) -> ast.expr:
+        return ast.Call(
+            func=self.callee.lower(lineno, col_offset),
+            args=[argument.lower(lineno, col_offset) for argument in self.arguments],
+            keywords=[],
+            lineno=lineno,
+            col_offset=col_offset,
+        )
+
 
 @attr.s(auto_attribs=True, frozen=True)
 class PyBinaryExpr(PyExpr):
@@ -75,23 +160,90 @@ class PyBinaryExpr(PyExpr):
     def compile(self) -> str:
         return f"{self.lhs.compile()} {self.operator} {self.rhs.compile()}"
 
+    def lower(self, lineno: int, col_offset: int) -> ast.expr:
+        lhs = self.lhs.lower(lineno, col_offset)
+        rhs = self.rhs.lower(lineno, col_offset)
+        if self.operator in PY_BOOLEAN_OPERATORS:
+            return ast.BoolOp(
+                op=PY_BOOLEAN_OPERATORS[self.operator],
+                values=[lhs, rhs],
+                lineno=lineno,
+                col_offset=col_offset,
+            )
+        return ast.BinOp(
+            left=lhs,
+            op=PY_BINARY_OPERATORS[self.operator],
+            right=rhs,
+            lineno=lineno,
+            col_offset=col_offset,
+        )
+
+
+INDENT_WIDTH = 4
+
+
+class Emitter:
+    """Writes compiled output to a stream as it's generated.
+
+    The emitter keeps track of the current indentation, so that statements
+    nested inside of other statements are written out directly, rather than
+    each enclosing statement having to re-indent their lines.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        self._stream = stream
+        self._indentation = ""
+
+    def emit_line(self, line: str) -> None:
+        self._stream.write(self._indentation)
+        self._stream.write(line)
+        self._stream.write("\n")
+
+    @contextlib.contextmanager
+    def indent(self) -> Iterator[None]:
+        """Indent the lines emitted inside of this context."""
+        indentation = self._indentation
+        self._indentation = indentation + " " * INDENT_WIDTH
+        try:
+            yield
+        finally:
+            self._indentation = indentation
+
 
 class PyStmt:
     def compile(self) -> CompiledOutput:
+        stream = io.StringIO()
+        self.emit(Emitter(stream))
+        return stream.getvalue().splitlines()
+
+    def emit(self, emitter: Emitter) -> None:
         raise NotImplementedError(
-            f"`PyStmt.compile` not implemented by {self.__class__.__name__}"
+            f"`PyStmt.emit` not implemented by {self.__class__.__name__}"
         )
 
+    def lower(self, lineno: int, col_offset: int) -> LoweredStmts:
+        """Convert this statement into nodes of Python's own AST.
 
-PyStmtList = List[PyStmt]
+        The nodes are given the positions which they would have in the
+        compiled output, if it started at the given position, so that
+        tracebacks are the same either way.
+        """
+        raise NotImplementedError(
+            f"`PyStmt.lower` not implemented by {self.__class__.__name__}"
+        )
 
 
-@attr.s(auto_attribs=True, frozen=True)
-class PyIndentedStmt:
-    statement: PyStmt
+PyStmtList = List[PyStmt]
 
-    def compile(self) -> CompiledOutput:
-        return ["    " + line for line in self.statement.compile()]
+
+def lower_statements(
+    statements: PyStmtList, lineno: int, col_offset: int
+) -> LoweredStmts:
+    lowered_statements = []
+    for statement in statements:
+        (lowered_statement, lineno) = statement.lower(lineno, col_offset)
+        lowered_statements.extend(lowered_statement)
+    return (lowered_statements, lineno)
 
 
 @attr.s(auto_attribs=True, frozen=True)
@@ -99,16 +251,33 @@ class PyAssignmentStmt(PyStmt):
     lhs: PyIdentifierExpr
     rhs: PyExpr
 
-    def compile(self) -> CompiledOutput:
-        return [f"{self.lhs.compile()} = {self.rhs.compile()}"]
+    def emit(self, emitter: Emitter) -> None:
+        emitter.emit_line(f"{self.lhs.compile()} = {self.rhs.compile()}")
+
+    def lower(self, lineno: int, col_offset: int) -> LoweredStmts:
+        statement = ast.Assign(
+            targets=[self.lhs.lower_target(lineno, col_offset)],
+            value=self.rhs.lower(lineno, col_offset),
+            lineno=lineno,
+            col_offset=col_offset,
+        )
+        return ([statement], lineno + 1)
 
 
 @attr.s(auto_attribs=True, frozen=True)
 class PyReturnStmt(PyStmt):
     expr: PyExpr
 
-    def compile(self) -> CompiledOutput:
-        return [f"return {self.expr.compile()}"]
+    def emit(self, emitter: Emitter) -> None:
+        emitter.emit_line(f"return {self.expr.compile()}")
+
+    def lower(self, lineno: int, col_offset: int) -> LoweredStmts:
+        statement = ast.Return(
+            value=self.expr.lower(lineno, col_offset),
+            lineno=lineno,
+            col_offset=col_offset,
+        )
+        return ([statement], lineno + 1)
 
 
 @attr.s(auto_attribs=True, frozen=True)
@@ -117,18 +286,34 @@ class PyIfStmt(PyStmt):
     then_statements: PyStmtList
     else_statements: Optional[PyStmtList]  # noqa: E701
 
-    def compile(self) -> CompiledOutput:
-        if_statements = [f"if {self.if_expr.compile()}:"]
-        for statement in self.then_statements:
-            if_statements.extend(PyIndentedStmt(statement=statement).compile())
+    def emit(self, emitter: Emitter) -> None:
+        emitter.emit_line(f"if {self.if_expr.compile()}:")
+        with emitter.indent():
+            for statement in self.then_statements:
+                statement.emit(emitter)
 
-        else_statements = []
         if self.else_statements is not None:
             assert self.else_statements
-            else_statements.append("else:")
-            for statement in self.else_statements:
-                else_statements.extend(PyIndentedStmt(statement=statement).compile())
-        return if_statements + else_statements
+            emitter.emit_line("else:")
+            with emitter.indent():
+                for statement in self.else_statements:
+                    statement.emit(emitter)
+
+    def lower(self, lineno: int, col_offset: int) -> LoweredStmts:
+        test = self.if_expr.lower(lineno, col_offset)
+        (body, next_lineno) = lower_statements(
+            self.then_statements, lineno + 1, col_offset + INDENT_WIDTH
+        )
+        orelse: List[ast.stmt] = []
+        if self.else_statements is not None:
+            assert self.else_statements
+            (orelse, next_lineno) = lower_statements(
+                self.else_statements, next_lineno + 1, col_offset + INDENT_WIDTH
+            )
+        statement = ast.If(
+            test=test, body=body, orelse=orelse, lineno=lineno, col_offset=col_offset
+        )
+        return ([statement], next_lineno)
 
 
 @attr.s(auto_attribs=True, frozen=True)
@@ -146,23 +331,60 @@ class PyFunctionStmt(PyStmt):
     body_statements: PyStmtList
     return_expr: PyExpr
 
-    def compile(self) -> CompiledOutput:
+    def emit(self, emitter: Emitter) -> None:
         parameters = ", ".join(parameter.compile() for parameter in self.parameters)
-        body_statements = []
-        for statement in self.body_statements:
-            body_statements.extend(PyIndentedStmt(statement=statement).compile())
-
-        return_statement = PyIndentedStmt(statement=PyReturnStmt(expr=self.return_expr))
-        body_statements.extend(return_statement.compile())
-
-        return [f"def {self.name}({parameters}):", *body_statements]
+        emitter.emit_line(f"def {self.name}({parameters}):")
+        with emitter.indent():
+            for statement in self.body_statements:
+                statement.emit(emitter)
+            PyReturnStmt(expr=self.return_expr).emit(emitter)
+
+    def lower(self, lineno: int, col_offset: int) -> LoweredStmts:
+        arguments = ast.arguments(
+            posonlyargs=[],
+            args=[
+                ast.arg(
+                    arg=parameter.name,
+                    lineno=lineno,
+                    col_offset=col_offset,
+                )
+                for parameter in self.parameters
+            ],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[],
+        )
+        (body, next_lineno) = lower_statements(
+            self.body_statements + [PyReturnStmt(expr=self.return_expr)],
+            lineno + 1,
+            col_offset + INDENT_WIDTH,
+        )
+        statement = ast.FunctionDef(
+            name=self.name,
+            args=arguments,
+            body=body,
+            decorator_list=[],
+            lineno=lineno,
+            col_offset=col_offset,
+        )
+        return ([statement], next_lineno)
 
 
 @attr.s(auto_attribs=True, frozen=True)
 class PyExprStmt(PyStmt):
     expr: PyExpr
 
-    def compile(self) -> CompiledOutput:
+    def emit(self, emitter: Emitter) -> None:
         if isinstance(self.expr, PyUnavailableExpr):
-            return []
-        return [f"{self.expr.compile()}"]
+            return
+        emitter.emit_line(f"{self.expr.compile()}")
+
+    def lower(self, lineno: int, col_offset: int) -> LoweredStmts:
+        if isinstance(self.expr, PyUnavailableExpr):
+            return ([], lineno)
+        statement = ast.Expr(
+            value=self.expr.lower(lineno, col_offset),
+            lineno=lineno,
+            col_offset=col_offset,
+        )
+        return ([statement], lineno + 1)
@@ -1,8 +1,22 @@
+"""Persistent containers.
+
+The compiler updates these containers for most syntax nodes it visits, so the
+latest versions of large containers are always young objects to the cyclic
+garbage collector. A container whose internal nodes aren't separate Python
+objects, like a C extension's vector, is traversed in full whenever a young
+version of it is collected, which made compiling quadratic in practice.
+
+Instead, these containers are tries of tuples with up to 32 children. An
+update copies only the path to the element it changes, and shares every other
+node with the previous version, so the collector only traverses the new nodes.
+"""
 from typing import (
     AbstractSet,
+    Any,
     Callable,
     Iterable,
     Iterator,
+    List,
     Mapping,
     Optional,
     overload,
@@ -12,19 +26,31 @@ from typing import (
     Union,
 )
 
-import pyrsistent as p
-from pyrsistent import pmap, pset, pvector
+import attr
 
 
 Tk = TypeVar("Tk")
 Tv = TypeVar("Tv")
-Tv_in = TypeVar("Tv_in")
 Tv_out = TypeVar("Tv_out")
 
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+_HASH_MASK = (1 << 64) - 1
+
+_MISSING = object()
+
 
 class PSet(AbstractSet[Tk]):
     def __init__(self, iterable: Iterable[Tk] = None) -> None:
-        self._container: p.PSet[Tk] = pset(iterable or [])
+        self._container: PMap[Tk, None]
+        if isinstance(iterable, PMap):
+            # Share the underlying map rather than copying it. See `PMap`.
+            self._container = iterable
+        else:
+            self._container = PMap.of_entries(
+                (element, None) for element in iterable or []
+            )
 
     # TODO: tighten up `__contains__` to only accept `Tk`.
     def __contains__(self, key: object) -> bool:
@@ -41,12 +67,75 @@ class PSet(AbstractSet[Tk]):
         return f"PSet([{elements}])"
 
     def add(self, key: Tk) -> "PSet[Tk]":
-        return PSet(self._container.add(key))
+        return PSet(self._container.set(key, None))
+
+
+def _new_path(shift: int, element: Any) -> tuple:
+    """Make the nodes leading down to a leaf containing only `element`."""
+    node: tuple = (element,)
+    for _ in range(0, shift, _BITS):
+        node = (node,)
+    return node
+
+
+def _vector_append(node: tuple, shift: int, index: int, element: Any) -> tuple:
+    if shift == 0:
+        return node + (element,)
+    child_index = (index >> shift) & _MASK
+    if child_index < len(node):
+        child = _vector_append(node[child_index], shift - _BITS, index, element)
+        return node[:child_index] + (child,)
+    return node + (_new_path(shift - _BITS, element),)
+
+
+def _vector_set(node: tuple, shift: int, index: int, element: Any) -> tuple:
+    child_index = (index >> shift) & _MASK
+    if shift == 0:
+        child = element
+    else:
+        child = _vector_set(node[child_index], shift - _BITS, index, element)
+    return node[:child_index] + (child,) + node[child_index + 1 :]
+
+
+def _iter_vector(node: tuple, shift: int) -> Iterator[Any]:
+    if shift == 0:
+        yield from node
+    else:
+        for child in node:
+            yield from _iter_vector(child, shift - _BITS)
 
 
 class PVector(Sequence[Tv]):
+    """A persistent vector, stored as a trie indexed by the bits of each
+    element's index, from most to least significant."""
+
     def __init__(self, iterable: Iterable[Tv] = None) -> None:
-        self._container: p.PVector = pvector(iterable or [])
+        nodes: List[tuple] = []
+        elements = list(iterable or [])
+        for i in range(0, len(elements), _WIDTH):
+            nodes.append(tuple(elements[i : i + _WIDTH]))
+        shift = 0
+        while len(nodes) > 1:
+            nodes = [tuple(nodes[i : i + _WIDTH]) for i in range(0, len(nodes), _WIDTH)]
+            shift += _BITS
+        self._count = len(elements)
+        self._shift = shift
+        self._root: tuple = nodes[0] if nodes else ()
+
+    @classmethod
+    def _of_root(cls, count: int, shift: int, root: tuple) -> "PVector[Tv]":
+        vector: PVector[Tv] = cls.__new__(cls)
+        vector._count = count
+        vector._shift = shift
+        vector._root = root
+        return vector
+
+    def _normalize_index(self, index: int) -> int:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("PVector index out of range")
+        return index
 
     @overload
     def __getitem__(self, item: int) -> Tv:
@@ -59,49 +148,276 @@ class PVector(Sequence[Tv]):
     def __getitem__(  # noqa: F811
         self, index: Union[int, slice]
     ) -> Union[Tv, Sequence[Tv]]:
-        return self._container[index]
+        if isinstance(index, slice):
+            return PVector(self[i] for i in range(*index.indices(self._count)))
+        index = self._normalize_index(index)
+        node = self._root
+        for shift in range(self._shift, 0, -_BITS):
+            node = node[(index >> shift) & _MASK]
+        return node[index & _MASK]
+
+    def __iter__(self) -> Iterator[Tv]:
+        return _iter_vector(self._root, self._shift)
 
     def __len__(self) -> int:
-        return len(self._container)
+        return self._count
 
     def __repr__(self) -> str:
-        elements = ", ".join(repr(element) for element in self._container)
+        elements = ", ".join(repr(element) for element in self)
         return f"PVector([{elements}])"
 
     def append(self, element: Tv) -> "PVector[Tv]":
-        return PVector(self._container.append(element))
-
-    def map(self, f: Callable[[Tv_in], Tv_out]) -> "PVector[Tv_out]":
-        return PVector(self._container.transform(None, f))
+        shift = self._shift
+        if self._count == _WIDTH << shift:
+            root = (self._root, _new_path(shift, element))
+            shift += _BITS
+        else:
+            root = _vector_append(self._root, shift, self._count, element)
+        return PVector._of_root(self._count + 1, shift, root)
+
+    def set(self, index: int, element: Tv) -> "PVector[Tv]":
+        if index == self._count:
+            return self.append(element)
+        index = self._normalize_index(index)
+        root = _vector_set(self._root, self._shift, index, element)
+        return PVector._of_root(self._count, self._shift, root)
+
+    def map(self, f: Callable[[Tv], Tv_out]) -> "PVector[Tv_out]":
+        return PVector(f(element) for element in self)
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class _HashLeaf:
+    """The entries in a `PMap` whose keys have the hash `key_hash`.
+
+    There's usually only one, unless keys' hashes collide.
+    """
+
+    key_hash: int
+    entries: Tuple[Tuple[Any, Any], ...]
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class _HashNode:
+    """A node in a `PMap`'s trie.
+
+    Each bit set in `bitmap` corresponds to the child in `children` for the
+    next five bits of the hash, so that empty children don't take up space.
+    Each child is a `_HashNode` or a `_HashLeaf`.
+    """
+
+    bitmap: int
+    children: tuple
+
+
+_EMPTY_HASH_NODE = _HashNode(bitmap=0, children=())
+
+
+def _child_position(node: _HashNode, bit: int) -> int:
+    return bin(node.bitmap & (bit - 1)).count("1")
+
+
+def _merge_leaves(lhs: _HashLeaf, rhs: _HashLeaf, shift: int) -> _HashNode:
+    lhs_index = (lhs.key_hash >> shift) & _MASK
+    rhs_index = (rhs.key_hash >> shift) & _MASK
+    if lhs_index == rhs_index:
+        child = _merge_leaves(lhs, rhs, shift + _BITS)
+        return _HashNode(bitmap=1 << lhs_index, children=(child,))
+    children = (lhs, rhs) if lhs_index < rhs_index else (rhs, lhs)
+    return _HashNode(bitmap=(1 << lhs_index) | (1 << rhs_index), children=children)
+
+
+def _hash_set(
+    node: _HashNode, shift: int, key_hash: int, key: Any, value: Any
+) -> Tuple[_HashNode, bool]:
+    """Set `key` to `value`, and return whether `key` is a new key."""
+    bit = 1 << ((key_hash >> shift) & _MASK)
+    position = _child_position(node, bit)
+    children = node.children
+    if not node.bitmap & bit:
+        leaf = _HashLeaf(key_hash=key_hash, entries=((key, value),))
+        return (
+            _HashNode(
+                bitmap=node.bitmap | bit,
+                children=children[:position] + (leaf,) + children[position:],
+            ),
+            True,
+        )
+
+    child = children[position]
+    is_new_key = True
+    if isinstance(child, _HashNode):
+        (child, is_new_key) = _hash_set(child, shift + _BITS, key_hash, key, value)
+    elif child.key_hash == key_hash:
+        entries = child.entries
+        for (i, (old_key, old_value)) in enumerate(entries):
+            if old_key is key or old_key == key:
+                if old_value is value:
+                    return (node, False)
+                entries = entries[:i] + ((key, value),) + entries[i + 1 :]
+                is_new_key = False
+                break
+        else:
+            entries = entries + ((key, value),)
+        child = _HashLeaf(key_hash=key_hash, entries=entries)
+    else:
+        leaf = _HashLeaf(key_hash=key_hash, entries=((key, value),))
+        child = _merge_leaves(child, leaf, shift + _BITS)
+    return (
+        _HashNode(
+            bitmap=node.bitmap,
+            children=children[:position] + (child,) + children[position + 1 :],
+        ),
+        is_new_key,
+    )
+
+
+def _hash_remove(
+    node: _HashNode, shift: int, key_hash: int, key: Any
+) -> Optional[_HashNode]:
+    """Remove `key`, returning `node` itself if `key` isn't present, or `None`
+    if the node is now empty."""
+    bit = 1 << ((key_hash >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+    position = _child_position(node, bit)
+    children = node.children
+    child = children[position]
+    new_child: Union[_HashNode, _HashLeaf, None]
+    if isinstance(child, _HashNode):
+        new_child = _hash_remove(child, shift + _BITS, key_hash, key)
+    elif child.key_hash == key_hash:
+        entries = tuple(
+            (old_key, value)
+            for (old_key, value) in child.entries
+            if not (old_key is key or old_key == key)
+        )
+        if len(entries) == len(child.entries):
+            new_child = child
+        elif entries:
+            new_child = _HashLeaf(key_hash=key_hash, entries=entries)
+        else:
+            new_child = None
+    else:
+        new_child = child
+
+    if new_child is child:
+        return node
+    elif new_child is not None:
+        children = children[:position] + (new_child,) + children[position + 1 :]
+        return _HashNode(bitmap=node.bitmap, children=children)
+    elif node.bitmap == bit:
+        return None
+    else:
+        children = children[:position] + children[position + 1 :]
+        return _HashNode(bitmap=node.bitmap & ~bit, children=children)
+
+
+def _iter_hash_entries(node: _HashNode) -> Iterator[Tuple[Any, Any]]:
+    for child in node.children:
+        if isinstance(child, _HashNode):
+            yield from _iter_hash_entries(child)
+        else:
+            yield from child.entries
 
 
 class PMap(Mapping[Tk, Tv]):
+    """A persistent map, stored as a hash array mapped trie (Bagwell 2001)
+    indexed by the bits of each key's hash, from least to most significant."""
+
     def __init__(self, mapping: Mapping[Tk, Tv] = None) -> None:
-        self._container: p.PMap[Tk, Tv] = pmap(mapping or {})
+        self._root = _EMPTY_HASH_NODE
+        self._size = 0
+        if mapping:
+            for (key, value) in mapping.items():
+                self._set_in_place(key, value)
+
+    def _set_in_place(self, key: Tk, value: Tv) -> None:
+        (self._root, is_new_key) = _hash_set(
+            self._root, 0, hash(key) & _HASH_MASK, key, value
+        )
+        if is_new_key:
+            self._size += 1
+
+    @classmethod
+    def _of_root(cls, root: _HashNode, size: int) -> "PMap[Tk, Tv]":
+        mapping: PMap[Tk, Tv] = cls.__new__(cls)
+        mapping._root = root
+        mapping._size = size
+        return mapping
 
     @classmethod
     def of_entries(cls, iterable: Iterable[Tuple[Tk, Tv]] = None) -> "PMap[Tk, Tv]":
         mapping = dict(iterable or [])
         return cls(mapping)
 
+    def _lookup(self, key: object) -> Any:
+        key_hash = hash(key) & _HASH_MASK
+        node = self._root
+        shift = 0
+        while True:
+            bit = 1 << ((key_hash >> shift) & _MASK)
+            if not node.bitmap & bit:
+                return _MISSING
+            child = node.children[_child_position(node, bit)]
+            if isinstance(child, _HashNode):
+                node = child
+                shift += _BITS
+                continue
+            if child.key_hash == key_hash:
+                for (old_key, value) in child.entries:
+                    if old_key is key or old_key == key:
+                        return value
+            return _MISSING
+
     def __getitem__(self, index: Tk) -> Tv:
-        return self._container[index]
+        value = self._lookup(index)
+        if value is _MISSING:
+            raise KeyError(index)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return self._lookup(key) is not _MISSING
+
+    def get(self, key: Tk, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if value is _MISSING:
+            return default
+        return value
 
     def __iter__(self) -> Iterator[Tk]:
-        return iter(self._container)
+        for (key, _value) in _iter_hash_entries(self._root):
+            yield key
 
     def __len__(self) -> int:
-        return len(self._container)
+        return self._size
 
     def __repr__(self) -> str:
-        elements = ", ".join(f"{k!r}: {v!r}" for k, v in self._container.items())
+        elements = ", ".join(
+            f"{k!r}: {v!r}" for (k, v) in _iter_hash_entries(self._root)
+        )
         return f"PMap({{{elements}}})"
 
     def set(self, key: Tk, value: Tv) -> "PMap[Tk, Tv]":
-        return PMap(self._container.set(key, value))
+        (root, is_new_key) = _hash_set(
+            self._root, 0, hash(key) & _HASH_MASK, key, value
+        )
+        if root is self._root:
+            return self
+        return PMap._of_root(root, self._size + 1 if is_new_key else self._size)
 
     def update(self, bindings: Mapping[Tk, Tv]) -> "PMap[Tk, Tv]":
-        return PMap(self._container.update(bindings))
+        mapping: PMap[Tk, Tv] = PMap._of_root(self._root, self._size)
+        for (key, value) in bindings.items():
+            mapping._set_in_place(key, value)
+        return mapping
+
+    def remove(self, key: Tk) -> "PMap[Tk, Tv]":
+        """Remove `key` from the map, if it's present."""
+        root = _hash_remove(self._root, 0, hash(key) & _HASH_MASK, key)
+        if root is self._root:
+            return self
+        return PMap._of_root(root or _EMPTY_HASH_NODE, self._size - 1)
 
 
 def find(iterable: Iterable[Tv], pred: Callable[[Tv], bool]) -> Optional[Tv]:
@@ -2,19 +2,129 @@
 
 Run `make` to re-generate. Do not edit!
 """
-from typing import List, Optional, Sequence, Union
+from typing import Any, List, Optional, Sequence, Union
 
 from .lexer import Token
 
 
 class Node:
+    # Large files have hundreds of thousands of nodes, so we don't give each of
+    # them a `__dict__`.
+    __slots__ = (
+        "_children",
+        "_first_present_child",
+        "_last_present_child",
+        "_full_width",
+        "_leading_width",
+        "_trailing_width",
+        "_width",
+        "_child_offsets",
+    )
+
+    child_names: Sequence[str] = []
+
+    _child_offsets: Sequence[int]
+    """Set by the `__init__` of each subclass. See `child_offsets`."""
+
     def __init__(self, children: Sequence[Union["Node", Optional["Token"]]]) -> None:
         self._children = children
 
+        # Green nodes are immutable, so we compute their widths and boundary
+        # tokens once here, rather than re-walking the subtree every time
+        # they're asked for. The children have already done the same, so we
+        # only need to look at the immediate children.
+        self._first_present_child = self._find_present_child(children, first=True)
+        self._last_present_child = self._find_present_child(
+            list(reversed(children)), first=False
+        )
+        self._full_width = sum(
+            child.full_width if child is not None else 0 for child in children
+        )
+        if self._first_present_child is None:
+            self._leading_width = 0
+        else:
+            self._leading_width = self._first_present_child.leading_width
+        if self._last_present_child is None:
+            self._trailing_width = 0
+        else:
+            self._trailing_width = self._last_present_child.trailing_width
+        if not children:
+            self._width = 0
+        else:
+            self._width = self._full_width - self._leading_width - self._trailing_width
+
+    @staticmethod
+    def _find_present_child(
+        children: Sequence[Union["Node", Optional["Token"]]], first: bool
+    ) -> Optional["Token"]:
+        for child in children:
+            if child is None:
+                continue
+            if isinstance(child, Token):
+                if not child.is_dummy:
+                    return child
+            else:
+                if first:
+                    present_child = child.first_present_child
+                else:
+                    present_child = child.last_present_child
+                if present_child is not None:
+                    return present_child
+        return None
+
+    @staticmethod
+    def _get_child_offsets(
+        children: Sequence[
+            Union["Node", Optional["Token"], Optional[Sequence["Node"]]]
+        ],
+    ) -> Sequence[int]:
+        offsets = []
+        offset = 0
+        for child in children:
+            offsets.append(offset)
+            if child is None:
+                continue
+            elif isinstance(child, (Node, Token)):
+                offset += child.full_width
+            else:
+                offset += sum(element.full_width for element in child)
+        return tuple(offsets)
+
+    @staticmethod
+    def _get_element_offsets(
+        elements: Optional[Sequence["Node"]], offset: int
+    ) -> Sequence[int]:
+        offsets = []
+        if elements is not None:
+            for element in elements:
+                offsets.append(offset)
+                offset += element.full_width
+        return tuple(offsets)
+
     @property
     def children(self) -> Sequence[Union["Node", Optional["Token"]]]:
         return self._children
 
+    @property
+    def child_offsets(self) -> Sequence[int]:
+        """The offset of each child in `child_names`, relative to the start of
+        this node.
+
+        This lets red nodes compute the offsets of their children without
+        looking at the preceding children.
+        """
+        return self._child_offsets
+
+    def update(self, **kwargs: Any) -> "Node":
+        """Create a copy of this node with the given children replaced.
+
+        The children which aren't replaced are shared with this node.
+        """
+        for name in self.child_names:
+            if name not in kwargs:
+                kwargs[name] = getattr(self, name)
+        return self.__class__(**kwargs)
+
     @property
     def leading_text(self) -> str:
         first_child = self.first_present_child
@@ -58,69 +168,44 @@ class Node:
         return "".join(child.full_text for child in self._children if child is not None)
 
     @property
-    def first_present_child(self) -> Optional[Union["Node", "Token"]]:
-        for child in self.children:
-            if child is None:
-                continue
-            if isinstance(child, Token):
-                if not child.is_dummy:
-                    return child
-            else:
-                child_first_present_child = child.first_present_child
-                if child_first_present_child is not None:
-                    return child_first_present_child
-        return None
+    def first_present_child(self) -> Optional["Token"]:
+        return self._first_present_child
 
     @property
-    def last_present_child(self) -> Optional[Union["Node", "Token"]]:
-        for child in reversed(self.children):
-            if child is None:
-                continue
-            if isinstance(child, Token):
-                if not child.is_dummy:
-                    return child
-            else:
-                child_last_present_child = child.last_present_child
-                if child_last_present_child is not None:
-                    return child_last_present_child
-        return None
+    def last_present_child(self) -> Optional["Token"]:
+        return self._last_present_child
 
     @property
     def leading_width(self) -> int:
-        child = self.first_present_child
-        if child is None:
-            return 0
-        return child.leading_width
+        return self._leading_width
 
     @property
     def trailing_width(self) -> int:
-        child = self.last_present_child
-        if child is None:
-            return 0
-        return child.trailing_width
+        return self._trailing_width
 
     @property
     def width(self) -> int:
-        if not self.children:
-            return 0
-        return self.full_width - self.leading_width - self.trailing_width
+        return self._width
 
     @property
     def full_width(self) -> int:
-        return sum(
-            child.full_width if child is not None else 0 for child in self.children
-        )
+        return self._full_width
 
 
 class Expr(Node):
-    pass
+    __slots__ = ()
 
 
 class SyntaxTree(Node):
+    __slots__ = ("_n_expr", "_t_eof")
+
+    child_names = ["n_expr", "t_eof"]
+
     def __init__(self, n_expr: Optional[Expr], t_eof: Optional[Token]) -> None:
         super().__init__([n_expr, t_eof])
         self._n_expr = n_expr
         self._t_eof = t_eof
+        self._child_offsets = self._get_child_offsets([n_expr, t_eof])
 
     @property
     def n_expr(self) -> Optional[Expr]:
@@ -132,13 +217,18 @@ class SyntaxTree(Node):
 
 
 class Pattern(Node):
-    pass
+    __slots__ = ()
 
 
 class VariablePattern(Pattern):
+    __slots__ = ("_t_identifier",)
+
+    child_names = ["t_identifier"]
+
     def __init__(self, t_identifier: Optional[Token]) -> None:
         super().__init__([t_identifier])
         self._t_identifier = t_identifier
+        self._child_offsets = self._get_child_offsets([t_identifier])
 
     @property
     def t_identifier(self) -> Optional[Token]:
@@ -146,10 +236,15 @@ class VariablePattern(Pattern):
 
 
 class Parameter(Node):
+    __slots__ = ("_n_pattern", "_t_comma")
+
+    child_names = ["n_pattern", "t_comma"]
+
     def __init__(self, n_pattern: Optional[Pattern], t_comma: Optional[Token]) -> None:
         super().__init__([n_pattern, t_comma])
         self._n_pattern = n_pattern
         self._t_comma = t_comma
+        self._child_offsets = self._get_child_offsets([n_pattern, t_comma])
 
     @property
     def n_pattern(self) -> Optional[Pattern]:
@@ -161,6 +256,10 @@ class Parameter(Node):
 
 
 class ParameterList(Node):
+    __slots__ = ("_t_lparen", "_parameters", "_t_rparen", "_parameters_offsets")
+
+    child_names = ["t_lparen", "parameters", "t_rparen"]
+
     def __init__(
         self,
         t_lparen: Optional[Token],
@@ -173,6 +272,10 @@ class ParameterList(Node):
         self._t_lparen = t_lparen
         self._parameters = parameters
         self._t_rparen = t_rparen
+        self._child_offsets = self._get_child_offsets([t_lparen, parameters, t_rparen])
+        self._parameters_offsets = self._get_element_offsets(
+            parameters, self._child_offsets[1]
+        )
 
     @property
     def t_lparen(self) -> Optional[Token]:
@@ -182,12 +285,22 @@ class ParameterList(Node):
     def parameters(self) -> Optional[List[Parameter]]:
         return self._parameters
 
+    @property
+    def parameters_offsets(self) -> Sequence[int]:
+        """The offset of each element of `parameters`, relative to the start
+        of this node."""
+        return self._parameters_offsets
+
     @property
     def t_rparen(self) -> Optional[Token]:
         return self._t_rparen
 
 
 class LetExpr(Expr):
+    __slots__ = ("_t_let", "_n_pattern", "_t_equals", "_n_value", "_t_in", "_n_body")
+
+    child_names = ["t_let", "n_pattern", "t_equals", "n_value", "t_in", "n_body"]
+
     def __init__(
         self,
         t_let: Optional[Token],
@@ -204,6 +317,9 @@ class LetExpr(Expr):
         self._n_value = n_value
         self._t_in = t_in
         self._n_body = n_body
+        self._child_offsets = self._get_child_offsets(
+            [t_let, n_pattern, t_equals, n_value, t_in, n_body]
+        )
 
     @property
     def t_let(self) -> Optional[Token]:
@@ -231,6 +347,26 @@ class LetExpr(Expr):
 
 
 class DefExpr(Expr):
+    __slots__ = (
+        "_t_def",
+        "_n_name",
+        "_n_parameter_list",
+        "_t_double_arrow",
+        "_n_definition",
+        "_t_in",
+        "_n_next",
+    )
+
+    child_names = [
+        "t_def",
+        "n_name",
+        "n_parameter_list",
+        "t_double_arrow",
+        "n_definition",
+        "t_in",
+        "n_next",
+    ]
+
     def __init__(
         self,
         t_def: Optional[Token],
@@ -259,6 +395,17 @@ class DefExpr(Expr):
         self._n_definition = n_definition
         self._t_in = t_in
         self._n_next = n_next
+        self._child_offsets = self._get_child_offsets(
+            [
+                t_def,
+                n_name,
+                n_parameter_list,
+                t_double_arrow,
+                n_definition,
+                t_in,
+                n_next,
+            ]
+        )
 
     @property
     def t_def(self) -> Optional[Token]:
@@ -290,6 +437,26 @@ class DefExpr(Expr):
 
 
 class IfExpr(Expr):
+    __slots__ = (
+        "_t_if",
+        "_n_if_expr",
+        "_t_then",
+        "_n_then_expr",
+        "_t_else",
+        "_n_else_expr",
+        "_t_endif",
+    )
+
+    child_names = [
+        "t_if",
+        "n_if_expr",
+        "t_then",
+        "n_then_expr",
+        "t_else",
+        "n_else_expr",
+        "t_endif",
+    ]
+
     def __init__(
         self,
         t_if: Optional[Token],
@@ -310,6 +477,9 @@ class IfExpr(Expr):
         self._t_else = t_else
         self._n_else_expr = n_else_expr
         self._t_endif = t_endif
+        self._child_offsets = self._get_child_offsets(
+            [t_if, n_if_expr, t_then, n_then_expr, t_else, n_else_expr, t_endif]
+        )
 
     @property
     def t_if(self) -> Optional[Token]:
@@ -341,9 +511,14 @@ class IfExpr(Expr):
 
 
 class IdentifierExpr(Expr):
+    __slots__ = ("_t_identifier",)
+
+    child_names = ["t_identifier"]
+
     def __init__(self, t_identifier: Optional[Token]) -> None:
         super().__init__([t_identifier])
         self._t_identifier = t_identifier
+        self._child_offsets = self._get_child_offsets([t_identifier])
 
     @property
     def t_identifier(self) -> Optional[Token]:
@@ -351,9 +526,14 @@ class IdentifierExpr(Expr):
 
 
 class IntLiteralExpr(Expr):
+    __slots__ = ("_t_int_literal",)
+
+    child_names = ["t_int_literal"]
+
     def __init__(self, t_int_literal: Optional[Token]) -> None:
         super().__init__([t_int_literal])
         self._t_int_literal = t_int_literal
+        self._child_offsets = self._get_child_offsets([t_int_literal])
 
     @property
     def t_int_literal(self) -> Optional[Token]:
@@ -361,9 +541,14 @@ class IntLiteralExpr(Expr):
 
 
 class StringLiteralExpr(Expr):
+    __slots__ = ("_t_string_literal",)
+
+    child_names = ["t_string_literal"]
+
     def __init__(self, t_string_literal: Optional[Token]) -> None:
         super().__init__([t_string_literal])
         self._t_string_literal = t_string_literal
+        self._child_offsets = self._get_child_offsets([t_string_literal])
 
     @property
     def t_string_literal(self) -> Optional[Token]:
@@ -371,6 +556,10 @@ class StringLiteralExpr(Expr):
 
 
 class BinaryExpr(Expr):
+    __slots__ = ("_n_lhs", "_t_operator", "_n_rhs")
+
+    child_names = ["n_lhs", "t_operator", "n_rhs"]
+
     def __init__(
         self, n_lhs: Optional[Expr], t_operator: Optional[Token], n_rhs: Optional[Expr]
     ) -> None:
@@ -378,6 +567,7 @@ class BinaryExpr(Expr):
         self._n_lhs = n_lhs
         self._t_operator = t_operator
         self._n_rhs = n_rhs
+        self._child_offsets = self._get_child_offsets([n_lhs, t_operator, n_rhs])
 
     @property
     def n_lhs(self) -> Optional[Expr]:
@@ -393,10 +583,15 @@ class BinaryExpr(Expr):
 
 
 class Argument(Node):
+    __slots__ = ("_n_expr", "_t_comma")
+
+    child_names = ["n_expr", "t_comma"]
+
     def __init__(self, n_expr: Optional[Expr], t_comma: Optional[Token]) -> None:
         super().__init__([n_expr, t_comma])
         self._n_expr = n_expr
         self._t_comma = t_comma
+        self._child_offsets = self._get_child_offsets([n_expr, t_comma])
 
     @property
     def n_expr(self) -> Optional[Expr]:
@@ -408,6 +603,10 @@ class Argument(Node):
 
 
 class ArgumentList(Node):
+    __slots__ = ("_t_lparen", "_arguments", "_t_rparen", "_arguments_offsets")
+
+    child_names = ["t_lparen", "arguments", "t_rparen"]
+
     def __init__(
         self,
         t_lparen: Optional[Token],
@@ -420,6 +619,10 @@ class ArgumentList(Node):
         self._t_lparen = t_lparen
         self._arguments = arguments
         self._t_rparen = t_rparen
+        self._child_offsets = self._get_child_offsets([t_lparen, arguments, t_rparen])
+        self._arguments_offsets = self._get_element_offsets(
+            arguments, self._child_offsets[1]
+        )
 
     @property
     def t_lparen(self) -> Optional[Token]:
@@ -429,18 +632,29 @@ class ArgumentList(Node):
     def arguments(self) -> Optional[List[Argument]]:
         return self._arguments
 
+    @property
+    def arguments_offsets(self) -> Sequence[int]:
+        """The offset of each element of `arguments`, relative to the start
+        of this node."""
+        return self._arguments_offsets
+
     @property
     def t_rparen(self) -> Optional[Token]:
         return self._t_rparen
 
 
 class FunctionCallExpr(Expr):
+    __slots__ = ("_n_callee", "_n_argument_list")
+
+    child_names = ["n_callee", "n_argument_list"]
+
     def __init__(
         self, n_callee: Optional[Expr], n_argument_list: Optional[ArgumentList]
     ) -> None:
         super().__init__([n_callee, n_argument_list])
         self._n_callee = n_callee
         self._n_argument_list = n_argument_list
+        self._child_offsets = self._get_child_offsets([n_callee, n_argument_list])
 
     @property
     def n_callee(self) -> Optional[Expr]:
@@ -0,0 +1,102 @@
+"""Import hook for Pytch modules.
+
+After calling `install`, `import foo` imports `foo.pytch` from the first
+directory on `sys.path` which has it (or from the package's directory, for a
+submodule), unless there's a Python module of the same name, which takes
+precedence. The compiled code is cached next to the source file (see
+`pytch.cache`), so other processes importing the same module don't need to
+compile it again.
+"""
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import os.path
+import sys
+from types import CodeType, ModuleType
+from typing import Optional, Sequence
+
+from .errors import get_error_lines
+from .repl import load_or_compile_file, print_errors
+from .utils import FileInfo
+
+
+PYTCH_FILE_EXTENSION = ".pytch"
+
+
+class PytchLoader(importlib.abc.ExecutionLoader):
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+
+    def create_module(
+        self, spec: importlib.machinery.ModuleSpec
+    ) -> Optional[ModuleType]:
+        # Use the default module creation.
+        return None
+
+    def exec_module(self, module: ModuleType) -> None:
+        code = self.get_code(module.__name__)
+        exec(code, module.__dict__)
+
+    def get_filename(self, fullname: str) -> str:
+        return self.file_path
+
+    def get_source(self, fullname: str) -> str:
+        with open(self.file_path) as f:
+            return f.read()
+
+    def get_code(self, fullname: str) -> CodeType:
+        file_info = FileInfo(
+            file_path=self.file_path, source_code=self.get_source(fullname)
+        )
+        (code, errors) = load_or_compile_file(file_info=file_info, use_cache=True)
+        if code is None:
+            error_lines = []
+            for error in errors:
+                error_lines.extend(get_error_lines(error, ascii=True))
+            raise ImportError(
+                f"could not compile {self.file_path}:\n" + "\n".join(error_lines),
+                name=fullname,
+                path=self.file_path,
+            )
+        print_errors(errors)
+        return code
+
+    def is_package(self, fullname: str) -> bool:
+        return False
+
+
+class PytchFinder(importlib.abc.MetaPathFinder):
+    def find_spec(
+        self,
+        fullname: str,
+        path: Optional[Sequence[str]],
+        target: Optional[ModuleType] = None,
+    ) -> Optional[importlib.machinery.ModuleSpec]:
+        if path is None:
+            path = sys.path
+        module_name = fullname.rpartition(".")[2]
+        for directory in path:
+            if not isinstance(directory, str):
+                continue
+            file_path = os.path.join(
+                directory or os.getcwd(), module_name + PYTCH_FILE_EXTENSION
+            )
+            if os.path.isfile(file_path):
+                return importlib.util.spec_from_file_location(
+                    fullname, file_path, loader=PytchLoader(file_path)
+                )
+        return None
+
+
+FINDER = PytchFinder()
+
+
+def install() -> None:
+    """Allow Pytch modules to be imported."""
+    if FINDER not in sys.meta_path:
+        sys.meta_path.append(FINDER)
+
+
+def uninstall() -> None:
+    if FINDER in sys.meta_path:
+        sys.meta_path.remove(FINDER)
@@ -38,9 +38,10 @@ Whitespace and comments are the types of trivia.
 # Token fields
 
 Tokens contain their kind, text, and trivia. They don't contain their
-position: this allows us to potentially do incremental reparsing, since we
-can modify tokens directly without having to adjust the positions of all the
-following tokens.
+position: this allows us to do incremental reparsing, since we can reuse
+tokens directly without having to adjust the positions of all the following
+tokens. (The `TokenStream` which stores the tokens for a file does need to
+know where each token starts, but adjusting that is cheap.) See `relex`.
 
 # Kinds
 
@@ -48,15 +49,25 @@ The "kind" of a token indicates what kind of token it was. For example, each
 keyword and symbol has its own kind, as well as things like identifiers and
 strings.
 """
+from array import array
+import bisect
 from enum import Enum
 import re
-from typing import Iterable, Iterator, List, Mapping, Optional, Pattern, Tuple
+from typing import (
+    Any,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Sequence,
+    Tuple,
+)
 
 import attr
 
-from .containers import PVector
 from .errors import Error, ErrorCode, Note, Severity
-from .utils import FileInfo, OffsetRange
+from .utils import FileInfo, OffsetRange, Position, Range, TextEdit
 
 
 class TriviumKind(Enum):
@@ -130,8 +141,17 @@ assert BINARY_OPERATOR_PRECEDENCES == set(
 
 BINARY_OPERATOR_KINDS = list(BINARY_OPERATORS.keys())
 
+DUMMY_TOKEN_KINDS = frozenset(
+    kind
+    for kind in TokenKind
+    if kind == TokenKind.EOF or kind.name.lower().startswith("dummy")
+)
+
+INSERTED_TOKEN_KINDS = DUMMY_TOKEN_KINDS - {TokenKind.EOF}
+"""The kinds of the dummy tokens inserted by the pre-parser."""
 
-@attr.s(auto_attribs=True, frozen=True)
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class Trivium:
     kind: TriviumKind
     text: str
@@ -141,45 +161,44 @@ class Trivium:
         return len(self.text)
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class Token:
     kind: TokenKind
     text: str
     leading_trivia: List[Trivium]
     trailing_trivia: List[Trivium]
 
+    # Tokens are immutable, so their widths are computed once upon
+    # construction, rather than re-summing the trivia on every access.
+    width: int = attr.ib(init=False, cmp=False, repr=False)
+    leading_width: int = attr.ib(init=False, cmp=False, repr=False)
+    trailing_width: int = attr.ib(init=False, cmp=False, repr=False)
+    full_width: int = attr.ib(init=False, cmp=False, repr=False)
+    """The width of the token, including leading and trailing trivia."""
+
+    is_dummy: bool = attr.ib(init=False, cmp=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        width = len(self.text)
+        leading_width = sum(len(trivium.text) for trivium in self.leading_trivia)
+        trailing_width = sum(len(trivium.text) for trivium in self.trailing_trivia)
+        object.__setattr__(self, "width", width)
+        object.__setattr__(self, "leading_width", leading_width)
+        object.__setattr__(self, "trailing_width", trailing_width)
+        object.__setattr__(self, "full_width", leading_width + width + trailing_width)
+        object.__setattr__(self, "is_dummy", self.kind in DUMMY_TOKEN_KINDS)
+
     def update(self, **kwargs) -> "Token":
         return attr.evolve(self, **kwargs)
 
-    @property
-    def is_dummy(self):
-        return self.kind == TokenKind.EOF or self.kind.name.lower().startswith("dummy")
-
     @property
     def full_text(self) -> str:
         return self.leading_text + self.text + self.trailing_text
 
-    @property
-    def width(self) -> int:
-        return len(self.text)
-
-    @property
-    def full_width(self) -> int:
-        """The width of the token, including leading and trailing trivia."""
-        return self.leading_width + self.width + self.trailing_width
-
-    @property
-    def leading_width(self) -> int:
-        return sum(trivium.width for trivium in self.leading_trivia)
-
     @property
     def leading_text(self) -> str:
         return "".join(trivium.text for trivium in self.leading_trivia)
 
-    @property
-    def trailing_width(self) -> int:
-        return sum(trivium.width for trivium in self.trailing_trivia)
-
     @property
     def trailing_text(self) -> str:
         return "".join(trivium.text for trivium in self.trailing_trivia)
@@ -191,18 +210,393 @@ class Token:
         )
 
 
-@attr.s(auto_attribs=True, frozen=True)
+TOKEN_KINDS: Sequence[TokenKind] = list(TokenKind)
+TOKEN_KIND_CODES: Mapping[TokenKind, int] = {
+    kind: code for (code, kind) in enumerate(TOKEN_KINDS)
+}
+TRIVIUM_KINDS: Sequence[TriviumKind] = list(TriviumKind)
+TRIVIUM_KIND_CODES: Mapping[TriviumKind, int] = {
+    kind: code for (code, kind) in enumerate(TRIVIUM_KINDS)
+}
+
+
+class TokenStream(Sequence[Token]):
+    """A compact, column-oriented store of the tokens in a file.
+
+    Rather than keeping a `Token` object (and a list of `Trivium` objects for
+    each side of it) for every token in the file, we store the kind and
+    offsets of each token and trivium in `array`s. The text of a token or
+    trivium is a slice of the source code, so we only need to keep its start
+    and end offsets.
+
+    Indexing into the stream materializes a `Token` on demand. Callers which
+    only need to know something simple about a token, like its kind or width,
+    should use the `get_*` accessors instead, which don't allocate.
+
+    Tokens are appended in order, and their full ranges must be contiguous.
+    Dummy tokens are zero-width tokens positioned at the end of the previous
+    token. A stream usually covers the whole source code, but it may start
+    partway through it, such as when re-lexing a region of the file.
+    """
+
+    def __init__(self, source_code: str, start_offset: int = 0) -> None:
+        self.source_code = source_code
+        self._start_offset = start_offset
+
+        self._kinds = array("B")
+        """The code of each token's kind, as in `TOKEN_KIND_CODES`."""
+
+        self._starts = array("I")
+        """The offset of the start of each token's leading trivia.
+
+        This is the only column which holds absolute offsets. The others are
+        relative to the start of the token, so that only this column needs to
+        be adjusted when reusing tokens from before an edit."""
+
+        self._leading_widths = array("I")
+        self._widths = array("I")
+        self._trailing_widths = array("I")
+
+        self._trivia_indices = array("I")
+        """The index into the trivium columns of each token's first trivium.
+        The token's trivia extend up to the next token's first trivium."""
+
+        self._trivium_kinds = array("B")
+        self._trivium_ends = array("I")
+        """The offset of the end of each trivium, relative to the start of its
+        token. Trivia are contiguous with each other and with the text of
+        their token, so their start offsets can be inferred."""
+
+        self._cached_index: Optional[int] = None
+        self._cached_token: Optional[Token] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_cached_index"] = None
+        state["_cached_token"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} of {len(self)} tokens>"
+
+    def __len__(self) -> int:
+        return len(self._kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index == self._cached_index:
+            return self._cached_token
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+
+        source_code = self.source_code
+        start = self._starts[index]
+        text_start = start + self._leading_widths[index]
+        text_end = text_start + self._widths[index]
+        trivium_index = self._trivia_indices[index]
+        trivium_index_end = self._get_trivia_index_end(index)
+
+        offset = start
+        leading_trivia = []
+        while trivium_index < trivium_index_end and offset < text_start:
+            end = start + self._trivium_ends[trivium_index]
+            leading_trivia.append(
+                Trivium(
+                    kind=TRIVIUM_KINDS[self._trivium_kinds[trivium_index]],
+                    text=source_code[offset:end],
+                )
+            )
+            offset = end
+            trivium_index += 1
+
+        offset = text_end
+        trailing_trivia = []
+        while trivium_index < trivium_index_end:
+            end = start + self._trivium_ends[trivium_index]
+            trailing_trivia.append(
+                Trivium(
+                    kind=TRIVIUM_KINDS[self._trivium_kinds[trivium_index]],
+                    text=source_code[offset:end],
+                )
+            )
+            offset = end
+            trivium_index += 1
+
+        token = Token(
+            kind=TOKEN_KINDS[self._kinds[index]],
+            text=source_code[text_start:text_end],
+            leading_trivia=leading_trivia,
+            trailing_trivia=trailing_trivia,
+        )
+        self._cached_index = index
+        self._cached_token = token
+        return token
+
+    def __iter__(self) -> Iterator[Token]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def _get_trivia_index_end(self, index: int) -> int:
+        if index + 1 < len(self._trivia_indices):
+            return self._trivia_indices[index + 1]
+        else:
+            return len(self._trivium_kinds)
+
+    @property
+    def end_offset(self) -> int:
+        """The offset immediately after the last token in the stream."""
+        if self._starts:
+            return self.get_end_offset(-1)
+        else:
+            return self._start_offset
+
+    @property
+    def full_width(self) -> int:
+        # Tokens are contiguous, so this is the same as summing their widths.
+        return self.end_offset - self._start_offset
+
+    def append(
+        self,
+        kind: TokenKind,
+        start: int,
+        text_start: int,
+        text_end: int,
+        end: int,
+        trivia: Sequence[Tuple[TriviumKind, int]],
+    ) -> None:
+        """Append a token to the stream.
+
+        The trivia are given as a list of the kind and end offset of each
+        trivium, with the leading trivia first.
+        """
+        assert start == self.end_offset, "Tokens must be contiguous"
+        assert start <= text_start <= text_end <= end
+        self._kinds.append(TOKEN_KIND_CODES[kind])
+        self._starts.append(start)
+        self._leading_widths.append(text_start - start)
+        self._widths.append(text_end - text_start)
+        self._trailing_widths.append(end - text_end)
+        self._trivia_indices.append(len(self._trivium_kinds))
+        for (trivium_kind, trivium_end) in trivia:
+            self._trivium_kinds.append(TRIVIUM_KIND_CODES[trivium_kind])
+            self._trivium_ends.append(trivium_end - start)
+
+    def append_dummy(self, kind: TokenKind) -> None:
+        assert kind in DUMMY_TOKEN_KINDS
+        offset = self.end_offset
+        self.append(
+            kind=kind,
+            start=offset,
+            text_start=offset,
+            text_end=offset,
+            end=offset,
+            trivia=[],
+        )
+
+    def append_from(
+        self, other: "TokenStream", index: int, offset_delta: int = 0
+    ) -> None:
+        """Append the token at `index` in another stream to this stream.
+
+        The token's offsets are shifted by `offset_delta`, for when the other
+        stream was lexed from a version of the source code before an edit.
+        """
+        self.extend_from(other, index, index + 1, offset_delta=offset_delta)
+
+    def extend_from(
+        self, other: "TokenStream", start: int, end: int, offset_delta: int = 0
+    ) -> None:
+        """Append the tokens in the index range `[start, end)` in another
+        stream to this stream.
+
+        The tokens' offsets are shifted by `offset_delta`, for when the other
+        stream was lexed from a version of the source code before an edit.
+        """
+        if start >= end:
+            return
+        assert other._starts[start] + offset_delta == self.end_offset
+
+        trivium_start = other._trivia_indices[start]
+        trivium_end = other._get_trivia_index_end(end - 1)
+        trivium_index_delta = len(self._trivium_kinds) - trivium_start
+        self._kinds.extend(other._kinds[start:end])
+        if offset_delta == 0:
+            self._starts.extend(other._starts[start:end])
+        else:
+            self._starts.extend(map(offset_delta.__add__, other._starts[start:end]))
+        self._leading_widths.extend(other._leading_widths[start:end])
+        self._widths.extend(other._widths[start:end])
+        self._trailing_widths.extend(other._trailing_widths[start:end])
+        if trivium_index_delta == 0:
+            self._trivia_indices.extend(other._trivia_indices[start:end])
+        else:
+            self._trivia_indices.extend(
+                map(trivium_index_delta.__add__, other._trivia_indices[start:end])
+            )
+        self._trivium_kinds.extend(other._trivium_kinds[trivium_start:trivium_end])
+        self._trivium_ends.extend(other._trivium_ends[trivium_start:trivium_end])
+
+    def matches(
+        self,
+        other: "TokenStream",
+        start: int,
+        end: int,
+        other_start: int,
+        offset_delta: int = 0,
+    ) -> bool:
+        """Whether the tokens in the index range `[start, end)` in this stream
+        have the same kinds, widths and trivia as the same number of tokens
+        starting at `other_start` in another stream, and are at the same
+        offsets after shifting the latter by `offset_delta`.
+
+        The source code of the tokens isn't compared, so the caller has to
+        know that it wasn't changed.
+        """
+        other_end = other_start + (end - start)
+        if start < 0 or other_start < 0 or end > len(self) or other_end > len(other):
+            return False
+        if start == end:
+            return True
+        if self._starts[start] != other._starts[other_start] + offset_delta:
+            return False
+        if (
+            self._kinds[start:end] != other._kinds[other_start:other_end]
+            or self._leading_widths[start:end]
+            != other._leading_widths[other_start:other_end]
+            or self._widths[start:end] != other._widths[other_start:other_end]
+            or self._trailing_widths[start:end]
+            != other._trailing_widths[other_start:other_end]
+        ):
+            return False
+
+        trivium_start = self._trivia_indices[start]
+        trivium_end = self._get_trivia_index_end(end - 1)
+        other_trivium_start = other._trivia_indices[other_start]
+        other_trivium_end = other._get_trivia_index_end(other_end - 1)
+        trivium_index_delta = trivium_start - other_trivium_start
+        trivia_indices = other._trivia_indices[other_start:other_end]
+        if trivium_index_delta != 0:
+            trivia_indices = array(
+                trivia_indices.typecode,
+                map(trivium_index_delta.__add__, trivia_indices),
+            )
+        return (
+            self._trivia_indices[start:end] == trivia_indices
+            and self._trivium_kinds[trivium_start:trivium_end]
+            == other._trivium_kinds[other_trivium_start:other_trivium_end]
+            and self._trivium_ends[trivium_start:trivium_end]
+            == other._trivium_ends[other_trivium_start:other_trivium_end]
+        )
+
+    def count_kind(self, kind: TokenKind) -> int:
+        """Count the number of tokens of the given kind in the stream."""
+        return self._kinds.tobytes().count(bytes([TOKEN_KIND_CODES[kind]]))
+
+    def get_start_offset(self, index: int) -> int:
+        """The offset of the start of the token's leading trivia."""
+        return self._starts[index]
+
+    def get_end_offset(self, index: int) -> int:
+        """The offset of the end of the token's trailing trivia."""
+        return (
+            self._starts[index]
+            + self._leading_widths[index]
+            + self._widths[index]
+            + self._trailing_widths[index]
+        )
+
+    def find_start_offset(self, offset: int) -> int:
+        """Find the index of the first token which starts at or after the
+        given offset, or the length of the stream if there is no such token."""
+        return bisect.bisect_left(self._starts, offset)
+
+    def find_end_offset(self, offset: int) -> int:
+        """Find the index of the first token which ends at or after the given
+        offset, or the length of the stream if there is no such token."""
+        # Tokens are contiguous, so each token ends where the next one starts.
+        index = bisect.bisect_left(self._starts, offset, 1) - 1
+        if index == len(self) - 1 and self.end_offset < offset:
+            return len(self)
+        return max(index, 0)
+
+    def get_kind(self, index: int) -> TokenKind:
+        return TOKEN_KINDS[self._kinds[index]]
+
+    def is_dummy(self, index: int) -> bool:
+        return self.get_kind(index) in DUMMY_TOKEN_KINDS
+
+    def get_text(self, index: int) -> str:
+        text_start = self._starts[index] + self._leading_widths[index]
+        return self.source_code[text_start : text_start + self._widths[index]]
+
+    def get_full_offset_range(self, index: int) -> OffsetRange:
+        """The offset range of the token, including its leading and trailing
+        trivia."""
+        return OffsetRange(start=self._starts[index], end=self.get_end_offset(index))
+
+    def get_offset_range(self, index: int) -> OffsetRange:
+        """The offset range of the token's text, excluding its trivia."""
+        text_start = self._starts[index] + self._leading_widths[index]
+        return OffsetRange(start=text_start, end=text_start + self._widths[index])
+
+    def get_full_width(self, index: int) -> int:
+        return (
+            self._leading_widths[index]
+            + self._widths[index]
+            + self._trailing_widths[index]
+        )
+
+    def get_leading_width(self, index: int) -> int:
+        return self._leading_widths[index]
+
+    def get_trailing_width(self, index: int) -> int:
+        return self._trailing_widths[index]
+
+    def count_trailing_newlines(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        newline_code = TRIVIUM_KIND_CODES[TriviumKind.NEWLINE]
+        text_end = self._leading_widths[index] + self._widths[index]
+        count = 0
+        for trivium_index in range(
+            self._trivia_indices[index], self._get_trivia_index_end(index)
+        ):
+            # Trivia are never empty, so a trivium is part of the trailing
+            # trivia exactly when it ends after the token's text does.
+            if (
+                self._trivium_kinds[trivium_index] == newline_code
+                and self._trivium_ends[trivium_index] > text_end
+            ):
+                count += 1
+        return count
+
+    def is_followed_by_newline(self, index: int) -> bool:
+        return self.count_trailing_newlines(index) > 0
+
+
+@attr.s(auto_attribs=True)
 class State:
+    """The mutable cursor of the lexer.
+
+    Unlike most of the other state classes, this one is updated in place:
+    lexing advances through the source code one token at a time, and we
+    don't want to allocate a new state for every character that we consume.
+    The immutable `Lexation` is only produced once lexing has finished.
+    """
+
     file_info: FileInfo
     offset: int
-    errors: PVector[Error]
-
-    def update(self, **kwargs):
-        return attr.evolve(self, **kwargs)
+    errors: List[Error]
 
-    def advance_offset(self, offset_delta: int) -> "State":
+    def advance_offset(self, offset_delta: int) -> None:
         assert offset_delta >= 0
-        return self.update(offset=self.offset + offset_delta)
+        self.offset += offset_delta
 
     def current_char(self) -> Optional[str]:
         if 0 <= self.offset < len(self.file_info.source_code):
@@ -210,21 +604,46 @@ class State:
         else:
             return None
 
-    def text_from(self, start_offset: int) -> str:
-        return self.file_info.source_code[start_offset : self.offset]
+    def add_error(self, error: Error) -> None:
+        self.errors.append(error)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ChangedTokens:
+    """The index range of the tokens which `relex` produced again, rather than
+    reusing them from before the edit."""
+
+    start: int
+    """The tokens before this index are the same as those at the same indices
+    before the edit."""
 
-    def add_error(self, error: Error) -> "State":
-        return self.update(errors=self.errors.append(error))
+    end: int
+    """The tokens from this index onwards are the same as the same number of
+    tokens at the end of the stream from before the edit, shifted by the
+    edit's offset delta."""
 
 
 @attr.s(auto_attribs=True, frozen=True)
 class Lexation:
-    tokens: List[Token]
+    tokens: TokenStream
     errors: List[Error]
+    preparse_checkpoints: Optional["PreparseCheckpoints"] = attr.ib(
+        default=None, cmp=False, repr=False
+    )
+    """The state of the pre-parser at the start of each line, which is used to
+    incrementally re-lex the file. Only set once the tokens have been
+    pre-parsed."""
+
+    changed_tokens: Optional[ChangedTokens] = attr.ib(
+        default=None, cmp=False, repr=False
+    )
+    """The tokens which changed, if these tokens were produced by `relex`. The
+    parser uses this to only compare the changed tokens with those from before
+    the edit."""
 
     @property
     def full_width(self) -> int:
-        return sum(token.full_width for token in self.tokens)
+        return self.tokens.full_width
 
 
 WHITESPACE_RE = re.compile(r"[ \t]+")
@@ -234,78 +653,105 @@ IDENTIFIER_RE = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
 INT_LITERAL_RE = re.compile(r"[0-9]+")
 EQUALS_RE = re.compile(r"=")
 DOUBLE_ARROW_RE = re.compile(r"=>")
-LET_RE = re.compile(r"let")
-DEF_RE = re.compile(r"def")
 COMMA_RE = re.compile(r",")
 LPAREN_RE = re.compile(r"\(")
 RPAREN_RE = re.compile(r"\)")
-IF_RE = re.compile(r"if")
-THEN_RE = re.compile(r"then")
-ELSE_RE = re.compile(r"else")
 PLUS_RE = re.compile(r"\+")
 MINUS_RE = re.compile(r"-")
-OR_RE = re.compile(r"or")
-AND_RE = re.compile(r"and")
 
 UNKNOWN_TOKEN_RE = re.compile(r"[^ \n\t\ra-zA-Z0-9]+")
 
+STRING_BODY_RES: Mapping[str, Pattern] = {
+    # The character immediately after the opening quote is always part of
+    # the string. After that, the string continues until the end of the line,
+    # or until a quote character which isn't immediately preceded by a
+    # backslash.
+    '"': re.compile(r'[^\n](?:[^"\n]|(?<=\\)")*'),
+    "'": re.compile(r"[^\n](?:[^'\n]|(?<=\\)')*"),
+}
+
+KEYWORDS: Mapping[str, TokenKind] = {
+    "let": TokenKind.LET,
+    "def": TokenKind.DEF,
+    "if": TokenKind.IF,
+    "then": TokenKind.THEN,
+    "else": TokenKind.ELSE,
+    "or": TokenKind.OR,
+    "and": TokenKind.AND,
+}
+"""Keywords are lexed as identifiers, and then looked up in this table."""
+
+TRIVIUM_PATTERNS: Sequence[Tuple[TriviumKind, Pattern]] = [
+    (TriviumKind.WHITESPACE, WHITESPACE_RE),
+    (TriviumKind.NEWLINE, NEWLINE_RE),
+    (TriviumKind.COMMENT, COMMENT_RE),
+]
+
+TOKEN_PATTERNS: Sequence[Tuple[TokenKind, Pattern]] = [
+    # `=>` must come before `=`, since we want the longest match, but the
+    # regex engine takes the first alternative that matches.
+    (TokenKind.DOUBLE_ARROW, DOUBLE_ARROW_RE),
+    (TokenKind.EQUALS, EQUALS_RE),
+    (TokenKind.INT_LITERAL, INT_LITERAL_RE),
+    (TokenKind.COMMA, COMMA_RE),
+    (TokenKind.LPAREN, LPAREN_RE),
+    (TokenKind.RPAREN, RPAREN_RE),
+    (TokenKind.PLUS, PLUS_RE),
+    (TokenKind.MINUS, MINUS_RE),
+    (TokenKind.IDENTIFIER, IDENTIFIER_RE),
+    # Only matches if nothing else does, since it's the last alternative.
+    (TokenKind.ERROR, UNKNOWN_TOKEN_RE),
+]
+
+
+def make_master_pattern(patterns: Sequence[Tuple[Enum, Pattern]]) -> Pattern:
+    """Combine the given patterns into a single alternation.
+
+    Each pattern is put into a named group, so that the kind of the match can
+    be recovered from `match.lastgroup`. Alternatives are tried in order, so
+    patterns which are prefixes of other patterns should come later.
+    """
+    return re.compile(
+        "|".join(f"(?P<{kind.name}>{pattern.pattern})" for kind, pattern in patterns)
+    )
+
+
+TRIVIUM_RE = make_master_pattern(TRIVIUM_PATTERNS)
+TOKEN_RE = make_master_pattern(TOKEN_PATTERNS)
+TRIVIUM_KINDS_BY_GROUP: Mapping[str, TriviumKind] = {
+    kind.name: kind for kind, _pattern in TRIVIUM_PATTERNS
+}
+TOKEN_KINDS_BY_GROUP: Mapping[str, TokenKind] = {
+    kind.name: kind for kind, _pattern in TOKEN_PATTERNS
+}
+
 
 class Lexer:
     def lex(self, file_info: FileInfo) -> Lexation:
-        state = State(file_info=file_info, offset=0, errors=PVector())
-        tokens = []
+        state = State(file_info=file_info, offset=0, errors=[])
+        tokens = TokenStream(source_code=file_info.source_code)
         while True:
             last_offset = state.offset
-            (state, token) = self.lex_token(state)
-            tokens.append(token)
-            if token.kind == TokenKind.ERROR:
-                state = state.add_error(
-                    Error(
-                        file_info=file_info,
-                        code=ErrorCode.INVALID_TOKEN,
-                        severity=Severity.ERROR,
-                        message=f"Invalid token '{token.text}'.",
-                        notes=[],
-                        range=file_info.get_range_from_offset_range(
-                            OffsetRange(
-                                start=state.offset - token.trailing_width - token.width,
-                                end=state.offset - token.trailing_width,
-                            )
-                        ),
-                    )
-                )
-
-            if token.kind == TokenKind.EOF:
+            token_kind = self.lex_token(state, tokens)
+            if token_kind == TokenKind.EOF:
                 break
             assert state.offset >= last_offset, "No progress made in lexing"
 
-        return Lexation(tokens=tokens, errors=list(state.errors))
+        return Lexation(tokens=tokens, errors=state.errors)
 
-    def lex_leading_trivia(self, state: State) -> Tuple[State, List[Trivium]]:
-        leading_trivia = self.lex_next_trivia_by_patterns(
-            state,
-            {
-                TriviumKind.WHITESPACE: WHITESPACE_RE,
-                TriviumKind.NEWLINE: NEWLINE_RE,
-                TriviumKind.COMMENT: COMMENT_RE,
-            },
-        )
-        state = state.advance_offset(sum(trivium.width for trivium in leading_trivia))
-        return (state, leading_trivia)
-
-    def lex_trailing_trivia(self, state: State) -> Tuple[State, List[Trivium]]:
-        trailing_trivia = self.lex_next_trivia_by_patterns(
-            state,
-            {
-                TriviumKind.WHITESPACE: WHITESPACE_RE,
-                TriviumKind.NEWLINE: NEWLINE_RE,
-                TriviumKind.COMMENT: COMMENT_RE,
-            },
-        )
+    def lex_leading_trivia(self, state: State) -> List[Tuple[TriviumKind, int]]:
+        leading_trivia = self.lex_next_trivia(state)
+        if leading_trivia:
+            (_kind, end) = leading_trivia[-1]
+            state.advance_offset(end - state.offset)
+        return leading_trivia
+
+    def lex_trailing_trivia(self, state: State) -> List[Tuple[TriviumKind, int]]:
+        trailing_trivia = self.lex_next_trivia(state)
         newline_indices = [
             i
-            for (i, trivium) in enumerate(trailing_trivia)
-            if trivium.kind == TriviumKind.NEWLINE
+            for (i, (trivium_kind, _end)) in enumerate(trailing_trivia)
+            if trivium_kind == TriviumKind.NEWLINE
         ]
         if newline_indices:
             last_newline_index = newline_indices[-1] + 1
@@ -315,146 +761,109 @@ class Lexer:
         # newline. We'll consume that as the leading trivia of the next
         # token.
         trailing_trivia = trailing_trivia[:last_newline_index]
-        state = state.advance_offset(sum(trivium.width for trivium in trailing_trivia))
-        return (state, trailing_trivia)
-
-    def lex_next_trivia_by_patterns(
-        self, state: State, trivia_patterns: Mapping[TriviumKind, Pattern]
-    ) -> List[Trivium]:
-        trivia: List[Trivium] = []
-        offset = state.offset
-        while True:
-            matches = [
-                (trivium_kind, regex.match(state.file_info.source_code, pos=offset))
-                for trivium_kind, regex in trivia_patterns.items()
-            ]
-            filtered_matches = [
-                (trivium_kind, match)
-                for trivium_kind, match in matches
-                if match is not None
-            ]
-            if not filtered_matches:
-                return trivia
-            assert (
-                len(filtered_matches) == 1
-            ), "More than one possible type of trivia found"
-            trivium_kind, match = filtered_matches[0]
-
-            trivium = Trivium(kind=trivium_kind, text=match.group())
-            trivia.append(trivium)
-            offset += trivium.width
-
-    def lex_token(self, state: State) -> Tuple[State, Token]:
-        (state, leading_trivia) = self.lex_leading_trivia(state)
-        token_info = None
-
-        if token_info is None:
-            (maybe_state, token_info) = self.lex_string(state)
-            if token_info is not None:
-                state = maybe_state
-
-        if token_info is None:
-            (maybe_state, token_info) = self.lex_next_token_by_patterns(
-                state,
-                {
-                    TokenKind.INT_LITERAL: INT_LITERAL_RE,
-                    TokenKind.EQUALS: EQUALS_RE,
-                    TokenKind.DOUBLE_ARROW: DOUBLE_ARROW_RE,
-                    TokenKind.LET: LET_RE,
-                    TokenKind.DEF: DEF_RE,
-                    TokenKind.COMMA: COMMA_RE,
-                    TokenKind.LPAREN: LPAREN_RE,
-                    TokenKind.RPAREN: RPAREN_RE,
-                    TokenKind.IF: IF_RE,
-                    TokenKind.THEN: THEN_RE,
-                    TokenKind.ELSE: ELSE_RE,
-                    TokenKind.PLUS: PLUS_RE,
-                    TokenKind.MINUS: MINUS_RE,
-                    TokenKind.OR: OR_RE,
-                    TokenKind.AND: AND_RE,
-                    TokenKind.IDENTIFIER: IDENTIFIER_RE,
-                },
-            )
-            if token_info is not None:
-                state = maybe_state
-
-        if token_info is None:
-            (maybe_state, token_info) = self.lex_next_token_by_patterns(
-                state, {TokenKind.ERROR: UNKNOWN_TOKEN_RE}
-            )
-            if token_info is not None:
-                state = maybe_state
-
-        if token_info is None:
+        if trailing_trivia:
+            (_kind, end) = trailing_trivia[-1]
+            state.advance_offset(end - state.offset)
+        return trailing_trivia
+
+    def lex_next_trivia(self, state: State) -> List[Tuple[TriviumKind, int]]:
+        """Lex the trivia starting at the current offset.
+
+        Each trivium is returned as its kind and end offset. This doesn't
+        advance the state, since the caller may choose not to consume all of
+        the trivia.
+        """
+        trivia: List[Tuple[TriviumKind, int]] = []
+        source_code = state.file_info.source_code
+        match = TRIVIUM_RE.match(source_code, state.offset)
+        while match is not None:
+            end = match.end()
+            assert match.lastgroup is not None
+            trivia.append((TRIVIUM_KINDS_BY_GROUP[match.lastgroup], end))
+            match = TRIVIUM_RE.match(source_code, end)
+        return trivia
+
+    def lex_token(self, state: State, tokens: TokenStream) -> TokenKind:
+        """Lex the next token and append it to `tokens`."""
+        start = state.offset
+        leading_trivia = self.lex_leading_trivia(state)
+        text_start = state.offset
+        token_kind = self.lex_string(state)
+
+        if token_kind is None:
+            token_kind = self.lex_next_token(state)
+
+        if token_kind is None:
             # We can't find any match at all? Then there must be only
             # trivia remaining in the stream, so just produce the EOF
             # token.
-            token_info = (TokenKind.EOF, "")
-
-        (state, trailing_trivia) = self.lex_trailing_trivia(state)
-        (token_kind, token_text) = token_info
-        return (
-            state,
-            Token(
-                kind=token_kind,
-                text=token_text,
-                leading_trivia=leading_trivia,
-                trailing_trivia=trailing_trivia,
-            ),
+            token_kind = TokenKind.EOF
+
+        text_end = state.offset
+        trailing_trivia = self.lex_trailing_trivia(state)
+        tokens.append(
+            kind=token_kind,
+            start=start,
+            text_start=text_start,
+            text_end=text_end,
+            end=state.offset,
+            trivia=leading_trivia + trailing_trivia,
         )
 
-    def lex_next_token_by_patterns(
-        self, state: State, token_patterns: Mapping[TokenKind, Pattern]
-    ) -> Tuple[State, Optional[Tuple[TokenKind, str]]]:
-        matches = [
-            (token_kind, regex.match(state.file_info.source_code, pos=state.offset))
-            for token_kind, regex in token_patterns.items()
-        ]
-        filtered_matches = [
-            (token_kind, match) for token_kind, match in matches if match is not None
-        ]
-        if not filtered_matches:
-            return (state, None)
+        if token_kind == TokenKind.ERROR:
+            state.add_error(
+                Error(
+                    file_info=state.file_info,
+                    code=ErrorCode.INVALID_TOKEN,
+                    severity=Severity.ERROR,
+                    message=f"Invalid token '{tokens.get_text(len(tokens) - 1)}'.",
+                    notes=[],
+                    range=state.file_info.get_range_from_offset_range(
+                        OffsetRange(start=text_start, end=text_end)
+                    ),
+                )
+            )
+        return token_kind
 
-        (kind, match) = max(filtered_matches, key=lambda x: len(x[1].group()))
-        token_text = match.group()
-        state = state.advance_offset(len(token_text))
-        return (state, (kind, token_text))
+    def lex_next_token(self, state: State) -> Optional[TokenKind]:
+        match = TOKEN_RE.match(state.file_info.source_code, state.offset)
+        if match is None:
+            return None
+
+        assert match.lastgroup is not None
+        kind = TOKEN_KINDS_BY_GROUP[match.lastgroup]
+        if kind == TokenKind.IDENTIFIER:
+            kind = KEYWORDS.get(match.group(), kind)
+        state.advance_offset(match.end() - match.start())
+        return kind
 
-    def lex_string(self, state: State) -> Tuple[State, Optional[Tuple[TokenKind, str]]]:
-        (state, leading_trivia) = self.lex_leading_trivia(state)
+    def lex_string(self, state: State) -> Optional[TokenKind]:
         start_offset = state.offset
         quote_char = state.current_char()
         if not (quote_char == "'" or quote_char == '"'):
-            return (state, None)
-
-        state = state.advance_offset(1)
-        current_char = state.current_char()
-        last_char_was_backslash = current_char == "\\"
-        while (
-            current_char is not None
-            # Can't have a literal newline in the middle of a string -- just
-            # terminate it at that point. We could also consider backtracking
-            # to just the first word for error-recovery purposes, under the
-            # assumption that most strings are one word long.
-            and current_char != "\n"
-        ):
-            state = state.advance_offset(1)
-            current_char = state.current_char()
+            return None
 
-            if current_char == quote_char and not last_char_was_backslash:
-                state = state.advance_offset(1)
-                break
+        state.advance_offset(1)
+        match = STRING_BODY_RES[quote_char].match(
+            state.file_info.source_code, state.offset
+        )
+        if match is not None:
+            state.advance_offset(len(match.group()))
 
-            last_char_was_backslash = current_char == "\\"
+        if state.current_char() == quote_char:
+            state.advance_offset(1)
 
+        # Can't have a literal newline in the middle of a string -- just
+        # terminate it at that point. We could also consider backtracking to
+        # just the first word for error-recovery purposes, under the
+        # assumption that most strings are one word long.
+        #
         # No closing quote character found on this line, so emit an error.
         else:
-            # Note that we advanced the state's offset by one to continue
-            # lexing, so the error location is immediately previous to the
-            # current offset.
+            # Note that the error location is immediately previous to the
+            # current offset, which is at the end of the line.
             end_offset = state.offset - 1
-            state = state.add_error(
+            state.add_error(
                 Error(
                     file_info=state.file_info,
                     code=ErrorCode.EXPECTED_END_OF_STRING,
@@ -475,65 +884,257 @@ class Lexer:
                 )
             )
 
-        token_text = state.text_from(start_offset=start_offset)
-        return (state, (TokenKind.STRING_LITERAL, token_text))
+        return TokenKind.STRING_LITERAL
 
 
-def with_indentation_levels(tokens: Iterable[Token],) -> Iterator[Tuple[int, Token]]:
-    indentation_level = 0
-    is_first_token_on_line = True
-    for token in tokens:
-        if is_first_token_on_line:
-            indentation_level = token.leading_width
-            is_first_token_on_line = False
-        if token.is_followed_by_newline:
-            is_first_token_on_line = True
-        yield (indentation_level, token)
+PreparseStack = Optional[Tuple[int, TokenKind, Any]]
+"""The pre-parser's stack of the indentation level and kind of each token that
+opened a construct which hasn't been closed yet.
 
+The stack is represented as nested `(indentation_level, kind, rest)` tuples,
+with `None` as the empty stack. Since it's persistent, we can cheaply save a copy of it at the
+start of every line, for use when incrementally re-lexing.
+"""
 
-def make_dummy_token(kind: TokenKind) -> Token:
-    token = Token(kind=kind, text="", leading_trivia=[], trailing_trivia=[])
-    assert token.is_dummy
-    return token
+NO_TOKEN_KIND_CODE = len(TOKEN_KINDS)
+"""Stands in for the kind of the previous token at the start of the file."""
 
 
-def preparse(tokens: Iterable[Token]) -> Iterator[Token]:
-    """Insert dummy tokens for lightweight constructs into the token stream.
+@attr.s(auto_attribs=True)
+class PreparseCheckpoints:
+    """The state of the pre-parser at the start of each line.
 
-    This technique is based off of the "pre-parsing" step as outlined in the
-    F# 4.0 spec, section 15: Lightweight Syntax:
-    http://fsharp.org/specs/language-spec/4.0/FSharpSpec-4.0-latest.pdf
+    Each checkpoint corresponds to the first token on a line. It holds the
+    state of the pre-parser immediately before it processed that token. If
+    we're re-lexing after an edit and find that the pre-parser is in the same
+    state at the same token as it was before the edit, then it will produce
+    the same output as before from there on, so we can reuse it.
+    """
 
-    The pre-parser inserts dummy tokens into the token stream where we would
-    expect the token to go in the non-lightweight token stream. For example,
-    it might convert this:
+    token_indices: array = attr.ib(factory=lambda: array("I"))
+    """The index of each checkpoint's token in the pre-parsed token stream."""
+
+    output_indices: array = attr.ib(factory=lambda: array("I"))
+    """The index in the pre-parsed token stream of the first dummy token
+    inserted before each checkpoint's token, if any, or of the token itself
+    otherwise."""
+
+    previous_token_kinds: array = attr.ib(factory=lambda: array("B"))
+    """The code of the kind of the token before each checkpoint's token, or
+    `NO_TOKEN_KIND_CODE` at the start of the file."""
+
+    stacks: List[PreparseStack] = attr.ib(factory=list)
+
+    def __len__(self) -> int:
+        return len(self.token_indices)
+
+    def add(
+        self,
+        token_index: int,
+        output_index: int,
+        previous_token_kind: Optional[TokenKind],
+        stack: PreparseStack,
+    ) -> None:
+        self.token_indices.append(token_index)
+        self.output_indices.append(output_index)
+        if previous_token_kind is None:
+            self.previous_token_kinds.append(NO_TOKEN_KIND_CODE)
+        else:
+            self.previous_token_kinds.append(TOKEN_KIND_CODES[previous_token_kind])
+        self.stacks.append(stack)
+
+    def extend_from(
+        self, other: "PreparseCheckpoints", start: int, end: int, index_delta: int
+    ) -> None:
+        """Append the checkpoints in the range `[start, end)` in another set of
+        checkpoints, whose token indices are shifted by `index_delta`."""
+        if index_delta == 0:
+            self.token_indices.extend(other.token_indices[start:end])
+            self.output_indices.extend(other.output_indices[start:end])
+        else:
+            self.token_indices.extend(
+                map(index_delta.__add__, other.token_indices[start:end])
+            )
+            self.output_indices.extend(
+                map(index_delta.__add__, other.output_indices[start:end])
+            )
+        self.previous_token_kinds.extend(other.previous_token_kinds[start:end])
+        self.stacks.extend(other.stacks[start:end])
 
-        let foo = 1
-        foo
+    def get_previous_token_kind(self, index: int) -> Optional[TokenKind]:
+        code = self.previous_token_kinds[index]
+        if code == NO_TOKEN_KIND_CODE:
+            return None
+        return TOKEN_KINDS[code]
 
-    into this:
+    def find_at_or_before(self, token_index: int) -> Optional[int]:
+        """Find the index of the last checkpoint at or before the given token
+        index, if any."""
+        index = bisect.bisect_right(self.token_indices, token_index) - 1
+        if index < 0:
+            return None
+        return index
 
-        let foo = 1 $in
-        foo
+    def find(self, token_index: int) -> Optional[int]:
+        """Find the index of the checkpoint at the given token index, if any."""
+        index = self.find_at_or_before(token_index)
+        if index is None or self.token_indices[index] != token_index:
+            return None
+        return index
 
-    We do the same thing, although with significantly fewer restrictions on
-    the source code's indentation.
+
+class Preparser:
+    """Inserts dummy tokens into the token stream. See `preparse`.
+
+    Tokens are fed into the pre-parser one at a time, and it appends them
+    (and any dummy tokens) to the `result` stream. It can be started from any
+    of its checkpoints, rather than from the beginning of the file.
     """
-    stack: List[Tuple[int, int, Token]] = []
+
+    def __init__(
+        self,
+        result: TokenStream,
+        checkpoints: PreparseCheckpoints,
+        stack: PreparseStack = None,
+        previous_token_kind: Optional[TokenKind] = None,
+    ) -> None:
+        self.result = result
+        self.checkpoints = checkpoints
+        self.stack = stack
+        self.previous_token_kind = previous_token_kind
+        self.is_first_token_on_line = True
+        self.indentation_level = 0
+
+    def matches_checkpoint(self, checkpoints: PreparseCheckpoints, index: int) -> bool:
+        """Whether the pre-parser is in the same state as it was at the given
+        checkpoint."""
+        if not self.is_first_token_on_line:
+            return False
+        if self.previous_token_kind != checkpoints.get_previous_token_kind(index):
+            return False
+
+        # Stacks are usually mostly shared, so compare them iteratively and
+        # stop as soon as we reach a common tail.
+        stack = self.stack
+        other_stack = checkpoints.stacks[index]
+        while stack is not other_stack:
+            if stack is None or other_stack is None:
+                return False
+            (indentation_level, kind, stack) = stack
+            (other_indentation_level, other_kind, other_stack) = other_stack
+            if indentation_level != other_indentation_level or kind != other_kind:
+                return False
+        return True
+
+    def feed(
+        self, tokens: TokenStream, token_index: int, offset_delta: int = 0
+    ) -> None:
+        """Pre-parse the given token, which must not be the EOF token.
+
+        `offset_delta` is passed along to `TokenStream.append_from`.
+        """
+        token_kind = tokens.get_kind(token_index)
+        assert token_kind != TokenKind.EOF
+        output_index = len(self.result)
+        stack = self.stack
+        previous_token_kind = self.previous_token_kind
+        is_first_token = previous_token_kind is None
+
+        is_first_token_on_line = self.is_first_token_on_line
+        if is_first_token_on_line:
+            self.indentation_level = tokens.get_leading_width(token_index)
+        indentation_level = self.indentation_level
+        self.is_first_token_on_line = tokens.is_followed_by_newline(token_index)
+
+        if stack is not None:
+            (previous_indentation_level, _, _) = stack
+        else:
+            previous_indentation_level = 0
+
+        maybe_expr_continuation = True
+        maybe_new_statement = False
+        if not is_first_token and is_first_token_on_line:
+            maybe_new_statement = True
+            if indentation_level <= previous_indentation_level:
+                maybe_expr_continuation = False
+
+        is_part_of_binary_expr = (
+            token_kind in BINARY_OPERATOR_KINDS
+            or previous_token_kind in BINARY_OPERATOR_KINDS
+        )
+        has_comma = (
+            token_kind == TokenKind.COMMA or previous_token_kind == TokenKind.COMMA
+        )
+
+        if token_kind == TokenKind.LPAREN:
+            # Pass `0` as the indentation level to reset the indentation level
+            # in the stack until we've exited the parenthesized tokens.
+            self.push(0, token_kind)
+        elif token_kind == TokenKind.RPAREN:
+            self.unwind(
+                indentation_level, unwind_statements=False, kind=TokenKind.LPAREN
+            )
+        elif token_kind == TokenKind.LET or token_kind == TokenKind.DEF:
+            if not maybe_expr_continuation:
+                self.unwind(indentation_level, unwind_statements=False)
+            self.push(indentation_level, token_kind)
+        elif token_kind == TokenKind.IF:
+            if not maybe_expr_continuation:
+                self.unwind(indentation_level, unwind_statements=True)
+            self.push(indentation_level, token_kind)
+        elif token_kind == TokenKind.THEN:
+            self.unwind(indentation_level, unwind_statements=False, kind=TokenKind.IF)
+            self.push(indentation_level, token_kind)
+        elif token_kind == TokenKind.ELSE:
+            self.unwind(
+                indentation_level,
+                unwind_statements=False,
+                kind=TokenKind.THEN,
+                kind_indentation_level=indentation_level,
+            )
+            self.push(indentation_level, token_kind)
+        elif maybe_new_statement and not is_part_of_binary_expr and not has_comma:
+            if indentation_level <= previous_indentation_level:
+                self.unwind(indentation_level, unwind_statements=True)
+            self.push(indentation_level, token_kind)
+        elif is_first_token:
+            self.push(indentation_level, token_kind)
+
+        if is_first_token_on_line:
+            self.checkpoints.add(
+                token_index=len(self.result),
+                output_index=output_index,
+                previous_token_kind=previous_token_kind,
+                stack=stack,
+            )
+        self.result.append_from(tokens, token_index, offset_delta=offset_delta)
+        self.previous_token_kind = token_kind
+
+    def finish(
+        self, tokens: TokenStream, token_index: int, offset_delta: int = 0
+    ) -> None:
+        """Pre-parse the given EOF token, closing any open constructs."""
+        assert tokens.get_kind(token_index) == TokenKind.EOF
+        self.unwind(indentation_level=-1, unwind_statements=False)
+        self.result.append_from(tokens, token_index, offset_delta=offset_delta)
+
+    def push(self, indentation_level: int, kind: TokenKind) -> None:
+        self.stack = (indentation_level, kind, self.stack)
 
     def unwind(
+        self,
         indentation_level: int,
         unwind_statements: bool,
         kind: TokenKind = None,
         kind_indentation_level: int = None,
-    ) -> Iterator[Token]:
-        while stack:
-            (top_indentation_level, top_line, top_token) = stack[-1]
-            stack.pop()
+    ) -> None:
+        result = self.result
+        while self.stack is not None:
+            (top_indentation_level, top_token_kind, self.stack) = self.stack
 
             # If we're unwinding to a specific token kind, only stop once we've
             # reached that token kind.
-            if kind is not None and top_token.kind == kind:
+            if kind is not None and top_token_kind == kind:
                 if (
                     kind_indentation_level is None
                     or top_indentation_level <= kind_indentation_level
@@ -541,7 +1142,7 @@ def preparse(tokens: Iterable[Token]) -> Iterator[Token]:
                     return
 
             can_be_followed_by_new_statement = True
-            if top_token.kind == TokenKind.LET:
+            if top_token_kind == TokenKind.LET:
                 # If we see something of the form
                 #
                 # ```
@@ -552,121 +1153,295 @@ def preparse(tokens: Iterable[Token]) -> Iterator[Token]:
                 # then no matter what, we will treat the following `baz` as the
                 # `let` body, not a new statement.
                 can_be_followed_by_new_statement = False
-                yield make_dummy_token(TokenKind.DUMMY_IN_FOR_LET)
-            elif top_token.kind == TokenKind.DEF:
+                result.append_dummy(TokenKind.DUMMY_IN_FOR_LET)
+            elif top_token_kind == TokenKind.DEF:
                 # Similar to the above for `let`.
                 can_be_followed_by_new_statement = False
-                yield make_dummy_token(TokenKind.DUMMY_IN_FOR_DEF)
+                result.append_dummy(TokenKind.DUMMY_IN_FOR_DEF)
             elif (
-                top_token.kind == TokenKind.IF
-                or top_token.kind == TokenKind.THEN
-                or top_token.kind == TokenKind.ELSE
+                top_token_kind == TokenKind.IF
+                or top_token_kind == TokenKind.THEN
+                or top_token_kind == TokenKind.ELSE
             ):
-                yield make_dummy_token(TokenKind.DUMMY_ENDIF)
+                result.append_dummy(TokenKind.DUMMY_ENDIF)
 
             if (
                 unwind_statements
                 and can_be_followed_by_new_statement
                 and indentation_level == top_indentation_level
             ):
-                yield make_dummy_token(TokenKind.DUMMY_SEMICOLON)
+                result.append_dummy(TokenKind.DUMMY_SEMICOLON)
 
             if kind is None and top_indentation_level <= indentation_level:
                 return
 
-    is_first_token = True
-    current_line = 0
-    eof_token = None
-    previous_line = None
-    previous_token = None
-    for indentation_level, token in with_indentation_levels(tokens):
-        if token.kind == TokenKind.EOF:
-            eof_token = token
-            break
 
-        if stack:
-            (previous_indentation_level, _, _) = stack[-1]
-        else:
-            previous_indentation_level = 0
+def preparse(
+    tokens: TokenStream, checkpoints: Optional[PreparseCheckpoints] = None
+) -> TokenStream:
+    """Insert dummy tokens for lightweight constructs into the token stream.
 
-        maybe_expr_continuation = True
-        maybe_new_statement = False
-        if previous_line is not None:
-            assert previous_line <= current_line
-            if current_line > previous_line:
-                maybe_new_statement = True
-                if indentation_level <= previous_indentation_level:
-                    maybe_expr_continuation = False
-
-        is_part_of_binary_expr = token.kind in BINARY_OPERATOR_KINDS or (
-            previous_token is not None and previous_token.kind in BINARY_OPERATOR_KINDS
-        )
-        has_comma = token.kind == TokenKind.COMMA or (
-            previous_token is not None and previous_token.kind == TokenKind.COMMA
-        )
+    This technique is based off of the "pre-parsing" step as outlined in the
+    F# 4.0 spec, section 15: Lightweight Syntax:
+    http://fsharp.org/specs/language-spec/4.0/FSharpSpec-4.0-latest.pdf
 
-        if token.kind == TokenKind.LPAREN:
-            # Pass `0` as the indentation level to reset the indentation level
-            # in the stack until we've exited the parenthesized tokens.
-            stack.append((0, current_line, token))
-        elif token.kind == TokenKind.RPAREN:
-            yield from unwind(
-                indentation_level, unwind_statements=False, kind=TokenKind.LPAREN
-            )
-        elif token.kind == TokenKind.LET or token.kind == TokenKind.DEF:
-            if not maybe_expr_continuation:
-                yield from unwind(indentation_level, unwind_statements=False)
-            stack.append((indentation_level, current_line, token))
-        elif token.kind == TokenKind.IF:
-            if not maybe_expr_continuation:
-                yield from unwind(indentation_level, unwind_statements=True)
-            stack.append((indentation_level, current_line, token))
-        elif token.kind == TokenKind.THEN:
-            yield from unwind(
-                indentation_level, unwind_statements=False, kind=TokenKind.IF
-            )
-            stack.append((indentation_level, current_line, token))
-        elif token.kind == TokenKind.ELSE:
-            yield from unwind(
-                indentation_level,
-                unwind_statements=False,
-                kind=TokenKind.THEN,
-                kind_indentation_level=indentation_level,
-            )
-            stack.append((indentation_level, current_line, token))
-        elif maybe_new_statement and not is_part_of_binary_expr and not has_comma:
-            if indentation_level <= previous_indentation_level:
-                yield from unwind(indentation_level, unwind_statements=True)
-            stack.append((indentation_level, current_line, token))
-        elif is_first_token:
-            stack.append((indentation_level, current_line, token))
+    The pre-parser inserts dummy tokens into the token stream where we would
+    expect the token to go in the non-lightweight token stream. For example,
+    it might convert this:
 
-        yield token
+        let foo = 1
+        foo
 
-        is_first_token = False
-        previous_line = current_line
-        previous_token = token
-        current_line += sum(
-            len(trivium.text)
-            for trivium in token.trailing_trivia
-            if trivium.kind == TriviumKind.NEWLINE
-        )
+    into this:
+
+        let foo = 1 $in
+        foo
 
-    yield from unwind(indentation_level=-1, unwind_statements=False)
+    We do the same thing, although with significantly fewer restrictions on
+    the source code's indentation.
 
-    assert eof_token is not None
-    yield eof_token
+    The result is a new token stream, consisting of the original tokens with
+    the dummy tokens interspersed. If `checkpoints` is provided, the state of
+    the pre-parser at the start of each line is recorded into it.
+    """
+    result = TokenStream(source_code=tokens.source_code)
+    if checkpoints is None:
+        checkpoints = PreparseCheckpoints()
+    preparser = Preparser(result=result, checkpoints=checkpoints)
+    for token_index in range(len(tokens)):
+        if tokens.get_kind(token_index) == TokenKind.EOF:
+            preparser.finish(tokens, token_index)
+            return result
+        preparser.feed(tokens, token_index)
+    assert False, "Token stream must end with an EOF token."
 
 
 def lex(file_info: FileInfo) -> Lexation:
     lexer = Lexer()
     lexation = lexer.lex(file_info=file_info)
+    return preparse_lexation(file_info=file_info, lexation=lexation)
+
+
+def preparse_lexation(file_info: FileInfo, lexation: Lexation) -> Lexation:
+    """Run the pre-parser on the tokens produced by `Lexer.lex`. (`lex` does
+    both of these.)"""
+    checkpoints = PreparseCheckpoints()
+    tokens = preparse(lexation.tokens, checkpoints=checkpoints)
+    errors = lexation.errors + check_token_stream(file_info=file_info, tokens=tokens)
+    return Lexation(tokens=tokens, errors=errors, preparse_checkpoints=checkpoints)
+
+
+def relex(
+    lexation: Lexation, file_info: FileInfo, edit: TextEdit
+) -> Tuple[FileInfo, Lexation]:
+    """Lex the source code again after the given edit has been applied to it.
+
+    `lexation` and `file_info` are from before the edit. Rather than lexing the
+    whole file again, we only re-lex the tokens from the start of the line
+    containing the edit up until the new tokens line up with the old ones
+    again, and reuse the rest. Similarly, we re-run the pre-parser from the
+    last line start before the edit until it reaches a line start in the same
+    state as it was before the edit.
+
+    The result is the file info after the edit, and the same lexation as
+    would be produced by lexing it from scratch.
+    """
+    new_file_info = file_info.apply_edit(edit)
+
+    def lex_from_scratch() -> Tuple[FileInfo, Lexation]:
+        new_lexation = lex(new_file_info)
+        changed_tokens = ChangedTokens(start=0, end=len(new_lexation.tokens))
+        return (new_file_info, attr.evolve(new_lexation, changed_tokens=changed_tokens))
+
+    checkpoints = lexation.preparse_checkpoints
+    if checkpoints is None:
+        return lex_from_scratch()
+
+    old_tokens = lexation.tokens
+    edit_start = edit.offset_range.start
+    edit_end = edit.offset_range.end
+    offset_delta = edit.offset_delta
+
+    # Lexing a token may have looked ahead past the end of the token, up to the
+    # start of the next token, or to the end of the line in the case of
+    # comments. So the last token unaffected by the edit is the one before the
+    # first token which extends into the line containing the edit. Then back up
+    # to the start of that token's line, so that we can restart the pre-parser
+    # from there too.
+    line_start_offset = file_info.source_code.rfind("\n", 0, edit_start) + 1
+    restart_token_index = max(old_tokens.find_end_offset(line_start_offset) - 1, 0)
+    checkpoint_index = checkpoints.find_at_or_before(restart_token_index)
+    if checkpoint_index is None:
+        return lex_from_scratch()
+    restart_token_index = checkpoints.token_indices[checkpoint_index]
+    restart_offset = old_tokens.get_start_offset(restart_token_index)
+
+    # Re-lex until a token ends at the start of an old token past the end of
+    # the edit. The old token was lexed from the same source code as we would
+    # lex from that point, so it and all of the old tokens after it are still
+    # valid.
+    lexer = Lexer()
+    state = State(file_info=new_file_info, offset=restart_offset, errors=[])
+    relexed_tokens = TokenStream(
+        source_code=new_file_info.source_code, start_offset=restart_offset
+    )
+    resync_token_index = None
+    while lexer.lex_token(state, relexed_tokens) != TokenKind.EOF:
+        old_offset = state.offset - offset_delta
+        if old_offset < edit_end:
+            continue
+        token_index = old_tokens.find_start_offset(old_offset)
+        while (
+            token_index < len(old_tokens)
+            and old_tokens.get_kind(token_index) in INSERTED_TOKEN_KINDS
+        ):
+            token_index += 1
+        if (
+            token_index < len(old_tokens)
+            and old_tokens.get_start_offset(token_index) == old_offset
+        ):
+            resync_token_index = token_index
+            break
+
+    # Re-run the pre-parser over the re-lexed tokens, and then over the old
+    # tokens until it gets back into a state that it was in before.
+    tokens = TokenStream(source_code=new_file_info.source_code)
+    tokens.extend_from(old_tokens, 0, checkpoints.output_indices[checkpoint_index])
+    new_checkpoints = PreparseCheckpoints()
+    new_checkpoints.extend_from(checkpoints, 0, checkpoint_index, index_delta=0)
+    preparser = Preparser(
+        result=tokens,
+        checkpoints=new_checkpoints,
+        stack=checkpoints.stacks[checkpoint_index],
+        previous_token_kind=checkpoints.get_previous_token_kind(checkpoint_index),
+    )
+    for token_index in range(len(relexed_tokens)):
+        if relexed_tokens.get_kind(token_index) == TokenKind.EOF:
+            preparser.finish(relexed_tokens, token_index)
+        else:
+            preparser.feed(relexed_tokens, token_index)
+
+    changed_tokens_start = checkpoints.output_indices[checkpoint_index]
+    changed_tokens_end = None
+    old_token_index = resync_token_index
+    while old_token_index is not None:
+        token_kind = old_tokens.get_kind(old_token_index)
+        if token_kind in INSERTED_TOKEN_KINDS:
+            old_token_index += 1
+            continue
+
+        old_checkpoint_index = checkpoints.find(old_token_index)
+        if old_checkpoint_index is not None and preparser.matches_checkpoint(
+            checkpoints, old_checkpoint_index
+        ):
+            output_index = checkpoints.output_indices[old_checkpoint_index]
+            new_checkpoints.extend_from(
+                checkpoints,
+                old_checkpoint_index,
+                len(checkpoints),
+                index_delta=len(tokens) - output_index,
+            )
+            changed_tokens_end = len(tokens)
+            tokens.extend_from(
+                old_tokens, output_index, len(old_tokens), offset_delta=offset_delta
+            )
+            break
+
+        if token_kind == TokenKind.EOF:
+            preparser.finish(old_tokens, old_token_index, offset_delta=offset_delta)
+            break
+        preparser.feed(old_tokens, old_token_index, offset_delta=offset_delta)
+        old_token_index += 1
+    if changed_tokens_end is None:
+        changed_tokens_end = len(tokens)
+
+    # Keep the errors for the tokens before and after the re-lexed region,
+    # adjusting the positions of the latter for the edit.
+    restart_position = file_info.get_position_for_offset(restart_offset)
+    old_edit_end_position = file_info.get_position_for_offset(edit_end)
+    new_edit_end_position = new_file_info.get_position_for_offset(
+        edit_end + offset_delta
+    )
+    if resync_token_index is not None:
+        resync_position = file_info.get_position_for_offset(
+            old_tokens.get_start_offset(resync_token_index)
+        )
+    else:
+        resync_position = None
+
+    def shift_position(position: Position) -> Position:
+        line = position.line
+        character = position.character
+        if line == old_edit_end_position.line:
+            character += (
+                new_edit_end_position.character - old_edit_end_position.character
+            )
+        line += new_edit_end_position.line - old_edit_end_position.line
+        return Position(line=line, character=character)
+
+    def shift_range(range: Optional[Range]) -> Optional[Range]:
+        if range is None:
+            return None
+        return Range(start=shift_position(range.start), end=shift_position(range.end))
+
+    prefix_errors = []
+    suffix_errors = []
+    for error in lexation.errors:
+        if error.range is None:
+            # Errors without a location are about the whole file, and are
+            # recomputed below.
+            continue
+        if error.range.start < restart_position:
+            prefix_errors.append(
+                attr.evolve(
+                    error,
+                    file_info=new_file_info,
+                    notes=[
+                        attr.evolve(note, file_info=new_file_info)
+                        for note in error.notes
+                    ],
+                )
+            )
+        elif resync_position is not None and error.range.start >= resync_position:
+            suffix_errors.append(
+                attr.evolve(
+                    error,
+                    file_info=new_file_info,
+                    range=shift_range(error.range),
+                    notes=[
+                        attr.evolve(
+                            note, file_info=new_file_info, range=shift_range(note.range)
+                        )
+                        for note in error.notes
+                    ],
+                )
+            )
+
+    errors = (
+        prefix_errors
+        + state.errors
+        + suffix_errors
+        + check_token_stream(file_info=new_file_info, tokens=tokens)
+    )
+    return (
+        new_file_info,
+        Lexation(
+            tokens=tokens,
+            errors=errors,
+            preparse_checkpoints=new_checkpoints,
+            changed_tokens=ChangedTokens(
+                start=changed_tokens_start, end=changed_tokens_end
+            ),
+        ),
+    )
+
 
-    tokens = list(preparse(lexation.tokens))
-    errors = lexation.errors
+def check_token_stream(file_info: FileInfo, tokens: TokenStream) -> List[Error]:
+    """Check the pre-parsed token stream for violations of known invariants."""
+    errors = []
 
     source_code_length = len(file_info.source_code)
-    tokens_length = sum(token.full_width for token in lexation.tokens)
+    tokens_length = tokens.full_width
     if source_code_length != tokens_length:
         errors.append(
             Error(
@@ -683,13 +1458,8 @@ def lex(file_info: FileInfo) -> Lexation:
             )
         )
 
-    num_lets = 0
-    num_ins = 0
-    for token in tokens:
-        if token.kind == TokenKind.LET:
-            num_lets += 1
-        elif token.kind == TokenKind.DUMMY_IN_FOR_LET:
-            num_ins += 1
+    num_lets = tokens.count_kind(TokenKind.LET)
+    num_ins = tokens.count_kind(TokenKind.DUMMY_IN_FOR_LET)
     if num_lets != num_ins:
         errors.append(
             Error(
@@ -707,13 +1477,8 @@ def lex(file_info: FileInfo) -> Lexation:
             )
         )
 
-    num_ifs = 0
-    num_endifs = 0
-    for token in tokens:
-        if token.kind == TokenKind.IF:
-            num_ifs += 1
-        elif token.kind == TokenKind.DUMMY_ENDIF:
-            num_endifs += 1
+    num_ifs = tokens.count_kind(TokenKind.IF)
+    num_endifs = tokens.count_kind(TokenKind.DUMMY_ENDIF)
     if num_ifs != num_endifs:
         errors.append(
             Error(
@@ -731,4 +1496,4 @@ def lex(file_info: FileInfo) -> Lexation:
             )
         )
 
-    return Lexation(tokens=tokens, errors=errors)
+    return errors
@@ -5,13 +5,15 @@ contained therein are enough to reconstitute the source code. The
 non-meaningful parts of the program are contained within "trivia" nodes. See
 the lexer for more information.
 
-The *green* CST is considered to be immutable and must not be modified.
+The *green* CST is considered to be immutable and must not be modified. This
+lets `reparse` share the subtrees that an edit didn't touch between the trees
+from before and after the edit.
 
 The *red* CST is based off of the green syntax tree. It is also immutable,
 but its nodes are generated lazily (since they contain `parent` pointers and
 therefore reference cycles).
 """
-from typing import Iterator, List, Optional, Tuple, Union
+from typing import Iterator, List, Optional, Set, Tuple, Union
 
 import attr
 
@@ -39,22 +41,33 @@ from .lexer import (
     Associativity,
     BINARY_OPERATOR_KINDS,
     BINARY_OPERATORS,
+    ChangedTokens,
+    INSERTED_TOKEN_KINDS,
     Token,
     TokenKind,
+    TokenStream,
     Trivium,
     TriviumKind,
 )
-from .utils import FileInfo, OffsetRange, Range
-
-
-def walk_tokens(node: Node) -> Iterator[Token]:
-    for child in node.children:
+from .utils import FileInfo, OffsetRange, Range, run_trampoline, TextEdit, Trampoline
+
+
+def walk_tokens(node: Node, reverse: bool = False) -> Iterator[Token]:
+    """Yield the tokens in the subtree rooted at `node`, in order, or in
+    reverse order if `reverse` is set."""
+    # Keep the nodes left to visit on an explicit stack, rather than
+    # recursing, since the tree may be arbitrarily deep.
+    stack: List[Union[Node, Token, None]] = list(
+        node.children if reverse else reversed(node.children)
+    )
+    while stack:
+        child = stack.pop()
         if child is None:
             continue
         if isinstance(child, Token):
             yield child
         elif isinstance(child, Node):
-            yield from walk_tokens(child)
+            stack.extend(child.children if reverse else reversed(child.children))
         else:
             assert False, f"Unexpected node child type: {child!r}"
 
@@ -79,17 +92,20 @@ class ParseException(Exception):
         self.error = error
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True)
 class State:
+    """The state of the parser, which the parser methods update in place as
+    they consume tokens."""
+
     file_info: FileInfo
-    tokens: List[Token] = attr.ib()
-    """The list of tokens that make up the file."""
+    tokens: TokenStream = attr.ib()
+    """The stream of tokens that make up the file."""
 
     @tokens.validator
     def check(self, attribute, value) -> None:
         assert len(self.tokens) > 0, "Expected at least one token (the EOF token)."
         assert (
-            self.tokens[-1].kind == TokenKind.EOF
+            self.tokens.get_kind(-1) == TokenKind.EOF
         ), "Token stream must end with an EOF token."
 
     token_index: int
@@ -124,7 +140,12 @@ class State:
     def end_of_file_offset_range(self) -> OffsetRange:
         last_offset = len(self.file_info.source_code)
         last_non_empty_token = next(
-            (token for token in reversed(self.tokens) if token.full_width > 0), None
+            (
+                self.tokens[token_index]
+                for token_index in reversed(range(len(self.tokens)))
+                if self.tokens.get_full_width(token_index) > 0
+            ),
+            None,
         )
 
         if last_non_empty_token is None:
@@ -149,6 +170,8 @@ class State:
     def get_current_token(self) -> Token:
         assert 0 <= self.token_index < len(self.tokens)
         token = self.tokens[self.token_index]
+        if not self.error_tokens:
+            return token
         error_trivia = [
             Trivium(kind=TriviumKind.ERROR, text=error_token.full_text)
             for error_token in self.error_tokens
@@ -157,21 +180,18 @@ class State:
 
     @property
     def current_token_offset_range(self) -> OffsetRange:
-        current_token = self.tokens[self.token_index]
-
         # We usually don't want to point to a dummy token, so rewind until
         # we find a non-dummy token.
         token_index = self.token_index
         offset = self.offset
         did_rewind = False
-        while token_index > 0 and current_token.is_dummy:
+        while token_index > 0 and self.tokens.is_dummy(token_index):
             did_rewind = True
             token_index -= 1
-            current_token = self.tokens[token_index]
-            offset -= current_token.full_width
+            offset -= self.tokens.get_full_width(token_index)
 
-        start = offset + current_token.leading_width
-        end = start + current_token.width
+        start = offset + self.tokens.get_leading_width(token_index)
+        end = start + len(self.tokens.get_text(token_index))
 
         if did_rewind:
             # If we rewound, point to the location immediately after the
@@ -181,7 +201,7 @@ class State:
 
     @property
     def current_token_kind(self) -> TokenKind:
-        return self.tokens[self.token_index].kind
+        return self.tokens.get_kind(self.token_index)
 
     @property
     def current_token_range(self) -> Range:
@@ -192,19 +212,16 @@ class State:
     @property
     def next_token(self) -> Token:
         assert (
-            self.tokens[self.token_index].kind != TokenKind.EOF
+            self.tokens.get_kind(self.token_index) != TokenKind.EOF
         ), "Tried to look at the token after the EOF token"
         return self.tokens[self.token_index + 1]
 
-    def update(self, **kwargs) -> "State":
-        return attr.evolve(self, **kwargs)
-
-    def add_error(self, error: Error) -> "State":
-        return self.update(errors=self.errors + [error])
+    def add_error(self, error: Error) -> None:
+        self.errors.append(error)
 
-    def assert_(self, condition: bool, code: ErrorCode, message: str) -> "State":
+    def assert_(self, condition: bool, code: ErrorCode, message: str) -> None:
         if not condition:
-            return self.add_error(
+            self.add_error(
                 Error(
                     file_info=self.file_info,
                     code=code,
@@ -213,54 +230,40 @@ class State:
                     notes=[],
                 )
             )
-        return self
 
-    def start_recovery(self) -> "State":
+    def start_recovery(self) -> None:
         assert (
             not self.is_recovering
         ), "Tried to start parser error recovery while already recovering"
-        return self.update(is_recovering=True)
+        self.is_recovering = True
 
-    def finish_recovery(self) -> "State":
+    def finish_recovery(self) -> None:
         assert (
             self.is_recovering
         ), "Tried to finish parser error recovery while not recovering"
-        return self.update(is_recovering=False)
+        self.is_recovering = False
 
-    def push_sync_token_kinds(self, token_kinds: List[TokenKind]) -> "State":
-        return self.update(sync_token_kinds=self.sync_token_kinds + [token_kinds])
+    def push_sync_token_kinds(self, token_kinds: List[TokenKind]) -> None:
+        self.sync_token_kinds.append(token_kinds)
 
-    def pop_sync_token_kinds(self) -> "State":
+    def pop_sync_token_kinds(self) -> None:
         assert self.sync_token_kinds
-        return self.update(sync_token_kinds=self.sync_token_kinds[:-1])
+        self.sync_token_kinds.pop()
 
-    def consume_token(self, token: Token) -> "State":
+    def consume_token(self, token: Token) -> None:
         assert (
-            self.get_current_token().kind != TokenKind.EOF
+            self.tokens.get_kind(self.token_index) != TokenKind.EOF
         ), "Tried to consume the EOF token."
 
         # We may have added leading error tokens as trivia, but we don't want
         # to double-count their width, since they've already been consumed.
-        full_width_without_errors = (
-            token.width
-            + sum(
-                trivium.width
-                for trivium in token.leading_trivia
-                if trivium.kind != TriviumKind.ERROR
-            )
-            + sum(
-                trivium.width
-                for trivium in token.trailing_trivia
-                if trivium.kind != TriviumKind.ERROR
-            )
-        )
-        return self.update(
-            token_index=self.token_index + 1,
-            offset=self.offset + full_width_without_errors,
-            error_tokens=[],
-        )
+        # The token in the stream doesn't include them.
+        self.offset += self.tokens.get_full_width(self.token_index)
+        self.token_index += 1
+        if self.error_tokens:
+            self.error_tokens = []
 
-    def consume_error_token(self, token: Token) -> "State":
+    def consume_error_token(self, token: Token) -> None:
         # Make sure not to use `self.current_token`, since that would duplicate
         # the error tokens.
         assert 0 <= self.token_index < len(self.tokens)
@@ -268,11 +271,9 @@ class State:
         assert (
             token.kind != TokenKind.EOF
         ), "Tried to consume the EOF token as an error token."
-        return self.update(
-            token_index=self.token_index + 1,
-            offset=self.offset + token.full_width,
-            error_tokens=self.error_tokens + [token],
-        )
+        self.offset += token.full_width
+        self.token_index += 1
+        self.error_tokens.append(token)
 
 
 class UnhandledParserException(Exception):
@@ -291,7 +292,7 @@ class UnhandledParserException(Exception):
             for error in self._state.errors
         )
         return f"""All tokens:
-{self._state.tokens}
+{list(self._state.tokens)}
 
 Parser location:
 {file_contents}
@@ -308,8 +309,217 @@ Original exception:
 """
 
 
+EXPR_SLOTS: Set[Tuple[type, str]] = {
+    (LetExpr, "n_value"),
+    (LetExpr, "n_body"),
+    (DefExpr, "n_definition"),
+    (DefExpr, "n_next"),
+    (IfExpr, "n_if_expr"),
+    (IfExpr, "n_then_expr"),
+    (IfExpr, "n_else_expr"),
+}
+"""The children of `let`, `def` and `if` expressions which are parsed with
+their own call to `parse_expr`, starting from the lowest precedence."""
+
+NAKED_BINDING_CHILDREN: Set[Tuple[type, str]] = {
+    (SyntaxTree, "n_expr"),
+    (LetExpr, "n_body"),
+    (DefExpr, "n_next"),
+    (BinaryExpr, "n_lhs"),
+    (BinaryExpr, "n_rhs"),
+    (FunctionCallExpr, "n_callee"),
+}
+"""The children which are parsed with the same `allow_naked_bindings` as their
+parent. (Any other child is parsed without allowing naked bindings.)"""
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ChildLocation:
+    """Where a child is in its parent node: the name of the parent's field,
+    and the index into that field if it's a list of children."""
+
+    parent: Node
+    name: str
+    index: Optional[int]
+    parent_location: Optional["ChildLocation"]
+    """The location of `parent` in its own parent, or `None` if `parent` is
+    the root of the tree. Locations share their parents' locations, so that
+    the path to a deeply-nested node doesn't have to be copied at each
+    level."""
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ReparseCandidate:
+    """An expression in a green tree which can be parsed again on its own.
+
+    If `is_atom` is set, then the expression is a `let`, `def` or `if`
+    expression, and is parsed with `parse_atom`. Otherwise, it's one of the
+    children in `EXPR_SLOTS`, and is parsed with `parse_expr`.
+    """
+
+    expr: Expr
+    offset: int
+    """The offset of the start of the expression's leading trivia."""
+
+    location: ChildLocation
+    """The location of the expression in the tree, which leads back up to the
+    root through each `parent_location`."""
+
+    allow_naked_bindings: bool
+    is_atom: bool
+
+
+def find_child_containing(
+    node: Node, offset: int, offset_range: OffsetRange
+) -> Optional[Tuple[str, Optional[int], Union[Node, Token], int]]:
+    """Find the child of `node` (which starts at `offset`) which contains the
+    given range, and return the name of its field, its index into that field
+    if it's a list of children, the child itself and its offset."""
+    for (name, child_offset) in zip(node.child_names, node.child_offsets):
+        child_offset += offset
+        child = getattr(node, name)
+        if isinstance(child, list):
+            elements = enumerate(child)
+        else:
+            elements = enumerate([child])
+        for (index, element) in elements:
+            if element is None:
+                continue
+            child_end_offset = child_offset + element.full_width
+            if (
+                child_offset <= offset_range.start
+                and offset_range.end <= child_end_offset
+            ):
+                return (
+                    name,
+                    index if isinstance(child, list) else None,
+                    element,
+                    child_offset,
+                )
+            child_offset = child_end_offset
+    return None
+
+
+def find_reparse_candidates(
+    syntax_tree: SyntaxTree, offset_range: OffsetRange
+) -> Iterator[ReparseCandidate]:
+    """Find the expressions which contain the given range and can be parsed
+    again on their own, from the innermost to the outermost.
+
+    The candidates are yielded lazily, so a caller which stops at the first
+    viable candidate doesn't pay for constructing the rest.
+    """
+    # The node, offset, location, `allow_naked_bindings` and `is_atom` of each
+    # candidate, from the outermost to the innermost.
+    candidates: List[Tuple[Expr, int, ChildLocation, bool, bool]] = []
+    location: Optional[ChildLocation] = None
+    node: Node = syntax_tree
+    offset = 0
+    allow_naked_bindings = True
+    while True:
+        found_child = find_child_containing(node, offset, offset_range)
+        if found_child is None:
+            break
+        (name, index, child, child_offset) = found_child
+        if not isinstance(child, Node):
+            break
+        child_location = ChildLocation(
+            parent=node, name=name, index=index, parent_location=location
+        )
+
+        key = (type(node), child_location.name)
+        if key not in NAKED_BINDING_CHILDREN:
+            allow_naked_bindings = False
+        (node, offset, location) = (child, child_offset, child_location)
+
+        if key in EXPR_SLOTS:
+            assert isinstance(node, Expr)
+            candidates.append((node, offset, location, allow_naked_bindings, False))
+        if isinstance(node, (LetExpr, DefExpr, IfExpr)):
+            candidates.append((node, offset, location, allow_naked_bindings, True))
+
+    for (expr, offset, location, allow_naked_bindings, is_atom) in reversed(
+        candidates
+    ):
+        yield ReparseCandidate(
+            expr=expr,
+            offset=offset,
+            location=location,
+            allow_naked_bindings=allow_naked_bindings,
+            is_atom=is_atom,
+        )
+
+
+def replace_descendant(
+    location: Optional[ChildLocation], node: Union[Node, Token, None]
+) -> Node:
+    """Replace the descendant at `location` with `node`, and return the new
+    root of the tree.
+
+    Only the ancestors are copied: the rest of the tree is shared with the
+    original.
+    """
+    while location is not None:
+        child = node
+        if location.index is None:
+            node = location.parent.update(**{location.name: child})
+        else:
+            children = list(getattr(location.parent, location.name))
+            children[location.index] = child
+            node = location.parent.update(**{location.name: children})
+        location = location.parent_location
+    assert isinstance(node, Node)
+    return node
+
+
+def shift_errors_for_edit(
+    errors: List[Error], file_info: FileInfo, edit: TextEdit, after_offset: int
+) -> Optional[List[Error]]:
+    """Adjust the ranges of `errors`, which are from before `edit`, to refer to
+    the same code in `file_info`, which is from after it.
+
+    Returns `None` if any of the errors starts at or before `after_offset`, or
+    if any of the ranges of the errors or their notes overlap the edit.
+    """
+
+    def shift_range(old_file_info: FileInfo, range: Range) -> Optional[Range]:
+        start = old_file_info.get_offset_for_position(range.start)
+        end = old_file_info.get_offset_for_position(range.end)
+        if end <= edit.offset_range.start:
+            return range
+        elif start >= edit.offset_range.end:
+            return file_info.get_range_from_offset_range(
+                OffsetRange(start=start + edit.offset_delta, end=end + edit.offset_delta)
+            )
+        else:
+            return None
+
+    shifted_errors = []
+    for error in errors:
+        if error.range is None:
+            return None
+        if error.file_info.get_offset_for_position(error.range.start) <= after_offset:
+            return None
+        error_range = shift_range(error.file_info, error.range)
+        if error_range is None:
+            return None
+
+        notes = []
+        for note in error.notes:
+            note_range = None
+            if note.range is not None:
+                note_range = shift_range(note.file_info, note.range)
+                if note_range is None:
+                    return None
+            notes.append(attr.evolve(note, file_info=file_info, range=note_range))
+        shifted_errors.append(
+            attr.evolve(error, file_info=file_info, range=error_range, notes=notes)
+        )
+    return shifted_errors
+
+
 class Parser:
-    def parse(self, file_info: FileInfo, tokens: List[Token]) -> Parsation:
+    def parse(self, file_info: FileInfo, tokens: TokenStream) -> Parsation:
         state = State(
             file_info=file_info,
             tokens=tokens,
@@ -327,13 +537,13 @@ class Parser:
             return Parsation(green_cst=syntax_tree, errors=state.errors)
 
         try:
-            (state, n_expr) = self.parse_expr(state, allow_naked_bindings=True)
-            (state, t_eof) = self.expect_token(state, [TokenKind.EOF])
+            n_expr = run_trampoline(self.parse_expr(state, allow_naked_bindings=True))
+            t_eof = self.expect_token(state, [TokenKind.EOF])
             syntax_tree = SyntaxTree(n_expr=n_expr, t_eof=t_eof)
 
             source_code_length = len(file_info.source_code)
-            tokens_length = sum(token.full_width for token in walk_tokens(syntax_tree))
-            state = state.assert_(
+            tokens_length = syntax_tree.full_width
+            state.assert_(
                 source_code_length == tokens_length,
                 code=ErrorCode.PARSED_LENGTH_MISMATCH,
                 message=(
@@ -351,15 +561,211 @@ class Parser:
         except Exception as e:
             raise UnhandledParserException(state) from e
 
+    def reparse(
+        self,
+        parsation: Parsation,
+        old_tokens: TokenStream,
+        file_info: FileInfo,
+        tokens: TokenStream,
+        edit: TextEdit,
+        changed_tokens: Optional[ChangedTokens] = None,
+    ) -> Parsation:
+        """Parse the file again after `edit` was applied to it.
+
+        `parsation` and `old_tokens` are from before the edit, and `file_info`
+        and `tokens` are from after it (see `relex`). We parse only the
+        innermost `let`, `def` or `if` expression (or one of its
+        sub-expressions) containing the edit, and share every other subtree
+        with the old tree. If we can't be sure that the result is the same as
+        a full parse, we fall back to a full parse.
+
+        If `changed_tokens` is provided (see `Lexation.changed_tokens`), then
+        only those tokens are compared with the old ones, rather than every
+        token before and after the reparsed expression.
+        """
+        for candidate in find_reparse_candidates(
+            parsation.green_cst, edit.offset_range
+        ):
+            start_index = self.get_first_token_index(tokens, candidate.offset)
+            if changed_tokens is None:
+                compare_start_index = 0
+            else:
+                compare_start_index = min(changed_tokens.start, start_index)
+            if start_index != self.get_first_token_index(
+                old_tokens, candidate.offset
+            ) or not tokens.matches(
+                old_tokens, compare_start_index, start_index, compare_start_index
+            ):
+                # The edit changed some of the tokens before this
+                # expression, so try an enclosing one instead.
+                continue
+
+            old_end_index = self.get_old_end_index(candidate, old_tokens)
+            if old_end_index is None:
+                break
+
+            # The old errors must all be after this expression, so that the
+            # parser's state (and so the tree) up to the end of it doesn't
+            # depend on how it recovered from them. The errors after it are
+            # then the same as before, other than their positions. (If this
+            # isn't true of this expression, it isn't true of any enclosing
+            # expression either.) Parsing the expression may have reported an
+            # error at the token after it, so the errors have to start after
+            # that too. (If that's the end of the file, there can't be any.)
+            errors: Optional[List[Error]] = []
+            if parsation.errors:
+                next_token_index = old_end_index
+                while old_tokens.is_dummy(next_token_index):
+                    if next_token_index == len(old_tokens) - 1:
+                        break
+                    next_token_index += 1
+                errors = shift_errors_for_edit(
+                    parsation.errors,
+                    file_info=file_info,
+                    edit=edit,
+                    after_offset=old_tokens.get_offset_range(next_token_index).end,
+                )
+            if errors is None:
+                break
+
+            new_expr = self.reparse_candidate(
+                candidate=candidate,
+                start_index=start_index,
+                old_end_index=old_end_index,
+                old_tokens=old_tokens,
+                file_info=file_info,
+                tokens=tokens,
+                edit=edit,
+                changed_tokens=changed_tokens,
+            )
+            if new_expr is not None:
+                syntax_tree = replace_descendant(candidate.location, new_expr)
+                assert isinstance(syntax_tree, SyntaxTree)
+                if syntax_tree.full_width == len(file_info.source_code):
+                    return Parsation(green_cst=syntax_tree, errors=errors)
+
+            # Otherwise, the edit changed the structure of the surrounding
+            # code. Trying each enclosing expression in turn would be
+            # quadratic, so do a full parse instead.
+            break
+        return self.parse(file_info=file_info, tokens=tokens)
+
+    def get_old_end_index(
+        self, candidate: ReparseCandidate, old_tokens: TokenStream
+    ) -> Optional[int]:
+        """Get the index of the first token after the expression for
+        `candidate` in the tokens from before the edit, or `None` if it's
+        the end of the file."""
+        # Find the end of the expression from its offset, rather than by
+        # counting its tokens. The dummy tokens at the end of the expression
+        # start at the same offset as the tokens after it, so count those.
+        num_trailing_dummy_tokens = 0
+        for token in walk_tokens(candidate.expr, reverse=True):
+            if not token.is_dummy:
+                break
+            num_trailing_dummy_tokens += 1
+        else:
+            return None
+        old_end_index = (
+            old_tokens.find_start_offset(candidate.offset + candidate.expr.full_width)
+            + num_trailing_dummy_tokens
+        )
+        if old_end_index >= len(old_tokens):
+            return None
+        return old_end_index
+
+    def reparse_candidate(
+        self,
+        candidate: ReparseCandidate,
+        start_index: int,
+        old_end_index: int,
+        old_tokens: TokenStream,
+        file_info: FileInfo,
+        tokens: TokenStream,
+        edit: TextEdit,
+        changed_tokens: Optional[ChangedTokens],
+    ) -> Optional[Expr]:
+        """Parse the expression for `candidate` again, starting from the token
+        at `start_index`, or return `None` if the result might not be the same
+        as that of a full parse. `old_end_index` is the index of the token
+        after the expression before the edit.
+
+        The tokens before the expression must be unchanged, so a full parse
+        would produce the same tree up to it. It would also produce the same
+        tree after it if parsing it stops at a token from which the rest of
+        the tokens are unchanged. (Since the old parse had no errors up to
+        there, the parser would have made the same decisions for those
+        tokens.)
+        """
+        state = State(
+            file_info=file_info,
+            tokens=tokens,
+            token_index=start_index,
+            offset=candidate.offset,
+            errors=[],
+            is_recovering=False,
+            error_tokens=[],
+            sync_token_kinds=[[TokenKind.EOF]],
+        )
+        if candidate.is_atom:
+            new_expr = run_trampoline(
+                self.parse_atom(
+                    state, allow_naked_bindings=candidate.allow_naked_bindings
+                )
+            )
+        else:
+            new_expr = run_trampoline(
+                self.parse_expr(
+                    state, allow_naked_bindings=candidate.allow_naked_bindings
+                )
+            )
+        if new_expr is None or state.errors:
+            return None
+
+        if old_tokens.get_start_offset(old_end_index) < edit.offset_range.end:
+            return None
+
+        end_index = state.token_index
+        if changed_tokens is None:
+            compare_end_index = len(tokens)
+        else:
+            # The tokens from the end of the changed ones onwards are the same
+            # as the old ones at the end of the stream, so those after the
+            # expression match if they line up with them.
+            if old_end_index != end_index - (len(tokens) - len(old_tokens)):
+                return None
+            compare_end_index = max(changed_tokens.end, end_index)
+        if not tokens.matches(
+            old_tokens,
+            end_index,
+            compare_end_index,
+            old_end_index,
+            offset_delta=edit.offset_delta,
+        ):
+            return None
+        return new_expr
+
+    def get_first_token_index(self, tokens: TokenStream, offset: int) -> int:
+        """Get the index of the first token of an expression starting at
+        `offset`, skipping over any dummy tokens which end the previous
+        expression."""
+        token_index = tokens.find_start_offset(offset)
+        while (
+            token_index < len(tokens) - 1
+            and tokens.get_kind(token_index) in INSERTED_TOKEN_KINDS
+        ):
+            token_index += 1
+        return token_index
+
     def parse_let_expr(
         self, state: State, allow_naked_bindings: bool
-    ) -> Tuple[State, Optional[LetExpr]]:
+    ) -> Trampoline[Optional[LetExpr]]:
         t_let_range = state.current_token_range
-        (state, t_let) = self.expect_token(state, [TokenKind.LET])
+        t_let = self.expect_token(state, [TokenKind.LET])
         if not t_let:
-            return (state, None)
+            return None
 
-        state = state.push_sync_token_kinds([TokenKind.DUMMY_IN_FOR_LET])
+        state.push_sync_token_kinds([TokenKind.DUMMY_IN_FOR_LET])
         let_note = Note(
             file_info=state.file_info,
             message="This is the beginning of the let-binding.",
@@ -367,7 +773,7 @@ class Parser:
         )
         notes = [let_note]
 
-        (state, n_pattern) = self.parse_pattern(
+        n_pattern = self.parse_pattern(
             state,
             error=Error(
                 file_info=state.file_info,
@@ -379,40 +785,35 @@ class Parser:
             ),
         )
 
-        (state, t_equals) = self.expect_token(state, [TokenKind.EQUALS], notes=notes)
-        (state, n_value) = self.parse_expr(state, allow_naked_bindings=False)
-        (state, t_in) = self.expect_token(
-            state, [TokenKind.DUMMY_IN_FOR_LET], notes=notes
-        )
+        t_equals = self.expect_token(state, [TokenKind.EQUALS], notes=notes)
+        n_value = yield self.parse_expr(state, allow_naked_bindings=False)
+        t_in = self.expect_token(state, [TokenKind.DUMMY_IN_FOR_LET], notes=notes)
         if allow_naked_bindings and state.current_token_kind == TokenKind.EOF:
             n_body = None
         else:
-            (state, n_body) = self.parse_expr(
+            n_body = yield self.parse_expr(
                 state, allow_naked_bindings=allow_naked_bindings
             )
 
-        state = state.pop_sync_token_kinds()
-        return (
-            state,
-            LetExpr(
-                t_let=t_let,
-                n_pattern=n_pattern,
-                t_equals=t_equals,
-                n_value=n_value,
-                t_in=t_in,
-                n_body=n_body,
-            ),
+        state.pop_sync_token_kinds()
+        return LetExpr(
+            t_let=t_let,
+            n_pattern=n_pattern,
+            t_equals=t_equals,
+            n_value=n_value,
+            t_in=t_in,
+            n_body=n_body,
         )
 
     def parse_def_expr(
         self, state: State, allow_naked_bindings: bool
-    ) -> Tuple[State, Optional[DefExpr]]:
+    ) -> Trampoline[Optional[DefExpr]]:
         t_def_range = state.current_token_range
-        (state, t_def) = self.expect_token(state, [TokenKind.DEF])
+        t_def = self.expect_token(state, [TokenKind.DEF])
         if not t_def:
-            return (state, None)
+            return None
 
-        state = state.push_sync_token_kinds([TokenKind.DUMMY_IN_FOR_DEF])
+        state.push_sync_token_kinds([TokenKind.DUMMY_IN_FOR_DEF])
         def_note = Note(
             file_info=state.file_info,
             message="This is the beginning of the function definition.",
@@ -420,7 +821,7 @@ class Parser:
         )
         notes = [def_note]
 
-        (state, n_name) = self.parse_variable_pattern(
+        n_name = self.parse_variable_pattern(
             state,
             error=Error(
                 file_info=state.file_info,
@@ -431,87 +832,71 @@ class Parser:
                 range=state.current_token_range,
             ),
         )
-        (state, n_parameter_list) = self.parse_parameter_list(state)
+        n_parameter_list = self.parse_parameter_list(state)
 
-        (state, t_double_arrow) = self.expect_token(
-            state, [TokenKind.DOUBLE_ARROW], notes=notes
-        )
-        (state, n_definition) = self.parse_expr(state, allow_naked_bindings=False)
-        (state, t_in) = self.expect_token(
-            state, [TokenKind.DUMMY_IN_FOR_DEF], notes=notes
-        )
-        if allow_naked_bindings and state.get_current_token().kind == TokenKind.EOF:
+        t_double_arrow = self.expect_token(state, [TokenKind.DOUBLE_ARROW], notes=notes)
+        n_definition = yield self.parse_expr(state, allow_naked_bindings=False)
+        t_in = self.expect_token(state, [TokenKind.DUMMY_IN_FOR_DEF], notes=notes)
+        if allow_naked_bindings and state.current_token_kind == TokenKind.EOF:
             n_next = None
         else:
-            (state, n_next) = self.parse_expr(
+            n_next = yield self.parse_expr(
                 state, allow_naked_bindings=allow_naked_bindings
             )
 
-        return (
-            state,
-            DefExpr(
-                t_def=t_def,
-                n_name=n_name,
-                n_parameter_list=n_parameter_list,
-                t_double_arrow=t_double_arrow,
-                n_definition=n_definition,
-                t_in=t_in,
-                n_next=n_next,
-            ),
+        return DefExpr(
+            t_def=t_def,
+            n_name=n_name,
+            n_parameter_list=n_parameter_list,
+            t_double_arrow=t_double_arrow,
+            n_definition=n_definition,
+            t_in=t_in,
+            n_next=n_next,
         )
 
-    def parse_if_expr(self, state: State) -> Tuple[State, Optional[IfExpr]]:
-        (state, t_if) = self.expect_token(state, [TokenKind.IF])
+    def parse_if_expr(self, state: State) -> Trampoline[Optional[IfExpr]]:
+        t_if = self.expect_token(state, [TokenKind.IF])
         if not t_if:
-            return (state, None)
+            return None
 
-        state = state.push_sync_token_kinds([TokenKind.DUMMY_ENDIF])
-        (state, n_if_expr) = self.parse_expr(state)
-        (state, t_then) = self.expect_token(state, [TokenKind.THEN])
-        (state, n_then_expr) = self.parse_expr(state)
+        state.push_sync_token_kinds([TokenKind.DUMMY_ENDIF])
+        n_if_expr = yield self.parse_expr(state)
+        t_then = self.expect_token(state, [TokenKind.THEN])
+        n_then_expr = yield self.parse_expr(state)
         if state.current_token_kind == TokenKind.ELSE:
-            (state, t_else) = self.expect_token(state, [TokenKind.ELSE])
-            (state, n_else_expr) = self.parse_expr(state)
+            t_else = self.expect_token(state, [TokenKind.ELSE])
+            n_else_expr = yield self.parse_expr(state)
         else:
             t_else = None
             n_else_expr = None
-        (state, t_endif) = self.expect_token(state, [TokenKind.DUMMY_ENDIF])
-        state = state.pop_sync_token_kinds()
-
-        return (
-            state,
-            IfExpr(
-                t_if=t_if,
-                n_if_expr=n_if_expr,
-                t_then=t_then,
-                n_then_expr=n_then_expr,
-                t_else=t_else,
-                n_else_expr=n_else_expr,
-                t_endif=t_endif,
-            ),
+        t_endif = self.expect_token(state, [TokenKind.DUMMY_ENDIF])
+        state.pop_sync_token_kinds()
+
+        return IfExpr(
+            t_if=t_if,
+            n_if_expr=n_if_expr,
+            t_then=t_then,
+            n_then_expr=n_then_expr,
+            t_else=t_else,
+            n_else_expr=n_else_expr,
+            t_endif=t_endif,
         )
 
-    def parse_pattern(
-        self, state: State, error: Error = None
-    ) -> Tuple[State, Optional[Pattern]]:
-        (state, t_identifier) = self.expect_token(
-            state, [TokenKind.IDENTIFIER], error=error
-        )
+    def parse_pattern(self, state: State, error: Error = None) -> Optional[Pattern]:
+        t_identifier = self.expect_token(state, [TokenKind.IDENTIFIER], error=error)
         if t_identifier:
-            return (state, VariablePattern(t_identifier=t_identifier))
+            return VariablePattern(t_identifier=t_identifier)
         else:
-            return (state, None)
+            return None
 
     def parse_variable_pattern(
         self, state: State, error: Error = None
-    ) -> Tuple[State, Optional[VariablePattern]]:
-        (state, t_identifier) = self.expect_token(
-            state, [TokenKind.IDENTIFIER], error=error
-        )
+    ) -> Optional[VariablePattern]:
+        t_identifier = self.expect_token(state, [TokenKind.IDENTIFIER], error=error)
         if t_identifier:
-            return (state, VariablePattern(t_identifier=t_identifier))
+            return VariablePattern(t_identifier=t_identifier)
         else:
-            return (state, None)
+            return None
 
     def parse_expr(
         self,
@@ -529,7 +914,7 @@ class Parser:
         #     # Naked let: no expression for this let-binding.
         #     let bar = 2
         allow_naked_bindings: bool = False,
-    ) -> Tuple[State, Optional[Expr]]:
+    ) -> Trampoline[Optional[Expr]]:
         """Parse an expression, even if that parse involves left-recursion.
 
         This parses the expression using precedence-climbing to account for
@@ -537,11 +922,11 @@ class Parser:
 
         https://eli.thegreenplace.net/2012/08/02/parsing-expressions-by-precedence-climbing
         """
-        (state, n_expr) = self.parse_non_binary_expr(
+        n_expr = yield self.parse_non_binary_expr(
             state, allow_naked_bindings=allow_naked_bindings
         )
         if n_expr is None:
-            return (state, None)
+            return None
 
         while state.current_token_kind in BINARY_OPERATORS:
             (precedence, associativity) = BINARY_OPERATORS[state.current_token_kind]
@@ -555,87 +940,91 @@ class Parser:
             else:
                 assert False, "Invalid associativity"
 
-            (state, t_operator) = self.expect_token(state, BINARY_OPERATOR_KINDS)
+            t_operator = self.expect_token(state, BINARY_OPERATOR_KINDS)
             assert (
                 t_operator is not None
             ), "Should have been checked by the while-loop condition"
 
-            (state, n_rhs) = self.parse_expr(
+            n_rhs = yield self.parse_expr(
                 state,
                 min_precedence=next_min_precedence,
                 allow_naked_bindings=allow_naked_bindings,
             )
             n_expr = BinaryExpr(n_lhs=n_expr, t_operator=t_operator, n_rhs=n_rhs)
-        return (state, n_expr)
+        return n_expr
 
     def parse_non_binary_expr(
         self, state: State, allow_naked_bindings: bool
-    ) -> Tuple[State, Optional[Expr]]:
-        (state, n_expr) = self.parse_atom(
-            state, allow_naked_bindings=allow_naked_bindings
-        )
+    ) -> Trampoline[Optional[Expr]]:
+        n_expr = yield self.parse_atom(state, allow_naked_bindings=allow_naked_bindings)
         while n_expr is not None:
-            token = state.get_current_token()
-            if token.kind == TokenKind.EOF:
+            token_kind = state.current_token_kind
+            if token_kind == TokenKind.EOF:
                 break
-            elif token.kind == TokenKind.LPAREN:
-                (state, n_expr) = self.parse_function_call(
-                    state, current_token=token, n_callee=n_expr
+            elif token_kind == TokenKind.LPAREN:
+                n_expr = yield self.parse_function_call(
+                    state, current_token=state.get_current_token(), n_callee=n_expr
                 )
             else:
                 break
-        return (state, n_expr)
+        return n_expr
 
-    def skip_past(self, state: State, kind: TokenKind) -> State:
+    def skip_past(self, state: State, kind: TokenKind) -> None:
         while state.current_token_kind != kind:
-            state = state.consume_error_token(state.get_current_token())
-        state = state.consume_error_token(state.get_current_token())
-        return state
+            state.consume_error_token(state.get_current_token())
+        state.consume_error_token(state.get_current_token())
 
-    def add_error_and_recover(self, state: State, error: Error) -> State:
+    def add_error_and_recover(self, state: State, error: Error) -> None:
         if state.is_recovering:
-            return state
-        state = state.start_recovery()
+            return
+        state.start_recovery()
 
         sync_token_kinds = set(
             token_kind
             for sync_token_kinds in state.sync_token_kinds
             for token_kind in sync_token_kinds
         )
-        state = state.add_error(error)
+        state.add_error(error)
         while state.current_token_kind != TokenKind.EOF:
-            current_token = state.get_current_token()
+            current_token_kind = state.current_token_kind
 
-            if current_token.kind == TokenKind.LET:
+            if current_token_kind == TokenKind.LET:
                 # 'let' is *always* paired with a dummy 'in', thanks to the
                 # pre-parser, so make sure to synchronize past that 'in'.
                 # Otherwise we end up with too many 'in's for our 'let's
-                state = self.skip_past(state, TokenKind.DUMMY_IN_FOR_LET)
+                self.skip_past(state, TokenKind.DUMMY_IN_FOR_LET)
                 continue
 
-            if current_token.kind in sync_token_kinds:
-                return state
-            state = state.consume_error_token(state.get_current_token())
-        return state
+            if current_token_kind in sync_token_kinds:
+                return
+            state.consume_error_token(state.get_current_token())
 
     def parse_atom(
         self, state: State, allow_naked_bindings: bool
-    ) -> Tuple[State, Optional[Expr]]:
-        token = state.get_current_token()
-        if token.kind == TokenKind.IDENTIFIER:
+    ) -> Trampoline[Optional[Expr]]:
+        token_kind = state.current_token_kind
+        if token_kind == TokenKind.IDENTIFIER:
             return self.parse_identifier_expr(state)
-        elif token.kind == TokenKind.INT_LITERAL:
+        elif token_kind == TokenKind.INT_LITERAL:
             return self.parse_int_literal(state)
-        elif token.kind == TokenKind.STRING_LITERAL:
+        elif token_kind == TokenKind.STRING_LITERAL:
             return self.parse_string_literal(state)
-        elif token.kind == TokenKind.LET:
-            return self.parse_let_expr(state, allow_naked_bindings=allow_naked_bindings)
-        elif token.kind == TokenKind.DEF:
-            return self.parse_def_expr(state, allow_naked_bindings=allow_naked_bindings)
-        elif token.kind == TokenKind.IF:
-            return self.parse_if_expr(state)
+        elif token_kind == TokenKind.LET:
+            return (
+                yield self.parse_let_expr(
+                    state, allow_naked_bindings=allow_naked_bindings
+                )
+            )
+        elif token_kind == TokenKind.DEF:
+            return (
+                yield self.parse_def_expr(
+                    state, allow_naked_bindings=allow_naked_bindings
+                )
+            )
+        elif token_kind == TokenKind.IF:
+            return (yield self.parse_if_expr(state))
         else:
-            state = self.add_error_and_recover(
+            self.add_error_and_recover(
                 state,
                 Error(
                     file_info=state.file_info,
@@ -650,25 +1039,22 @@ class Parser:
                     notes=[],
                 ),
             )
-            return (state, None)
+            return None
         raise UnhandledParserException(state) from ValueError(
-            f"tried to parse expression of unsupported token kind {token.kind}"
+            f"tried to parse expression of unsupported token kind {token_kind}"
         )
 
     def parse_function_call(
         self, state: State, current_token: Token, n_callee: Expr
-    ) -> Tuple[State, Optional[FunctionCallExpr]]:
-        (state, n_argument_list) = self.parse_argument_list(state)
-        return (
-            state,
-            FunctionCallExpr(n_callee=n_callee, n_argument_list=n_argument_list),
-        )
+    ) -> Trampoline[Optional[FunctionCallExpr]]:
+        n_argument_list = yield self.parse_argument_list(state)
+        return FunctionCallExpr(n_callee=n_callee, n_argument_list=n_argument_list)
 
-    def parse_argument_list(self, state: State) -> Tuple[State, Optional[ArgumentList]]:
+    def parse_argument_list(self, state: State) -> Trampoline[Optional[ArgumentList]]:
         t_lparen_range = state.current_token_range
-        (state, t_lparen) = self.expect_token(state, [TokenKind.LPAREN])
+        t_lparen = self.expect_token(state, [TokenKind.LPAREN])
         if t_lparen is None:
-            state = self.add_error_and_recover(
+            self.add_error_and_recover(
                 state,
                 Error(
                     file_info=state.file_info,
@@ -684,20 +1070,20 @@ class Parser:
                     range=state.current_token_range,
                 ),
             )
-            return (state, None)
+            return None
 
-        state = state.push_sync_token_kinds([TokenKind.RPAREN])
+        state.push_sync_token_kinds([TokenKind.RPAREN])
         arguments: List[Argument] = []
         while state.current_token_kind not in [TokenKind.RPAREN, TokenKind.EOF]:
-            (state, n_argument) = self.parse_argument(state)
+            n_argument = yield self.parse_argument(state)
             if n_argument is None:
                 break
             arguments.append(n_argument)
             if n_argument.t_comma is None:
                 break
-        state = state.pop_sync_token_kinds()
+        state.pop_sync_token_kinds()
 
-        (state, t_rparen) = self.expect_token(
+        t_rparen = self.expect_token(
             state,
             [TokenKind.RPAREN],
             error=Error(
@@ -720,24 +1106,21 @@ class Parser:
                 range=state.current_token_range,
             ),
         )
-        return (
-            state,
-            ArgumentList(t_lparen=t_lparen, arguments=arguments, t_rparen=t_rparen),
-        )
+        return ArgumentList(t_lparen=t_lparen, arguments=arguments, t_rparen=t_rparen)
 
-    def parse_argument(self, state: State) -> Tuple[State, Optional[Argument]]:
+    def parse_argument(self, state: State) -> Trampoline[Optional[Argument]]:
         argument_start_offset = state.offset
-        (state, n_expr) = self.parse_expr(state)
+        n_expr = yield self.parse_expr(state)
         if n_expr is None:
-            return (state, None)
+            return None
 
-        token = state.get_current_token()
-        if token.kind == TokenKind.RPAREN:
-            return (state, Argument(n_expr=n_expr, t_comma=None))
+        token_kind = state.current_token_kind
+        if token_kind == TokenKind.RPAREN:
+            return Argument(n_expr=n_expr, t_comma=None)
 
-        if token.kind == TokenKind.COMMA:
-            (state, t_comma) = self.expect_token(state, [TokenKind.COMMA])
-            return (state, Argument(n_expr=n_expr, t_comma=t_comma))
+        if token_kind == TokenKind.COMMA:
+            t_comma = self.expect_token(state, [TokenKind.COMMA])
+            return Argument(n_expr=n_expr, t_comma=t_comma)
 
         argument_end_offset = (
             argument_start_offset + n_expr.leading_width + n_expr.width
@@ -756,17 +1139,15 @@ class Parser:
             notes=[],
             range=expected_comma_range,
         )
-        (state, t_comma) = self.expect_token(state, [TokenKind.COMMA], error=error)
+        t_comma = self.expect_token(state, [TokenKind.COMMA], error=error)
 
-        return (state, Argument(n_expr=n_expr, t_comma=t_comma))
+        return Argument(n_expr=n_expr, t_comma=t_comma)
 
-    def parse_parameter_list(
-        self, state: State
-    ) -> Tuple[State, Optional[ParameterList]]:
+    def parse_parameter_list(self, state: State) -> Optional[ParameterList]:
         t_lparen_range = state.current_token_range
-        (state, t_lparen) = self.expect_token(state, [TokenKind.LPAREN])
+        t_lparen = self.expect_token(state, [TokenKind.LPAREN])
         if t_lparen is None:
-            state = self.add_error_and_recover(
+            self.add_error_and_recover(
                 state,
                 Error(
                     file_info=state.file_info,
@@ -782,18 +1163,18 @@ class Parser:
                     range=state.current_token_range,
                 ),
             )
-            return (state, None)
+            return None
 
         parameters: List[Parameter] = []
         while state.current_token_kind not in [TokenKind.RPAREN, TokenKind.EOF]:
-            (state, n_parameter) = self.parse_parameter(state)
+            n_parameter = self.parse_parameter(state)
             if n_parameter is None:
                 break
             parameters.append(n_parameter)
             if n_parameter.t_comma is None:
                 break
 
-        (state, t_rparen) = self.expect_token(
+        t_rparen = self.expect_token(
             state,
             [TokenKind.RPAREN],
             error=Error(
@@ -816,24 +1197,23 @@ class Parser:
                 range=state.current_token_range,
             ),
         )
-        return (
-            state,
-            ParameterList(t_lparen=t_lparen, parameters=parameters, t_rparen=t_rparen),
+        return ParameterList(
+            t_lparen=t_lparen, parameters=parameters, t_rparen=t_rparen
         )
 
-    def parse_parameter(self, state: State) -> Tuple[State, Optional[Parameter]]:
+    def parse_parameter(self, state: State) -> Optional[Parameter]:
         parameter_start_offset = state.offset
-        (state, n_pattern) = self.parse_pattern(state)
+        n_pattern = self.parse_pattern(state)
         if n_pattern is None:
-            return (state, None)
+            return None
 
-        token = state.get_current_token()
-        if token.kind == TokenKind.RPAREN:
-            return (state, Parameter(n_pattern=n_pattern, t_comma=None))
+        token_kind = state.current_token_kind
+        if token_kind == TokenKind.RPAREN:
+            return Parameter(n_pattern=n_pattern, t_comma=None)
 
-        if token.kind == TokenKind.COMMA:
-            (state, t_comma) = self.expect_token(state, [TokenKind.COMMA])
-            return (state, Parameter(n_pattern=n_pattern, t_comma=t_comma))
+        if token_kind == TokenKind.COMMA:
+            t_comma = self.expect_token(state, [TokenKind.COMMA])
+            return Parameter(n_pattern=n_pattern, t_comma=t_comma)
 
         parameter_end_offset = (
             parameter_start_offset + n_pattern.leading_width + n_pattern.width
@@ -854,31 +1234,27 @@ class Parser:
             notes=[],
             range=expected_comma_range,
         )
-        (state, t_comma) = self.expect_token(state, [TokenKind.COMMA], error=error)
+        t_comma = self.expect_token(state, [TokenKind.COMMA], error=error)
 
-        return (state, Parameter(n_pattern=n_pattern, t_comma=t_comma))
+        return Parameter(n_pattern=n_pattern, t_comma=t_comma)
 
-    def parse_identifier_expr(
-        self, state: State
-    ) -> Tuple[State, Optional[IdentifierExpr]]:
-        (state, t_identifier) = self.expect_token(state, [TokenKind.IDENTIFIER])
+    def parse_identifier_expr(self, state: State) -> Optional[IdentifierExpr]:
+        t_identifier = self.expect_token(state, [TokenKind.IDENTIFIER])
         if t_identifier is None:
-            return (state, None)
-        return (state, IdentifierExpr(t_identifier=t_identifier))
+            return None
+        return IdentifierExpr(t_identifier=t_identifier)
 
-    def parse_int_literal(self, state: State) -> Tuple[State, Optional[IntLiteralExpr]]:
-        (state, t_int_literal) = self.expect_token(state, [TokenKind.INT_LITERAL])
+    def parse_int_literal(self, state: State) -> Optional[IntLiteralExpr]:
+        t_int_literal = self.expect_token(state, [TokenKind.INT_LITERAL])
         if t_int_literal is None:
-            return (state, None)
-        return (state, IntLiteralExpr(t_int_literal=t_int_literal))
+            return None
+        return IntLiteralExpr(t_int_literal=t_int_literal)
 
-    def parse_string_literal(
-        self, state: State
-    ) -> Tuple[State, Optional[StringLiteralExpr]]:
-        (state, t_string_literal) = self.expect_token(state, [TokenKind.STRING_LITERAL])
+    def parse_string_literal(self, state: State) -> Optional[StringLiteralExpr]:
+        t_string_literal = self.expect_token(state, [TokenKind.STRING_LITERAL])
         if t_string_literal is None:
-            return (state, None)
-        return (state, StringLiteralExpr(t_string_literal=t_string_literal))
+            return None
+        return StringLiteralExpr(t_string_literal=t_string_literal)
 
     def expect_token(
         self,
@@ -887,17 +1263,19 @@ class Parser:
         *,
         notes: List[Note] = None,
         error: Error = None,
-    ) -> Tuple[State, Optional[Token]]:
-        token = state.get_current_token()
-        if token.kind in possible_token_kinds:
+    ) -> Optional[Token]:
+        if state.current_token_kind in possible_token_kinds:
+            token = state.get_current_token()
             if state.is_recovering:
-                state = state.finish_recovery()
+                state.finish_recovery()
             if token.kind != TokenKind.EOF:
-                state = state.consume_token(token)
-            return (state, token)
+                state.consume_token(token)
+            return token
 
         if state.is_recovering:
-            return (state, None)
+            return None
+
+        token = state.get_current_token()
 
         assert len(possible_token_kinds) > 0
         if len(possible_token_kinds) == 1:
@@ -928,17 +1306,17 @@ class Parser:
                 notes=[],
                 range=state.current_token_range,
             )
-        state = self.add_error_and_recover(state, error)
+        self.add_error_and_recover(state, error)
 
         token = state.get_current_token()
         if token.kind in possible_token_kinds:
             # We recovered to a token that the caller happens to be able to
             # handle, so return it directly.
             if token.kind != TokenKind.EOF:
-                state = state.consume_token(token)
-            state = state.finish_recovery()
-            return (state, token)
-        return (state, None)
+                state.consume_token(token)
+            state.finish_recovery()
+            return token
+        return None
 
     def describe_token(self, token: Token) -> str:
         if token.kind == TokenKind.ERROR:
@@ -956,37 +1334,58 @@ class Parser:
             return f"a {token_kind.value}"
 
 
-def parse(file_info: FileInfo, tokens: List[Token]) -> Parsation:
+def parse(file_info: FileInfo, tokens: TokenStream) -> Parsation:
     parser = Parser()
     return parser.parse(file_info=file_info, tokens=tokens)
 
 
+def reparse(
+    parsation: Parsation,
+    old_tokens: TokenStream,
+    file_info: FileInfo,
+    tokens: TokenStream,
+    edit: TextEdit,
+    changed_tokens: Optional[ChangedTokens] = None,
+) -> Parsation:
+    parser = Parser()
+    return parser.reparse(
+        parsation=parsation,
+        old_tokens=old_tokens,
+        file_info=file_info,
+        tokens=tokens,
+        edit=edit,
+        changed_tokens=changed_tokens,
+    )
+
+
 def dump_syntax_tree(
     source_code: str, ast_node: Union[Node, Token, None], offset: int = 0
 ) -> Tuple[int, List[str]]:
-    if ast_node is None:
-        return (offset, ["<missing>"])
-    elif isinstance(ast_node, Token):
-        token = ast_node
-        lines = []
-        for trivium in token.leading_trivia:
-            offset += trivium.width
-            lines.append(f"Leading {trivium.text!r}")
-
-        offset += token.width
-        if token.is_dummy:
-            lines.append(f"Token {token.kind.name} {token.text!r}")
+    lines = []
+    # Each entry is a node to render and its depth in the tree. Use an explicit
+    # stack rather than recursing, since the tree may be arbitrarily deep.
+    stack: List[Tuple[Union[Node, Token, None], int]] = [(ast_node, 0)]
+    while stack:
+        (ast_node, depth) = stack.pop()
+        indent = "    " * depth
+        if ast_node is None:
+            lines.append(f"{indent}<missing>")
+        elif isinstance(ast_node, Token):
+            token = ast_node
+            for trivium in token.leading_trivia:
+                offset += trivium.width
+                lines.append(f"{indent}Leading {trivium.text!r}")
+
+            offset += token.width
+            if token.is_dummy:
+                lines.append(f"{indent}Token {token.kind.name} {token.text!r}")
+            else:
+                lines.append(f"{indent}Token {token.text!r}")
+
+            for trivium in token.trailing_trivia:
+                offset += trivium.width
+                lines.append(f"{indent}Trailing {trivium.text!r}")
         else:
-            lines.append(f"Token {token.text!r}")
-
-        for trivium in token.trailing_trivia:
-            offset += trivium.width
-            lines.append(f"Trailing {trivium.text!r}")
-
-        return (offset, lines)
-    else:
-        lines = [f"{ast_node.__class__.__name__}"]
-        for child in ast_node.children:
-            (offset, rendered_child) = dump_syntax_tree(source_code, child, offset)
-            lines.extend(f"    {subline}" for subline in rendered_child)
-        return (offset, lines)
+            lines.append(f"{indent}{ast_node.__class__.__name__}")
+            stack.extend((child, depth + 1) for child in reversed(ast_node.children))
+    return (offset, lines)
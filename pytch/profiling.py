@@ -0,0 +1,220 @@
+"""Per-phase measurements of the compiler.
+
+To profile a compilation, pass a `Profiler` to `compile_file`, which records
+a `PhaseProfile` for each phase that it runs. Alternatively, register a hook
+with `add_profile_hook`, which is called with the `Profile` of every
+subsequent compilation. (This is how a build system can collect the
+measurements without changing how it invokes the compiler.)
+"""
+import contextlib
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import attr
+
+from . import greencst, redcst
+
+
+@attr.s(auto_attribs=True)
+class PhaseProfile:
+    phase: str
+    """The name of the phase, such as `lex` or `typecheck`."""
+
+    wall_time: float = 0.0
+    """The elapsed real time, in seconds."""
+
+    cpu_time: float = 0.0
+    """The elapsed CPU time of this process, in seconds."""
+
+    peak_memory: Optional[int] = None
+    """The peak size, in bytes, of the memory allocated during this phase, as
+    traced by `tracemalloc`, or `None` if memory wasn't traced."""
+
+    counters: Dict[str, int] = attr.ib(factory=dict)
+    """Counts of the things produced by this phase, such as `tokens` or
+    `errors`."""
+
+    def count(self, **counters: int) -> None:
+        self.counters.update(counters)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Profile:
+    file_path: str
+    phases: List[PhaseProfile]
+
+    def to_json(self) -> Dict[str, Any]:
+        """Convert this profile to a JSON-serializable value."""
+        return {
+            "file_path": self.file_path,
+            "phases": [attr.asdict(phase) for phase in self.phases],
+        }
+
+    def get_table_lines(self) -> List[str]:
+        """Render this profile as a table, one line per phase."""
+        rows = [["phase", "wall (ms)", "cpu (ms)", "peak (KiB)", "counters"]]
+        for phase in self.phases:
+            if phase.peak_memory is None:
+                peak_memory = "-"
+            else:
+                peak_memory = f"{phase.peak_memory / 1024:.1f}"
+            counters = " ".join(
+                f"{name}={value}" for (name, value) in phase.counters.items()
+            )
+            rows.append(
+                [
+                    phase.phase,
+                    f"{phase.wall_time * 1000:.2f}",
+                    f"{phase.cpu_time * 1000:.2f}",
+                    peak_memory,
+                    counters,
+                ]
+            )
+        rows.append(
+            [
+                "total",
+                f"{sum(phase.wall_time for phase in self.phases) * 1000:.2f}",
+                f"{sum(phase.cpu_time for phase in self.phases) * 1000:.2f}",
+                "",
+                "",
+            ]
+        )
+
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]) - 1)]
+        lines = [f"Profile for {self.file_path}:"]
+        for row in rows:
+            # Left-align the phase names and right-align the numbers. The
+            # counters are last, so they don't need to be padded.
+            cells = [row[0].ljust(widths[0])]
+            cells.extend(
+                cell.rjust(width) for (cell, width) in zip(row[1:], widths[1:])
+            )
+            cells.append(row[-1])
+            lines.append("  ".join(cells).rstrip())
+        return lines
+
+
+ProfileHook = Callable[[Profile], None]
+
+_profile_hooks: List[ProfileHook] = []
+
+
+def add_profile_hook(hook: ProfileHook) -> None:
+    """Call `hook` with the profile of each file compiled from now on."""
+    _profile_hooks.append(hook)
+
+
+def remove_profile_hook(hook: ProfileHook) -> None:
+    _profile_hooks.remove(hook)
+
+
+def has_profile_hooks() -> bool:
+    return bool(_profile_hooks)
+
+
+class Profiler:
+    """Records a `PhaseProfile` for each phase of compiling a file.
+
+    A disabled profiler doesn't measure anything, so callers can use one
+    unconditionally. Counters which are expensive to compute should only be
+    computed if `is_enabled` is set.
+
+    If `trace_memory` is set, the peak memory allocated by each phase is traced
+    with `tracemalloc` too. Tracing slows down allocation considerably, so the
+    times measured at the same time are inflated; measure memory and time in
+    separate runs to get accurate numbers for both.
+    """
+
+    def __init__(self, file_path: str, trace_memory: bool = False) -> None:
+        self.file_path = file_path
+        self.trace_memory = trace_memory
+        self.phases: List[PhaseProfile] = []
+
+    @property
+    def is_enabled(self) -> bool:
+        return True
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[PhaseProfile]:
+        """Measure the code run inside this context as the phase `name`.
+
+        The yielded `PhaseProfile` can be used to record counters for the
+        phase, including after the context has exited.
+        """
+        phase_profile = PhaseProfile(phase=name)
+        self.phases.append(phase_profile)
+
+        started_tracing = False
+        memory_baseline = 0
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            elif hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+                (memory_baseline, _peak) = tracemalloc.get_traced_memory()
+            else:
+                # `reset_peak` is only available in Python 3.9 and later.
+                tracemalloc.clear_traces()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield phase_profile
+        finally:
+            phase_profile.cpu_time = time.process_time() - cpu_start
+            phase_profile.wall_time = time.perf_counter() - wall_start
+            if self.trace_memory:
+                (_current, peak) = tracemalloc.get_traced_memory()
+                phase_profile.peak_memory = peak - memory_baseline
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def finish(self) -> Profile:
+        """Get the profile of all of the phases so far, and report it to the
+        registered hooks."""
+        profile = Profile(file_path=self.file_path, phases=list(self.phases))
+        for hook in list(_profile_hooks):
+            hook(profile)
+        return profile
+
+
+class DisabledProfiler(Profiler):
+    def __init__(self) -> None:
+        super().__init__(file_path="<disabled>", trace_memory=False)
+
+    @property
+    def is_enabled(self) -> bool:
+        return False
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[PhaseProfile]:
+        yield PhaseProfile(phase=name)
+
+    def finish(self) -> Profile:
+        return Profile(file_path=self.file_path, phases=[])
+
+
+def count_green_nodes(node: greencst.Node) -> int:
+    num_nodes = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        num_nodes += 1
+        stack.extend(
+            child for child in node.children if isinstance(child, greencst.Node)
+        )
+    return num_nodes
+
+
+def count_materialized_red_nodes(node: redcst.Node) -> int:
+    """Count the red nodes which have been constructed so far in the tree
+    rooted at `node`."""
+    num_nodes = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        num_nodes += 1
+        stack.extend(node.iter_materialized_children())
+    return num_nodes
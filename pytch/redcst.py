@@ -2,7 +2,18 @@
 
 Run `make` to re-generate. Do not edit!
 """
-from typing import List, Optional, Sequence, Union
+import bisect
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
 
 import pytch.greencst as greencst
 from .lexer import Token
@@ -10,6 +21,16 @@ from .utils import OffsetRange
 
 
 class Node:
+    # Large files have hundreds of thousands of nodes, so we don't give each of
+    # them a `__dict__`.
+    __slots__ = ("_parent",)
+
+    kind: int
+    """An integer uniquely identifying this node's class. See `Visitor`."""
+
+    offset: int
+    """The offset of the start of this node, including its leading trivia."""
+
     def __init__(self, parent: Optional["Node"]) -> None:
         self._parent = parent
 
@@ -47,12 +68,98 @@ class Node:
             f"class {self.__class__.__name__} should implement `offset_range`"
         )
 
+    def iter_materialized_children(self) -> Iterator["Node"]:
+        """Iterate over the child nodes which have been constructed so far,
+        without constructing any others."""
+        return iter([])
+
+    def find_node_at_offset(self, offset: int) -> Optional["Node"]:
+        """Find the innermost node whose range, including its trivia,
+        contains the given offset, or `None` if it's outside of this node.
+
+        This descends using the widths cached in the green nodes, so it only
+        constructs the nodes on the path to the result, and takes time
+        proportional to the depth of the result rather than the size of the
+        tree.
+        """
+        if not (self.offset <= offset < self.offset + self.full_width):
+            return None
+        node = self
+        while True:
+            child = node._get_child_at_offset(offset)
+            if not isinstance(child, Node):
+                return node
+            node = child
+
+    def find_token_at_offset(self, offset: int) -> Optional[Token]:
+        """Find the token whose range, including its trivia, contains the
+        given offset. See `find_node_at_offset`."""
+        node = self.find_node_at_offset(offset)
+        if node is None:
+            return None
+        child = node._get_child_at_offset(offset)
+        if isinstance(child, Token):
+            return child
+        return None
+
+    def find_nodes_in_range(self, offset_range: OffsetRange) -> List["Node"]:
+        """Find the outermost nodes whose text lies within the given range,
+        in order.
+
+        Only the nodes which straddle the start or end of the range are
+        descended into, so this doesn't visit the rest of the tree.
+        """
+        result = []
+        stack: List[Node] = [self]
+        while stack:
+            node = stack.pop()
+            node_range = node.offset_range
+            if (
+                offset_range.start <= node_range.start
+                and node_range.end <= offset_range.end
+            ):
+                result.append(node)
+            elif (
+                node.offset < offset_range.end
+                and offset_range.start < node.offset + node.full_width
+            ):
+                stack.extend(
+                    child
+                    for child in reversed(node.children)
+                    if isinstance(child, Node)
+                )
+        return result
+
+    def _get_child_at_offset(self, offset: int) -> Optional[Union["Node", Token]]:
+        """Get the child whose range, including its trivia, contains the
+        given offset, which must be inside of this node."""
+        return None
+
+    @staticmethod
+    def _get_element_index_at_offset(
+        elements: Optional[Sequence[greencst.Node]],
+        element_offsets: Sequence[int],
+        offset: int,
+    ) -> Optional[int]:
+        """Get the index of the element whose range, including its trivia,
+        contains the given offset, relative to the start of the parent node."""
+        if elements is None:
+            return None
+        index = bisect.bisect_right(element_offsets, offset) - 1
+        if index < 0 or offset >= element_offsets[index] + elements[index].full_width:
+            return None
+        return index
+
 
 class Expr(Node):
-    pass
+    kind = 0
+    __slots__ = ()
 
 
 class SyntaxTree(Node):
+    kind = 1
+    __slots__ = ("origin", "offset", "_n_expr")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.SyntaxTree, offset: int
     ) -> None:
@@ -67,7 +174,7 @@ class SyntaxTree(Node):
             return None
         if self._n_expr is not None:
             return self._n_expr
-        offset = self.offset
+        offset = self.offset + self.origin.child_offsets[0]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_expr.__class__](
             parent=self, origin=self.origin.n_expr, offset=offset
         )
@@ -99,12 +206,28 @@ class SyntaxTree(Node):
     def children(self) -> List[Optional[Union[Token, Node]]]:
         return [self.n_expr, self.t_eof]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.n_expr
+        if index == 1:
+            return self.t_eof
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._n_expr is not None:
+            yield self._n_expr
+
 
 class Pattern(Node):
-    pass
+    kind = 2
+    __slots__ = ()
 
 
 class VariablePattern(Pattern):
+    kind = 3
+    __slots__ = ("origin", "offset")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.VariablePattern, offset: int
     ) -> None:
@@ -137,8 +260,17 @@ class VariablePattern(Pattern):
     def children(self) -> List[Optional[Union[Token, Node]]]:
         return [self.t_identifier]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.t_identifier
+        return None
+
 
 class Parameter(Node):
+    kind = 4
+    __slots__ = ("origin", "offset", "_n_pattern")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.Parameter, offset: int
     ) -> None:
@@ -153,7 +285,7 @@ class Parameter(Node):
             return None
         if self._n_pattern is not None:
             return self._n_pattern
-        offset = self.offset
+        offset = self.offset + self.origin.child_offsets[0]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_pattern.__class__](
             parent=self, origin=self.origin.n_pattern, offset=offset
         )
@@ -185,15 +317,30 @@ class Parameter(Node):
     def children(self) -> List[Optional[Union[Token, Node]]]:
         return [self.n_pattern, self.t_comma]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.n_pattern
+        if index == 1:
+            return self.t_comma
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._n_pattern is not None:
+            yield self._n_pattern
+
 
 class ParameterList(Node):
+    kind = 5
+    __slots__ = ("origin", "offset", "_parameters")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.ParameterList, offset: int
     ) -> None:
         super().__init__(parent)
         self.origin = origin
         self.offset = offset
-        self._parameters: Optional[List[Parameter]] = None
+        self._parameters: Optional[List[Optional[Parameter]]] = None
 
     @property
     def t_lparen(self) -> Optional[Token]:
@@ -203,17 +350,26 @@ class ParameterList(Node):
     def parameters(self) -> Optional[List[Parameter]]:
         if self.origin.parameters is None:
             return None
-        if self._parameters is not None:
-            return self._parameters
-        offset = self.offset + (
-            self.t_lparen.full_width if self.t_lparen is not None else 0
-        )
-        result = []
-        for child in self.origin.parameters:
-            result.append(Parameter(parent=self, origin=child, offset=offset))
-            offset += child.full_width
-        self._parameters = result
-        return result
+        return [
+            self._get_parameters_element(index)
+            for index in range(len(self.origin.parameters))
+        ]
+
+    def _get_parameters_element(self, index: int) -> Parameter:
+        assert self.origin.parameters is not None
+        if self._parameters is None:
+            self._parameters = [None] * len(self.origin.parameters)
+        element = self._parameters[index]
+        if element is None:
+            # Look up the offset in the green node, rather than constructing red
+            # nodes for each of the previous elements to get their widths.
+            element = Parameter(
+                parent=self,
+                origin=self.origin.parameters[index],
+                offset=self.offset + self.origin.parameters_offsets[index],
+            )
+            self._parameters[index] = element
+        return element
 
     @property
     def t_rparen(self) -> Optional[Token]:
@@ -244,8 +400,34 @@ class ParameterList(Node):
             self.t_rparen,
         ]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.t_lparen
+        if index == 1:
+            element_index = self._get_element_index_at_offset(
+                self.origin.parameters,
+                self.origin.parameters_offsets,
+                offset - self.offset,
+            )
+            if element_index is None:
+                return None
+            return self._get_parameters_element(element_index)
+        if index == 2:
+            return self.t_rparen
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._parameters is not None:
+            for element in self._parameters:
+                if element is not None:
+                    yield element
+
 
 class LetExpr(Expr):
+    kind = 6
+    __slots__ = ("origin", "offset", "_n_pattern", "_n_value", "_n_body")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.LetExpr, offset: int
     ) -> None:
@@ -266,7 +448,7 @@ class LetExpr(Expr):
             return None
         if self._n_pattern is not None:
             return self._n_pattern
-        offset = self.offset + (self.t_let.full_width if self.t_let is not None else 0)
+        offset = self.offset + self.origin.child_offsets[1]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_pattern.__class__](
             parent=self, origin=self.origin.n_pattern, offset=offset
         )
@@ -283,12 +465,7 @@ class LetExpr(Expr):
             return None
         if self._n_value is not None:
             return self._n_value
-        offset = (
-            self.offset
-            + (self.t_let.full_width if self.t_let is not None else 0)
-            + (self.n_pattern.full_width if self.n_pattern is not None else 0)
-            + (self.t_equals.full_width if self.t_equals is not None else 0)
-        )
+        offset = self.offset + self.origin.child_offsets[3]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_value.__class__](
             parent=self, origin=self.origin.n_value, offset=offset
         )
@@ -305,14 +482,7 @@ class LetExpr(Expr):
             return None
         if self._n_body is not None:
             return self._n_body
-        offset = (
-            self.offset
-            + (self.t_let.full_width if self.t_let is not None else 0)
-            + (self.n_pattern.full_width if self.n_pattern is not None else 0)
-            + (self.t_equals.full_width if self.t_equals is not None else 0)
-            + (self.n_value.full_width if self.n_value is not None else 0)
-            + (self.t_in.full_width if self.t_in is not None else 0)
-        )
+        offset = self.offset + self.origin.child_offsets[5]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_body.__class__](
             parent=self, origin=self.origin.n_body, offset=offset
         )
@@ -347,8 +517,42 @@ class LetExpr(Expr):
             self.n_body,
         ]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.t_let
+        if index == 1:
+            return self.n_pattern
+        if index == 2:
+            return self.t_equals
+        if index == 3:
+            return self.n_value
+        if index == 4:
+            return self.t_in
+        if index == 5:
+            return self.n_body
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._n_pattern is not None:
+            yield self._n_pattern
+        if self._n_value is not None:
+            yield self._n_value
+        if self._n_body is not None:
+            yield self._n_body
+
 
 class DefExpr(Expr):
+    kind = 7
+    __slots__ = (
+        "origin",
+        "offset",
+        "_n_name",
+        "_n_parameter_list",
+        "_n_definition",
+        "_n_next",
+    )
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.DefExpr, offset: int
     ) -> None:
@@ -370,7 +574,7 @@ class DefExpr(Expr):
             return None
         if self._n_name is not None:
             return self._n_name
-        offset = self.offset + (self.t_def.full_width if self.t_def is not None else 0)
+        offset = self.offset + self.origin.child_offsets[1]
         result = VariablePattern(parent=self, origin=self.origin.n_name, offset=offset)
         self._n_name = result
         return result
@@ -381,11 +585,7 @@ class DefExpr(Expr):
             return None
         if self._n_parameter_list is not None:
             return self._n_parameter_list
-        offset = (
-            self.offset
-            + (self.t_def.full_width if self.t_def is not None else 0)
-            + (self.n_name.full_width if self.n_name is not None else 0)
-        )
+        offset = self.offset + self.origin.child_offsets[2]
         result = ParameterList(
             parent=self, origin=self.origin.n_parameter_list, offset=offset
         )
@@ -402,17 +602,7 @@ class DefExpr(Expr):
             return None
         if self._n_definition is not None:
             return self._n_definition
-        offset = (
-            self.offset
-            + (self.t_def.full_width if self.t_def is not None else 0)
-            + (self.n_name.full_width if self.n_name is not None else 0)
-            + (
-                self.n_parameter_list.full_width
-                if self.n_parameter_list is not None
-                else 0
-            )
-            + (self.t_double_arrow.full_width if self.t_double_arrow is not None else 0)
-        )
+        offset = self.offset + self.origin.child_offsets[4]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_definition.__class__](
             parent=self, origin=self.origin.n_definition, offset=offset
         )
@@ -429,19 +619,7 @@ class DefExpr(Expr):
             return None
         if self._n_next is not None:
             return self._n_next
-        offset = (
-            self.offset
-            + (self.t_def.full_width if self.t_def is not None else 0)
-            + (self.n_name.full_width if self.n_name is not None else 0)
-            + (
-                self.n_parameter_list.full_width
-                if self.n_parameter_list is not None
-                else 0
-            )
-            + (self.t_double_arrow.full_width if self.t_double_arrow is not None else 0)
-            + (self.n_definition.full_width if self.n_definition is not None else 0)
-            + (self.t_in.full_width if self.t_in is not None else 0)
-        )
+        offset = self.offset + self.origin.child_offsets[6]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_next.__class__](
             parent=self, origin=self.origin.n_next, offset=offset
         )
@@ -477,8 +655,39 @@ class DefExpr(Expr):
             self.n_next,
         ]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.t_def
+        if index == 1:
+            return self.n_name
+        if index == 2:
+            return self.n_parameter_list
+        if index == 3:
+            return self.t_double_arrow
+        if index == 4:
+            return self.n_definition
+        if index == 5:
+            return self.t_in
+        if index == 6:
+            return self.n_next
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._n_name is not None:
+            yield self._n_name
+        if self._n_parameter_list is not None:
+            yield self._n_parameter_list
+        if self._n_definition is not None:
+            yield self._n_definition
+        if self._n_next is not None:
+            yield self._n_next
+
 
 class IfExpr(Expr):
+    kind = 8
+    __slots__ = ("origin", "offset", "_n_if_expr", "_n_then_expr", "_n_else_expr")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.IfExpr, offset: int
     ) -> None:
@@ -499,7 +708,7 @@ class IfExpr(Expr):
             return None
         if self._n_if_expr is not None:
             return self._n_if_expr
-        offset = self.offset + (self.t_if.full_width if self.t_if is not None else 0)
+        offset = self.offset + self.origin.child_offsets[1]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_if_expr.__class__](
             parent=self, origin=self.origin.n_if_expr, offset=offset
         )
@@ -516,12 +725,7 @@ class IfExpr(Expr):
             return None
         if self._n_then_expr is not None:
             return self._n_then_expr
-        offset = (
-            self.offset
-            + (self.t_if.full_width if self.t_if is not None else 0)
-            + (self.n_if_expr.full_width if self.n_if_expr is not None else 0)
-            + (self.t_then.full_width if self.t_then is not None else 0)
-        )
+        offset = self.offset + self.origin.child_offsets[3]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_then_expr.__class__](
             parent=self, origin=self.origin.n_then_expr, offset=offset
         )
@@ -538,14 +742,7 @@ class IfExpr(Expr):
             return None
         if self._n_else_expr is not None:
             return self._n_else_expr
-        offset = (
-            self.offset
-            + (self.t_if.full_width if self.t_if is not None else 0)
-            + (self.n_if_expr.full_width if self.n_if_expr is not None else 0)
-            + (self.t_then.full_width if self.t_then is not None else 0)
-            + (self.n_then_expr.full_width if self.n_then_expr is not None else 0)
-            + (self.t_else.full_width if self.t_else is not None else 0)
-        )
+        offset = self.offset + self.origin.child_offsets[5]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_else_expr.__class__](
             parent=self, origin=self.origin.n_else_expr, offset=offset
         )
@@ -585,8 +782,37 @@ class IfExpr(Expr):
             self.t_endif,
         ]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.t_if
+        if index == 1:
+            return self.n_if_expr
+        if index == 2:
+            return self.t_then
+        if index == 3:
+            return self.n_then_expr
+        if index == 4:
+            return self.t_else
+        if index == 5:
+            return self.n_else_expr
+        if index == 6:
+            return self.t_endif
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._n_if_expr is not None:
+            yield self._n_if_expr
+        if self._n_then_expr is not None:
+            yield self._n_then_expr
+        if self._n_else_expr is not None:
+            yield self._n_else_expr
+
 
 class IdentifierExpr(Expr):
+    kind = 9
+    __slots__ = ("origin", "offset")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.IdentifierExpr, offset: int
     ) -> None:
@@ -619,8 +845,17 @@ class IdentifierExpr(Expr):
     def children(self) -> List[Optional[Union[Token, Node]]]:
         return [self.t_identifier]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.t_identifier
+        return None
+
 
 class IntLiteralExpr(Expr):
+    kind = 10
+    __slots__ = ("origin", "offset")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.IntLiteralExpr, offset: int
     ) -> None:
@@ -653,8 +888,17 @@ class IntLiteralExpr(Expr):
     def children(self) -> List[Optional[Union[Token, Node]]]:
         return [self.t_int_literal]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.t_int_literal
+        return None
+
 
 class StringLiteralExpr(Expr):
+    kind = 11
+    __slots__ = ("origin", "offset")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.StringLiteralExpr, offset: int
     ) -> None:
@@ -687,8 +931,17 @@ class StringLiteralExpr(Expr):
     def children(self) -> List[Optional[Union[Token, Node]]]:
         return [self.t_string_literal]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.t_string_literal
+        return None
+
 
 class BinaryExpr(Expr):
+    kind = 12
+    __slots__ = ("origin", "offset", "_n_lhs", "_n_rhs")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.BinaryExpr, offset: int
     ) -> None:
@@ -704,7 +957,7 @@ class BinaryExpr(Expr):
             return None
         if self._n_lhs is not None:
             return self._n_lhs
-        offset = self.offset
+        offset = self.offset + self.origin.child_offsets[0]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_lhs.__class__](
             parent=self, origin=self.origin.n_lhs, offset=offset
         )
@@ -721,11 +974,7 @@ class BinaryExpr(Expr):
             return None
         if self._n_rhs is not None:
             return self._n_rhs
-        offset = (
-            self.offset
-            + (self.n_lhs.full_width if self.n_lhs is not None else 0)
-            + (self.t_operator.full_width if self.t_operator is not None else 0)
-        )
+        offset = self.offset + self.origin.child_offsets[2]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_rhs.__class__](
             parent=self, origin=self.origin.n_rhs, offset=offset
         )
@@ -753,8 +1002,27 @@ class BinaryExpr(Expr):
     def children(self) -> List[Optional[Union[Token, Node]]]:
         return [self.n_lhs, self.t_operator, self.n_rhs]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.n_lhs
+        if index == 1:
+            return self.t_operator
+        if index == 2:
+            return self.n_rhs
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._n_lhs is not None:
+            yield self._n_lhs
+        if self._n_rhs is not None:
+            yield self._n_rhs
+
 
 class Argument(Node):
+    kind = 13
+    __slots__ = ("origin", "offset", "_n_expr")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.Argument, offset: int
     ) -> None:
@@ -769,7 +1037,7 @@ class Argument(Node):
             return None
         if self._n_expr is not None:
             return self._n_expr
-        offset = self.offset
+        offset = self.offset + self.origin.child_offsets[0]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_expr.__class__](
             parent=self, origin=self.origin.n_expr, offset=offset
         )
@@ -801,15 +1069,30 @@ class Argument(Node):
     def children(self) -> List[Optional[Union[Token, Node]]]:
         return [self.n_expr, self.t_comma]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.n_expr
+        if index == 1:
+            return self.t_comma
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._n_expr is not None:
+            yield self._n_expr
+
 
 class ArgumentList(Node):
+    kind = 14
+    __slots__ = ("origin", "offset", "_arguments")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.ArgumentList, offset: int
     ) -> None:
         super().__init__(parent)
         self.origin = origin
         self.offset = offset
-        self._arguments: Optional[List[Argument]] = None
+        self._arguments: Optional[List[Optional[Argument]]] = None
 
     @property
     def t_lparen(self) -> Optional[Token]:
@@ -819,17 +1102,26 @@ class ArgumentList(Node):
     def arguments(self) -> Optional[List[Argument]]:
         if self.origin.arguments is None:
             return None
-        if self._arguments is not None:
-            return self._arguments
-        offset = self.offset + (
-            self.t_lparen.full_width if self.t_lparen is not None else 0
-        )
-        result = []
-        for child in self.origin.arguments:
-            result.append(Argument(parent=self, origin=child, offset=offset))
-            offset += child.full_width
-        self._arguments = result
-        return result
+        return [
+            self._get_arguments_element(index)
+            for index in range(len(self.origin.arguments))
+        ]
+
+    def _get_arguments_element(self, index: int) -> Argument:
+        assert self.origin.arguments is not None
+        if self._arguments is None:
+            self._arguments = [None] * len(self.origin.arguments)
+        element = self._arguments[index]
+        if element is None:
+            # Look up the offset in the green node, rather than constructing red
+            # nodes for each of the previous elements to get their widths.
+            element = Argument(
+                parent=self,
+                origin=self.origin.arguments[index],
+                offset=self.offset + self.origin.arguments_offsets[index],
+            )
+            self._arguments[index] = element
+        return element
 
     @property
     def t_rparen(self) -> Optional[Token]:
@@ -860,8 +1152,34 @@ class ArgumentList(Node):
             self.t_rparen,
         ]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.t_lparen
+        if index == 1:
+            element_index = self._get_element_index_at_offset(
+                self.origin.arguments,
+                self.origin.arguments_offsets,
+                offset - self.offset,
+            )
+            if element_index is None:
+                return None
+            return self._get_arguments_element(element_index)
+        if index == 2:
+            return self.t_rparen
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._arguments is not None:
+            for element in self._arguments:
+                if element is not None:
+                    yield element
+
 
 class FunctionCallExpr(Expr):
+    kind = 15
+    __slots__ = ("origin", "offset", "_n_callee", "_n_argument_list")
+
     def __init__(
         self, parent: Optional[Node], origin: greencst.FunctionCallExpr, offset: int
     ) -> None:
@@ -877,7 +1195,7 @@ class FunctionCallExpr(Expr):
             return None
         if self._n_callee is not None:
             return self._n_callee
-        offset = self.offset
+        offset = self.offset + self.origin.child_offsets[0]
         result = GREEN_TO_RED_NODE_MAP[self.origin.n_callee.__class__](
             parent=self, origin=self.origin.n_callee, offset=offset
         )
@@ -890,9 +1208,7 @@ class FunctionCallExpr(Expr):
             return None
         if self._n_argument_list is not None:
             return self._n_argument_list
-        offset = self.offset + (
-            self.n_callee.full_width if self.n_callee is not None else 0
-        )
+        offset = self.offset + self.origin.child_offsets[1]
         result = ArgumentList(
             parent=self, origin=self.origin.n_argument_list, offset=offset
         )
@@ -920,6 +1236,20 @@ class FunctionCallExpr(Expr):
     def children(self) -> List[Optional[Union[Token, Node]]]:
         return [self.n_callee, self.n_argument_list]
 
+    def _get_child_at_offset(self, offset: int) -> Optional[Union[Node, Token]]:
+        index = bisect.bisect_right(self.origin.child_offsets, offset - self.offset) - 1
+        if index == 0:
+            return self.n_callee
+        if index == 1:
+            return self.n_argument_list
+        return None
+
+    def iter_materialized_children(self) -> Iterator[Node]:
+        if self._n_callee is not None:
+            yield self._n_callee
+        if self._n_argument_list is not None:
+            yield self._n_argument_list
+
 
 GREEN_TO_RED_NODE_MAP = {
     greencst.Expr: Expr,
@@ -939,3 +1269,105 @@ GREEN_TO_RED_NODE_MAP = {
     greencst.ArgumentList: ArgumentList,
     greencst.FunctionCallExpr: FunctionCallExpr,
 }
+
+
+T_visit = TypeVar("T_visit")
+
+
+class Visitor(Generic[T_visit]):
+    """Base class for operations which dispatch on the class of a node.
+
+    Calling `visit` on a node calls the `visit_*` method for the node's class,
+    such as `visit_let_expr` for a `LetExpr`, with any additional arguments
+    passed along. By default, each `visit_*` method calls the method for the
+    node's superclass, up to `visit_node`, which raises `NotImplementedError`.
+
+    Each subclass has a table of its `visit_*` methods indexed by node kind, so
+    dispatching doesn't need to check the node against each class in turn.
+    """
+
+    _dispatch_table: List[Callable[..., T_visit]]
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)  # type: ignore
+        cls._dispatch_table = [
+            getattr(cls, method_name) for method_name in VISIT_METHOD_NAMES
+        ]
+
+    def visit(self, node: Node, *args: Any) -> T_visit:
+        return self._dispatch_table[node.kind](self, node, *args)
+
+    def visit_node(self, node: Node, *args: Any) -> T_visit:
+        raise NotImplementedError(
+            f"class {self.__class__.__name__} should implement visiting "
+            + f"{node.__class__.__name__}"
+        )
+
+    def visit_expr(self, node: Expr, *args: Any) -> T_visit:
+        return self.visit_node(node, *args)
+
+    def visit_syntax_tree(self, node: SyntaxTree, *args: Any) -> T_visit:
+        return self.visit_node(node, *args)
+
+    def visit_pattern(self, node: Pattern, *args: Any) -> T_visit:
+        return self.visit_node(node, *args)
+
+    def visit_variable_pattern(self, node: VariablePattern, *args: Any) -> T_visit:
+        return self.visit_pattern(node, *args)
+
+    def visit_parameter(self, node: Parameter, *args: Any) -> T_visit:
+        return self.visit_node(node, *args)
+
+    def visit_parameter_list(self, node: ParameterList, *args: Any) -> T_visit:
+        return self.visit_node(node, *args)
+
+    def visit_let_expr(self, node: LetExpr, *args: Any) -> T_visit:
+        return self.visit_expr(node, *args)
+
+    def visit_def_expr(self, node: DefExpr, *args: Any) -> T_visit:
+        return self.visit_expr(node, *args)
+
+    def visit_if_expr(self, node: IfExpr, *args: Any) -> T_visit:
+        return self.visit_expr(node, *args)
+
+    def visit_identifier_expr(self, node: IdentifierExpr, *args: Any) -> T_visit:
+        return self.visit_expr(node, *args)
+
+    def visit_int_literal_expr(self, node: IntLiteralExpr, *args: Any) -> T_visit:
+        return self.visit_expr(node, *args)
+
+    def visit_string_literal_expr(self, node: StringLiteralExpr, *args: Any) -> T_visit:
+        return self.visit_expr(node, *args)
+
+    def visit_binary_expr(self, node: BinaryExpr, *args: Any) -> T_visit:
+        return self.visit_expr(node, *args)
+
+    def visit_argument(self, node: Argument, *args: Any) -> T_visit:
+        return self.visit_node(node, *args)
+
+    def visit_argument_list(self, node: ArgumentList, *args: Any) -> T_visit:
+        return self.visit_node(node, *args)
+
+    def visit_function_call_expr(self, node: FunctionCallExpr, *args: Any) -> T_visit:
+        return self.visit_expr(node, *args)
+
+
+VISIT_METHOD_NAMES = [
+    "visit_expr",
+    "visit_syntax_tree",
+    "visit_pattern",
+    "visit_variable_pattern",
+    "visit_parameter",
+    "visit_parameter_list",
+    "visit_let_expr",
+    "visit_def_expr",
+    "visit_if_expr",
+    "visit_identifier_expr",
+    "visit_int_literal_expr",
+    "visit_string_literal_expr",
+    "visit_binary_expr",
+    "visit_argument",
+    "visit_argument_list",
+    "visit_function_call_expr",
+]
+"""The name of the `Visitor` method for each node kind."""
@@ -2,20 +2,43 @@ from code import InteractiveConsole
 import re
 import readline
 import sys
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from types import CodeType
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    TypeVar,
+)
 
-from . import __version__
+from . import __version__, cache
 from .binder import bind, GLOBAL_SCOPE as BINDER_GLOBAL_SCOPE
-from .codegen import codegen
+from .codegen import codegen, Codegenation
 from .errors import Error, get_error_lines, Severity
-from .lexer import lex
+from .lexer import Lexer, preparse_lexation
 from .parser import parse
+from .profiling import (
+    count_green_nodes,
+    count_materialized_red_nodes,
+    DisabledProfiler,
+    has_profile_hooks,
+    PhaseProfile,
+    Profiler,
+)
 from .redcst import SyntaxTree as RedSyntaxTree
 from .typesystem import typecheck
+from .typesystem.typecheck import Explanation
 from .typesystem.builtins import GLOBAL_SCOPE as TYPESYSTEM_GLOBAL_SCOPE
 from .utils import FileInfo
 
 
+T = TypeVar("T")
+
 NO_MORE_INPUT_REQUIRED = False
 MORE_INPUT_REQUIRED = True
 LEADING_WHITESPACE_RE = re.compile(r"^\s*")
@@ -51,50 +74,233 @@ def interact() -> None:
     PytchRepl().interact(banner=f"Pytch version {__version__} REPL", exitmsg="")
 
 
-def run_file(file_info: FileInfo) -> None:
-    (compiled_output, errors) = compile_file(file_info=file_info)
+def run_file(
+    file_info: FileInfo, profiler: Optional[Profiler] = None, use_cache: bool = False
+) -> None:
+    """Compile and run the given file.
+
+    If `use_cache` is set, the compiled code is loaded from and stored in the
+    cache next to the file (see `pytch.cache`). The cache isn't used when
+    profiling, since then there would be nothing to measure.
+    """
+    (code, errors) = load_or_compile_file(
+        file_info=file_info, profiler=profiler, use_cache=use_cache
+    )
     print_errors(errors)
-    if compiled_output is not None:
-        exec(compiled_output)
+    if code is not None:
+        exec(code)
+
+
+def load_or_compile_file(
+    file_info: FileInfo, profiler: Optional[Profiler] = None, use_cache: bool = False
+) -> Tuple[Optional[CodeType], List[Error]]:
+    """Compile the given file into a Python code object, or load it from the
+    cache if `use_cache` is set. See `run_file`."""
+    use_cache = use_cache and profiler is None
+    if use_cache:
+        code = cache.load_code(file_info)
+        if code is not None:
+            return (code, [])
+
+    (code, errors) = compile_file_to_code(file_info=file_info, profiler=profiler)
+    # Only files without any errors are cached, so that warnings are still
+    # reported on subsequent runs.
+    if use_cache and code is not None and not errors:
+        cache.store_code(file_info, code)
+    return (code, errors)
+
+
+def compile_file(
+    file_info: FileInfo,
+    profiler: Optional[Profiler] = None,
+    explain_reasons: bool = False,
+) -> Tuple[Optional[str], List[Error]]:
+    """Compile the given file into Python source code.
+
+    Each phase is measured with `profiler`, if provided. (Call its `finish`
+    method afterwards to get the results.) Otherwise, if there are any
+    profile hooks registered, each phase is measured and the profile is
+    reported to the hooks.
+
+    If `explain_reasons` is set, the reason that each expression typechecked
+    is printed, for debugging the typechecker.
+    """
+    return _profile_compile_file(
+        file_info=file_info,
+        profiler=profiler,
+        get_output=Codegenation.get_compiled_output,
+        explain_reasons=explain_reasons,
+    )
+
+
+def compile_file_to_stream(
+    file_info: FileInfo,
+    open_stream: Callable[[], ContextManager[TextIO]],
+    profiler: Optional[Profiler] = None,
+    explain_reasons: bool = False,
+) -> List[Error]:
+    """Compile the given file into Python source code, writing it to a stream
+    as it's generated rather than holding all of it in memory.
+
+    `open_stream` is only called if the file compiled successfully, so that
+    nothing is written for a file with errors. Profiling and
+    `explain_reasons` are the same as for `compile_file`.
+    """
+
+    def emit_compiled_output(codegenation: Codegenation) -> None:
+        with open_stream() as stream:
+            codegenation.emit_compiled_output(stream)
+
+    (_output, errors) = _profile_compile_file(
+        file_info=file_info,
+        profiler=profiler,
+        get_output=emit_compiled_output,
+        explain_reasons=explain_reasons,
+    )
+    return errors
+
+
+def compile_file_to_code(
+    file_info: FileInfo, profiler: Optional[Profiler] = None
+) -> Tuple[Optional[CodeType], List[Error]]:
+    """Compile the given file into a Python code object.
 
+    Unlike `compile_file`, this doesn't generate Python source code, so Python
+    doesn't have to parse it again before running it. Profiling is the same as
+    for `compile_file`.
 
-def compile_file(file_info: FileInfo) -> Tuple[Optional[str], List[Error]]:
-    all_errors = []
-    lexation = lex(file_info=file_info)
+    The code's filename is the path of the Pytch file, so that it shows up in
+    tracebacks.
+    """
+    return _profile_compile_file(
+        file_info=file_info,
+        profiler=profiler,
+        get_output=lambda codegenation: codegenation.get_compiled_code(
+            filename=file_info.file_path
+        ),
+    )
+
+
+def _profile_compile_file(
+    file_info: FileInfo,
+    profiler: Optional[Profiler],
+    get_output: Callable[[Codegenation], T],
+    explain_reasons: bool = False,
+) -> Tuple[Optional[T], List[Error]]:
+    if profiler is not None:
+        return _compile_file(
+            file_info=file_info,
+            profiler=profiler,
+            get_output=get_output,
+            explain_reasons=explain_reasons,
+        )
+    elif has_profile_hooks():
+        profiler = Profiler(file_path=file_info.file_path)
+        try:
+            return _compile_file(
+                file_info=file_info,
+                profiler=profiler,
+                get_output=get_output,
+                explain_reasons=explain_reasons,
+            )
+        finally:
+            profiler.finish()
+    else:
+        return _compile_file(
+            file_info=file_info,
+            profiler=DisabledProfiler(),
+            get_output=get_output,
+            explain_reasons=explain_reasons,
+        )
+
+
+def _compile_file(
+    file_info: FileInfo,
+    profiler: Profiler,
+    get_output: Callable[[Codegenation], T],
+    explain_reasons: bool = False,
+) -> Tuple[Optional[T], List[Error]]:
+    all_errors: List[Error] = []
+    with profiler.phase("lex") as phase:
+        lexer = Lexer()
+        lexation = lexer.lex(file_info=file_info)
+    num_lexer_errors = len(lexation.errors)
+    phase.count(tokens=len(lexation.tokens), errors=num_lexer_errors)
+
+    with profiler.phase("preparse") as phase:
+        lexation = preparse_lexation(file_info=file_info, lexation=lexation)
+    phase.count(
+        tokens=len(lexation.tokens), errors=len(lexation.errors) - num_lexer_errors
+    )
     all_errors.extend(lexation.errors)
-    parsation = parse(file_info=file_info, tokens=lexation.tokens)
+
+    with profiler.phase("parse") as phase:
+        parsation = parse(file_info=file_info, tokens=lexation.tokens)
+    phase.count(errors=len(parsation.errors))
+    if profiler.is_enabled:
+        phase.count(green_nodes=count_green_nodes(parsation.green_cst))
     all_errors.extend(parsation.errors)
 
     if has_fatal_error(all_errors):
         return (None, all_errors)
 
     syntax_tree = RedSyntaxTree(parent=None, origin=parsation.green_cst, offset=0)
+    # Each of the following phases materializes the red nodes that it visits.
+    num_red_nodes = 1
 
-    bindation = bind(
-        file_info=file_info, syntax_tree=syntax_tree, global_scope=BINDER_GLOBAL_SCOPE
-    )
+    def count_red_nodes(phase: PhaseProfile) -> None:
+        nonlocal num_red_nodes
+        if profiler.is_enabled:
+            previous_num_red_nodes = num_red_nodes
+            num_red_nodes = count_materialized_red_nodes(syntax_tree)
+            phase.count(red_nodes=num_red_nodes - previous_num_red_nodes)
+
+    with profiler.phase("bind") as phase:
+        bindation = bind(
+            file_info=file_info,
+            syntax_tree=syntax_tree,
+            global_scope=BINDER_GLOBAL_SCOPE,
+        )
+    phase.count(bindings=len(bindation.bindings), errors=len(bindation.errors))
+    count_red_nodes(phase)
     all_errors.extend(bindation.errors)
     if has_fatal_error(all_errors):
         return (None, all_errors)
 
-    typeation = typecheck(
-        file_info=file_info,
-        syntax_tree=syntax_tree,
-        bindation=bindation,
-        global_scope=TYPESYSTEM_GLOBAL_SCOPE,
+    with profiler.phase("typecheck") as phase:
+        typeation = typecheck(
+            file_info=file_info,
+            syntax_tree=syntax_tree,
+            bindation=bindation,
+            global_scope=TYPESYSTEM_GLOBAL_SCOPE,
+            explain_reasons=explain_reasons,
+        )
+    phase.count(
+        judgments=typeation.ctx.num_judgments,
+        inferred_tys=len(typeation.ctx.inferred_tys),
+        errors=len(typeation.errors),
     )
+    count_red_nodes(phase)
+    if explain_reasons:
+        print_explanations(file_info, typeation.explanations)
     all_errors.extend(typeation.errors)
     if has_fatal_error(all_errors):
         return (None, all_errors)
 
-    codegenation = codegen(
-        syntax_tree=syntax_tree, bindation=bindation, typeation=typeation
+    with profiler.phase("codegen") as phase:
+        codegenation = codegen(
+            syntax_tree=syntax_tree, bindation=bindation, typeation=typeation
+        )
+        compiled_output = get_output(codegenation)
+    phase.count(
+        statements=len(codegenation.statements), errors=len(codegenation.errors)
     )
+    count_red_nodes(phase)
     all_errors.extend(codegenation.errors)
     if has_fatal_error(all_errors):
         return (None, all_errors)
 
-    return (codegenation.get_compiled_output(), all_errors)
+    return (compiled_output, all_errors)
 
 
 def has_fatal_error(errors: Sequence[Error]) -> bool:
@@ -105,3 +311,14 @@ def print_errors(errors: List[Error]) -> None:
     ascii = not sys.stderr.isatty()
     for error in errors:
         sys.stderr.write("\n".join(get_error_lines(error, ascii=ascii)) + "\n")
+
+
+def print_explanations(file_info: FileInfo, explanations: List[Explanation]) -> None:
+    for explanation in explanations:
+        position = file_info.get_position_for_offset(
+            explanation.expr.offset_range.start
+        )
+        sys.stderr.write(
+            f"{file_info.file_path}:{position.line + 1}:{position.character + 1}: "
+            + f"{explanation.reason}\n"
+        )
@@ -70,3 +70,22 @@ class SubtypeOfUnboundedGenericReason(Reason):
 class NoneIsSubtypeOfVoidReason(Reason):
     def __str__(self) -> str:
         return "None is the only value that can be used where no value is expected"
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class UnexplainedReason(Reason):
+    """Stands in for the reason that a check succeeded, when reasons aren't
+    being recorded. See `Env.explain_reasons`."""
+
+    def __str__(self) -> str:
+        return "the check succeeded, but the reason why wasn't recorded"
+
+
+UNEXPLAINED_REASON = UnexplainedReason()
+
+# Reasons without any fields don't need to be constructed for each check, so
+# they're always recorded, even when reasons with fields aren't.
+INVALID_SYNTAX_REASON = InvalidSyntaxReason()
+SUBTYPE_OF_OBJECT_REASON = SubtypeOfObjectReason()
+SUBTYPE_OF_UNBOUNDED_GENERIC_REASON = SubtypeOfUnboundedGenericReason()
+NONE_IS_SUBTYPE_OF_VOID_REASON = NoneIsSubtypeOfVoidReason()
@@ -0,0 +1,85 @@
+"""Solutions for existential type variables.
+
+Existential type variables are solved with a persistent union-find structure,
+so that solving one doesn't require rewriting the typing context. Each
+existential type variable is identified by a key, which is the position of its
+declaration in the typing context: see `TypingContext.instantiate_existential`.
+
+Keys are always linked to smaller keys, so the representative of a set of
+existential type variables is the one that was declared first. Since
+existential type variables are removed from the typing context in the reverse
+order that they were declared, the representative stays in scope for as long
+as any other member of its set does.
+"""
+from typing import Optional, Tuple
+
+import attr
+
+from pytch.containers import PMap
+from .types import Ty
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ExistentialSolver:
+    parents: PMap[int, int] = attr.ib(factory=PMap)
+    """The parent of each key which isn't the representative of its set."""
+
+    solutions: PMap[int, Ty] = attr.ib(factory=PMap)
+    """The solution for each representative which has been solved."""
+
+    def declare(self, key: int) -> "ExistentialSolver":
+        """Start a new, unsolved set for `key`.
+
+        A key may be reused once its existential type variable has gone out of
+        scope, so this discards anything previously recorded for it.
+        """
+        return ExistentialSolver(
+            parents=self.parents.remove(key), solutions=self.solutions.remove(key)
+        )
+
+    def find(self, key: int) -> int:
+        while True:
+            parent = self.parents.get(key)
+            if parent is None:
+                return key
+            key = parent
+
+    def compress(self, key: int) -> Tuple["ExistentialSolver", int]:
+        """Find the representative for `key`, and point every key on the way
+        there directly at it."""
+        root = self.find(key)
+        parents = self.parents
+        while key != root:
+            parent = parents[key]
+            if parent != root:
+                parents = parents.set(key, root)
+            key = parent
+        return (attr.evolve(self, parents=parents), root)
+
+    def get_solution(self, key: int) -> Optional[Ty]:
+        return self.solutions.get(self.find(key))
+
+    def solve(self, key: int, ty: Ty) -> "ExistentialSolver":
+        """Solve the set containing `key` to `ty`, unless it's already been
+        solved."""
+        (solver, root) = self.compress(key)
+        if root in solver.solutions:
+            return solver
+        return attr.evolve(solver, solutions=solver.solutions.set(root, ty))
+
+    def union(self, lhs: int, rhs: int) -> "ExistentialSolver":
+        (solver, lhs_root) = self.compress(lhs)
+        (solver, rhs_root) = solver.compress(rhs)
+        if lhs_root == rhs_root:
+            return solver
+
+        (root, child) = sorted([lhs_root, rhs_root])
+        solutions = solver.solutions
+        child_solution = solutions.get(child)
+        if child_solution is not None:
+            solutions = solutions.remove(child)
+            if root not in solutions:
+                solutions = solutions.set(root, child_solution)
+        return ExistentialSolver(
+            parents=solver.parents.set(child, root), solutions=solutions
+        )
@@ -1,9 +1,9 @@
-from typing import List, Optional, Tuple
+from typing import Callable, List, Optional, Sequence, Tuple, TypeVar
 
 import attr
 
 from pytch.binder import Bindation
-from pytch.containers import find, PMap, PVector, take_while
+from pytch.containers import PMap, PVector
 from pytch.errors import count, Error, ErrorCode, Note, Severity
 from pytch.lexer import TokenKind
 from pytch.redcst import (
@@ -20,13 +20,13 @@ from pytch.redcst import (
     StringLiteralExpr,
     SyntaxTree,
     VariablePattern,
+    Visitor,
 )
-from pytch.utils import FileInfo, Range
+from pytch.utils import FileInfo, MaybeTrampoline, Range, run_trampoline, Trampoline
 from .builtins import ERR_TY, INT_TY, NONE_TY, OBJECT_TY, STR_TY, TOP_TY, VOID_TY
 from .judgments import (
     DeclareExistentialVarJudgment,
     DeclareVarJudgment,
-    ExistentialVariableHasTyJudgment,
     ExistentialVariableMarkerJudgment,
     PatternHasTyJudgment,
     TypingJudgment,
@@ -34,16 +34,21 @@ from .judgments import (
 from .reason import (
     EqualTysReason,
     InstantiateExistentialReason,
-    InvalidSyntaxReason,
-    NoneIsSubtypeOfVoidReason,
+    INVALID_SYNTAX_REASON,
+    NONE_IS_SUBTYPE_OF_VOID_REASON,
     Reason,
-    SubtypeOfObjectReason,
-    SubtypeOfUnboundedGenericReason,
+    SUBTYPE_OF_OBJECT_REASON,
+    SUBTYPE_OF_UNBOUNDED_GENERIC_REASON,
     TodoReason,
+    UNEXPLAINED_REASON,
 )
+from .solver import ExistentialSolver
 from .types import BaseTy, ExistentialTyVar, FunctionTy, MonoTy, Ty, TyVar, UniversalTy
 
 
+Tk = TypeVar("Tk")
+
+
 @attr.s(auto_attribs=True, frozen=True)
 class Env:
     file_info: FileInfo
@@ -51,6 +56,14 @@ class Env:
     global_scope: PMap[str, Ty]
     errors: PVector[Error]
 
+    explain_reasons: bool = False
+    """Whether to record why each check succeeded. Reasons are only needed
+    for debugging, so by default the shared `UNEXPLAINED_REASON` is used
+    instead of constructing a new reason for each check."""
+
+    explanations: PVector["Explanation"] = attr.ib(factory=PVector)
+    """The reason that each expression checked, if `explain_reasons` is set."""
+
     def get_range_for_node(self, node: Node) -> Range:
         """Get the range corresponding to node.
 
@@ -74,14 +87,137 @@ class Env:
     def add_error(self, error: Error) -> "Env":
         return attr.evolve(self, errors=self.errors.append(error))
 
+    def add_explanation(self, explanation: "Explanation") -> "Env":
+        return attr.evolve(self, explanations=self.explanations.append(explanation))
+
+
+JudgmentPositions = Tuple[int, ...]
+"""Positions in the typing context, in ascending order. Some of them may be
+stale: see `TypingContext`."""
+
 
 @attr.s(auto_attribs=True, frozen=True)
 class TypingContext:
-    judgments: PVector[TypingJudgment]
-    inferred_tys: PMap[Expr, Ty]
+    """The ordered list of typing judgments, plus indexes into it.
+
+    The first `num_judgments` elements of `judgment_slots` are the judgments
+    in the context. Any elements after that were removed by
+    `take_until_before_judgment`, and are overwritten as new judgments are
+    added, so that removing judgments doesn't require copying the judgments
+    which remain.
+
+    The indexes map keys to the positions of the judgments with that key, so
+    that lookups don't have to scan the whole context. Since judgments can be
+    removed or replaced without updating the indexes, each position is
+    checked against the judgment actually at that position before it's used.
+    Stale positions are dropped whenever a new position is added for the same
+    key.
+
+    Solving an existential type variable doesn't replace its declaration with
+    an `ExistentialVariableHasTyJudgment`, as in Dunfield 2013. Instead, the
+    solution is recorded in `solver`, keyed by the position of the
+    declaration, and it goes out of scope along with the declaration.
+    """
+
+    judgment_slots: PVector[TypingJudgment] = attr.ib(factory=PVector)
+    num_judgments: int = 0
+    inferred_tys: PMap[Expr, Ty] = attr.ib(factory=PMap)
+    solver: ExistentialSolver = attr.ib(factory=ExistentialSolver)
+
+    judgment_positions: PMap[TypingJudgment, JudgmentPositions] = attr.ib(factory=PMap)
+    """The positions of each judgment."""
+
+    pattern_ty_positions: PMap[VariablePattern, JudgmentPositions] = attr.ib(
+        factory=PMap
+    )
+    """The positions of the `PatternHasTyJudgment`s for each pattern."""
+
+    @property
+    def judgments(self) -> Sequence[TypingJudgment]:
+        return self.judgment_slots[: self.num_judgments]
 
     def add_judgment(self, judgment: TypingJudgment) -> "TypingContext":
-        return attr.evolve(self, judgments=self.judgments.append(judgment))
+        position = self.num_judgments
+        if position < len(self.judgment_slots):
+            judgment_slots = self.judgment_slots.set(position, judgment)
+        else:
+            judgment_slots = self.judgment_slots.append(judgment)
+        ctx = attr.evolve(
+            self, judgment_slots=judgment_slots, num_judgments=position + 1
+        )
+        if isinstance(judgment, DeclareExistentialVarJudgment):
+            ctx = attr.evolve(ctx, solver=ctx.solver.declare(position))
+        return ctx._index_judgment(position, judgment)
+
+    def _index_judgment(
+        self, position: int, judgment: TypingJudgment
+    ) -> "TypingContext":
+        ctx = attr.evolve(
+            self,
+            judgment_positions=self._add_position(
+                self.judgment_positions, judgment, position, lambda x: x == judgment
+            ),
+        )
+        if isinstance(judgment, PatternHasTyJudgment):
+            pattern = judgment.pattern
+            assert isinstance(pattern, VariablePattern)
+            ctx = attr.evolve(
+                ctx,
+                pattern_ty_positions=ctx._add_position(
+                    ctx.pattern_ty_positions,
+                    pattern,
+                    position,
+                    lambda x: is_pattern_ty_judgment_for(x, pattern),
+                ),
+            )
+        return ctx
+
+    def _add_position(
+        self,
+        index: PMap[Tk, JudgmentPositions],
+        key: Tk,
+        position: int,
+        is_judgment_for_key: Callable[[TypingJudgment], bool],
+    ) -> PMap[Tk, JudgmentPositions]:
+        positions = self._get_positions(index, key, is_judgment_for_key)
+        positions = [x for x in positions if x != position]
+        positions.append(position)
+        positions.sort()
+        return index.set(key, tuple(positions))
+
+    def _get_positions(
+        self,
+        index: PMap[Tk, JudgmentPositions],
+        key: Tk,
+        is_judgment_for_key: Callable[[TypingJudgment], bool],
+    ) -> List[int]:
+        """Get the positions of the judgments in the context for `key`,
+        skipping any stale positions."""
+        return [
+            position
+            for position in index.get(key, ())
+            if position < self.num_judgments
+            and is_judgment_for_key(self.judgment_slots[position])
+        ]
+
+    def _get_existential_key(
+        self, existential_ty_var: ExistentialTyVar
+    ) -> Optional[int]:
+        """Get the key for `existential_ty_var` in `solver`, or `None` if it's
+        not in scope.
+
+        If it's been declared more than once, then the innermost declaration
+        shadows the others.
+        """
+        declaration = DeclareExistentialVarJudgment(
+            existential_ty_var=existential_ty_var
+        )
+        positions = self._get_positions(
+            self.judgment_positions, declaration, lambda x: x == declaration
+        )
+        if not positions:
+            return None
+        return positions[-1]
 
     def ty_to_string(self, ty: Ty) -> str:
         if isinstance(ty, BaseTy):
@@ -90,38 +226,34 @@ class TypingContext:
             raise NotImplementedError(f"ty_to_string not implemented for type: {ty!r}")
 
     def take_until_before_judgment(self, judgment: TypingJudgment) -> "TypingContext":
-        judgments = PVector(take_while(self.judgments, lambda x: x != judgment))
-        assert len(judgments) < len(
-            self.judgments
+        positions = self._get_positions(
+            self.judgment_positions, judgment, lambda x: x == judgment
+        )
+        assert (
+            positions
         ), f"take_until_before_judgment: expected to find judgment {judgment!r} in context {self.judgments!r}"
-        return attr.evolve(self, judgments=judgments)
+        return attr.evolve(self, num_judgments=positions[0])
 
     def apply_as_substitution(self, ty: Ty) -> Ty:
         """See Dunfield 2013 Figure 7."""
-        if isinstance(ty, MonoTy):
+        if not ty.has_existentials:
+            return ty
+        elif isinstance(ty, MonoTy):
             return ty
         elif isinstance(ty, BaseTy):
             return ty
         elif isinstance(ty, ExistentialTyVar):
-
-            def is_substitution_for_existential_ty_variable(
-                judgment: TypingJudgment
-            ) -> bool:
-                if isinstance(judgment, ExistentialVariableHasTyJudgment):
-                    return judgment.existential_ty_var == ty
-                else:
-                    return False
-
-            existential_ty_variable_substitution = find(
-                self.judgments, is_substitution_for_existential_ty_variable
-            )
-            if existential_ty_variable_substitution is not None:
-                assert isinstance(
-                    existential_ty_variable_substitution, ExistentialTyVar
-                )
-                return existential_ty_variable_substitution.ty
-            else:
+            key = self._get_existential_key(ty)
+            if key is None:
                 return ty
+            solution = self.solver.get_solution(key)
+            if solution is not None:
+                return solution
+            # Substitute the representative, so that existential type
+            # variables which were solved to each other come out the same.
+            root_declaration = self.judgment_slots[self.solver.find(key)]
+            assert isinstance(root_declaration, DeclareExistentialVarJudgment)
+            return root_declaration.existential_ty_var
         elif isinstance(ty, FunctionTy):
             domain = ty.domain.map(self.apply_as_substitution)
             codomain = self.apply_as_substitution(ty.codomain)
@@ -129,7 +261,7 @@ class TypingContext:
         elif isinstance(ty, UniversalTy):
             return UniversalTy(
                 quantifier_ty=ty.quantifier_ty,
-                ty=self.apply_as_substitution(ty),
+                ty=self.apply_as_substitution(ty.ty),
                 reason=ty.reason,
             )
         else:
@@ -140,15 +272,22 @@ class TypingContext:
     def instantiate_existential(
         self, existential_ty_var: ExistentialTyVar, to: Ty
     ) -> "TypingContext":
-        def f(x: TypingJudgment) -> TypingJudgment:
-            if isinstance(x, DeclareExistentialVarJudgment):
-                if x.existential_ty_var == existential_ty_var:
-                    return ExistentialVariableHasTyJudgment(
-                        existential_ty_var=existential_ty_var, ty=to
-                    )
-            return x
+        """Solve `existential_ty_var` to `to`.
 
-        return attr.evolve(self, judgments=self.judgments.map(f))
+        Existential type variables which aren't in scope, or which have already
+        been solved, are left alone.
+        """
+        key = self._get_existential_key(existential_ty_var)
+        if key is None:
+            return self
+
+        if isinstance(to, ExistentialTyVar):
+            to_key = self._get_existential_key(to)
+            if to_key is not None:
+                if self.solver.get_solution(key) is not None:
+                    return self
+                return attr.evolve(self, solver=self.solver.union(key, to_key))
+        return attr.evolve(self, solver=self.solver.solve(key, to))
 
     def record_infers(self, expr: Expr, ty: Ty) -> "TypingContext":
         return attr.evolve(self, inferred_tys=self.inferred_tys.set(expr, ty))
@@ -158,23 +297,25 @@ class TypingContext:
 
     def add_pattern_ty(self, pattern: VariablePattern, ty: Ty) -> "TypingContext":
         judgment = PatternHasTyJudgment(pattern=pattern, ty=ty)
-        return attr.evolve(self, judgments=self.judgments.append(judgment))
+        return self.add_judgment(judgment)
 
     def get_pattern_ty(self, pattern: VariablePattern) -> Optional[Ty]:
-        for judgment in self.judgments:
-            if isinstance(judgment, PatternHasTyJudgment):
-                if judgment.pattern is pattern:
-                    return judgment.ty
-        return None
+        positions = self._get_positions(
+            self.pattern_ty_positions,
+            pattern,
+            lambda x: is_pattern_ty_judgment_for(x, pattern),
+        )
+        if not positions:
+            return None
+        judgment = self.judgment_slots[positions[0]]
+        assert isinstance(judgment, PatternHasTyJudgment)
+        return judgment.ty
 
     def push_existential_ty_var_marker(
         self, existential_ty_var: ExistentialTyVar
     ) -> "TypingContext":
-        return attr.evolve(
-            self,
-            judgments=self.judgments.append(
-                ExistentialVariableMarkerJudgment(existential_ty_var=existential_ty_var)
-            ),
+        return self.add_judgment(
+            ExistentialVariableMarkerJudgment(existential_ty_var=existential_ty_var)
         )
 
     def pop_existential_ty_var_marker(
@@ -183,24 +324,51 @@ class TypingContext:
         raise NotImplementedError("pop existential ty var not implemented")
 
 
+def is_pattern_ty_judgment_for(
+    judgment: TypingJudgment, pattern: VariablePattern
+) -> bool:
+    return isinstance(judgment, PatternHasTyJudgment) and judgment.pattern is pattern
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Explanation:
+    """Why an expression has the type that it was checked against."""
+
+    expr: Expr
+    reason: Reason
+
+
 @attr.s(auto_attribs=True, frozen=True)
 class Typeation:
     ctx: TypingContext
     errors: List[Error]
+    explanations: List[Explanation] = attr.ib(factory=list)
 
 
 def tys_equal(lhs: Ty, rhs: Ty) -> bool:
-    return lhs == rhs
+    # Types are hash-consed, so structurally equal types are identical.
+    return lhs is rhs
 
 
-def do_infer(env: Env, ctx: TypingContext, expr: Expr) -> Tuple[Env, TypingContext, Ty]:
-    if isinstance(expr, IntLiteralExpr):
+class Inferrer(Visitor[MaybeTrampoline[Tuple[Env, TypingContext, Ty]]]):
+    def visit_int_literal_expr(
+        self, expr: IntLiteralExpr, env: Env, ctx: TypingContext
+    ) -> Tuple[Env, TypingContext, Ty]:
         return (env, ctx, INT_TY)
-    elif isinstance(expr, StringLiteralExpr):
+
+    def visit_string_literal_expr(
+        self, expr: StringLiteralExpr, env: Env, ctx: TypingContext
+    ) -> Tuple[Env, TypingContext, Ty]:
         return (env, ctx, STR_TY)
-    elif isinstance(expr, LetExpr):
+
+    def visit_let_expr(
+        self, expr: LetExpr, env: Env, ctx: TypingContext
+    ) -> Tuple[Env, TypingContext, Ty]:
         raise ValueError("should not be trying to infer the type of a let-expr (?)")
-    elif isinstance(expr, FunctionCallExpr):
+
+    def visit_function_call_expr(
+        self, expr: FunctionCallExpr, env: Env, ctx: TypingContext
+    ) -> Trampoline[Tuple[Env, TypingContext, Ty]]:
         # Γ ⊢ e1 ⇒ A ⊣ Θ   Θ ⊢ [Θ]A•e2 ⇒⇒ C ⊣ ∆
         # --------------------------------------  →E
         #            Γ ⊢ e1 e2 ⇒ C ⊣ ∆
@@ -208,12 +376,17 @@ def do_infer(env: Env, ctx: TypingContext, expr: Expr) -> Tuple[Env, TypingConte
         if n_callee is None:
             raise NotImplementedError("TODO(missing): handle missing callee")
 
-        (env, ctx, callee_ty) = infer(env, ctx=ctx, expr=n_callee)
+        (env, ctx, callee_ty) = yield infer(env, ctx=ctx, expr=n_callee)
         callee_ty = ctx.apply_as_substitution(callee_ty)
-        return function_application_infer(
-            env, ctx=ctx, ty=callee_ty, function_call_expr=expr
+        return (
+            yield function_application_infer(
+                env, ctx=ctx, ty=callee_ty, function_call_expr=expr
+            )
         )
-    elif isinstance(expr, IdentifierExpr):
+
+    def visit_identifier_expr(
+        self, expr: IdentifierExpr, env: Env, ctx: TypingContext
+    ) -> Tuple[Env, TypingContext, Ty]:
         target = env.bindation.get(expr)
         if target is None:
             raise NotImplementedError("TODO: handle absent type for identifier")
@@ -239,7 +412,10 @@ def do_infer(env: Env, ctx: TypingContext, expr: Expr) -> Tuple[Env, TypingConte
             raise NotImplementedError(
                 "TODO: handle multiple possible source definitions"
             )
-    elif isinstance(expr, BinaryExpr):
+
+    def visit_binary_expr(
+        self, expr: BinaryExpr, env: Env, ctx: TypingContext
+    ) -> Trampoline[Tuple[Env, TypingContext, Ty]]:
         t_operator = expr.t_operator
         if t_operator is None:
             raise NotImplementedError(
@@ -249,23 +425,23 @@ def do_infer(env: Env, ctx: TypingContext, expr: Expr) -> Tuple[Env, TypingConte
         if t_operator.kind == TokenKind.DUMMY_SEMICOLON:
             n_lhs = expr.n_lhs
             if n_lhs is not None:
-                (env, ctx, _reason) = check(env, ctx, expr=n_lhs, ty=TOP_TY)
+                (env, ctx, _reason) = yield check(env, ctx, expr=n_lhs, ty=TOP_TY)
 
             n_rhs = expr.n_rhs
             if n_rhs is not None:
-                return infer(env, ctx, expr=n_rhs)
+                return (yield infer(env, ctx, expr=n_rhs))
             else:
                 return (env, ctx, ERR_TY)
         elif t_operator.kind == TokenKind.PLUS:
             # TODO: do something more sophisticated.
             n_lhs = expr.n_lhs
             if n_lhs is not None:
-                (env, ctx, checks) = check(env, ctx, expr=n_lhs, ty=INT_TY)
+                (env, ctx, checks) = yield check(env, ctx, expr=n_lhs, ty=INT_TY)
                 if not checks:
                     raise NotImplementedError("TODO: handle + on non-int LHS operand")
             n_rhs = expr.n_rhs
             if n_rhs is not None:
-                (env, ctx, checks) = check(env, ctx, expr=n_rhs, ty=INT_TY)
+                (env, ctx, checks) = yield check(env, ctx, expr=n_rhs, ty=INT_TY)
                 if not checks:
                     raise NotImplementedError("TODO: handle + on non-int RHS operand")
             return (env, ctx, INT_TY)
@@ -273,7 +449,10 @@ def do_infer(env: Env, ctx: TypingContext, expr: Expr) -> Tuple[Env, TypingConte
             raise NotImplementedError(
                 f"`infer` not yet implemented for binary expression operator kind {t_operator.kind}"
             )
-    elif isinstance(expr, IfExpr):
+
+    def visit_if_expr(
+        self, expr: IfExpr, env: Env, ctx: TypingContext
+    ) -> Trampoline[Tuple[Env, TypingContext, Ty]]:
         n_then_expr = expr.n_then_expr
         if n_then_expr is None:
             return (env, ctx, ERR_TY)
@@ -285,25 +464,33 @@ def do_infer(env: Env, ctx: TypingContext, expr: Expr) -> Tuple[Env, TypingConte
         if n_else_expr is None:
             result_ty = VOID_TY
         else:
-            (env, ctx, result_ty) = infer(env, ctx, n_else_expr)
+            (env, ctx, result_ty) = yield infer(env, ctx, n_else_expr)
 
-        (env, ctx, _reason) = check(env, ctx, n_then_expr, result_ty)
+        (env, ctx, _reason) = yield check(env, ctx, n_then_expr, result_ty)
         return (env, ctx, result_ty)
-    else:
+
+    def visit_expr(
+        self, expr: Expr, env: Env, ctx: TypingContext
+    ) -> Tuple[Env, TypingContext, Ty]:
         raise NotImplementedError(
             f"TODO: `infer` not yet implemented for expression type: {expr.__class__.__name__}"
         )
 
 
-def infer(env: Env, ctx: TypingContext, expr: Expr) -> Tuple[Env, TypingContext, Ty]:
-    (env, ctx, ty) = do_infer(env, ctx, expr)
+INFERRER = Inferrer()
+
+
+def infer(
+    env: Env, ctx: TypingContext, expr: Expr
+) -> Trampoline[Tuple[Env, TypingContext, Ty]]:
+    (env, ctx, ty) = yield INFERRER.visit(expr, env, ctx)
     ctx = ctx.record_infers(expr, ty)
     return (env, ctx, ty)
 
 
 def infer_function_definition(
     env: Env, ctx: TypingContext, expr: DefExpr
-) -> Tuple[Env, TypingContext, Ty]:
+) -> Trampoline[Tuple[Env, TypingContext, Ty]]:
     def error(ctx: TypingContext):
         function_ty = ERR_TY
         n_name = expr.n_name
@@ -331,12 +518,12 @@ def infer_function_definition(
     if n_definition is None:
         return error(ctx)
 
-    return infer_lambda(env, ctx, parameters=parameters, body=n_definition)
+    return (yield infer_lambda(env, ctx, parameters=parameters, body=n_definition))
 
 
 def function_application_infer(
     env: Env, ctx: TypingContext, ty: Ty, function_call_expr: FunctionCallExpr
-) -> Tuple[Env, TypingContext, Ty]:
+) -> Trampoline[Tuple[Env, TypingContext, Ty]]:
     """The function-application relation ⇒⇒, discussed in Dunfield 2013."""
     n_callee = function_call_expr.n_callee
     assert n_callee is not None, "should have been checked by parser"
@@ -384,7 +571,7 @@ def function_application_infer(
         for argument, argument_ty in zip(arguments, ty.domain):
             n_expr = argument.n_expr
             assert n_expr is not None, "should have been checked by parser"
-            (env, ctx, _reason) = check(env, ctx, expr=n_expr, ty=argument_ty)
+            (env, ctx, _reason) = yield check(env, ctx, expr=n_expr, ty=argument_ty)
         return (env, ctx, ty.codomain)
 
     elif isinstance(ty, ExistentialTyVar):
@@ -410,7 +597,7 @@ def check_lambda():
 
 def infer_lambda(
     env: Env, ctx: TypingContext, parameters: PVector[Optional[Parameter]], body: Expr
-) -> Tuple[Env, TypingContext, Ty]:
+) -> Trampoline[Tuple[Env, TypingContext, Ty]]:
     """Infer the type of a lambda or function definition.
 
     The typing rule is
@@ -450,7 +637,7 @@ def infer_lambda(
         until_judgment = return_judgment
     ctx = ctx.add_judgment(return_judgment)
 
-    env, ctx, checks = check(env, ctx=ctx, expr=body, ty=return_ty)
+    env, ctx, checks = yield check(env, ctx=ctx, expr=body, ty=return_ty)
     ctx = ctx.take_until_before_judgment(judgment=until_judgment)
 
     function_ty = FunctionTy(
@@ -461,10 +648,10 @@ def infer_lambda(
     return (env, ctx, function_ty)
 
 
-def check(
-    env: Env, ctx: TypingContext, expr: Expr, ty: Ty
-) -> Tuple[Env, TypingContext, Optional[Reason]]:
-    if isinstance(expr, LetExpr):
+class Checker(Visitor[MaybeTrampoline[Tuple[Env, TypingContext, Optional[Reason]]]]):
+    def visit_let_expr(
+        self, expr: LetExpr, env: Env, ctx: TypingContext, ty: Ty
+    ) -> Trampoline[Tuple[Env, TypingContext, Optional[Reason]]]:
         # The typing rule for let-bindings is
         #
         #     Ψ ⊢ e ⇒ A   Ψ, x:A ⊢ e' ⇐ C
@@ -472,12 +659,12 @@ def check(
         #       Ψ ⊢ let x = e in e' ⇐ C
         n_pattern = expr.n_pattern
         if n_pattern is None:
-            return (env, ctx, InvalidSyntaxReason())
+            return (env, ctx, INVALID_SYNTAX_REASON)
 
         n_value = expr.n_value
         if n_value is None:
-            return (env, ctx, InvalidSyntaxReason())
-        (env, ctx, value_ty) = infer(env, ctx, n_value)
+            return (env, ctx, INVALID_SYNTAX_REASON)
+        (env, ctx, value_ty) = yield infer(env, ctx, n_value)
         if not isinstance(n_pattern, VariablePattern):
             raise NotImplementedError(
                 "TODO: patterns other than VariablePattern not supported"
@@ -506,11 +693,13 @@ def check(
 
         n_next = expr.n_body
         if n_next is None:
-            return (env, ctx, InvalidSyntaxReason())
+            return (env, ctx, INVALID_SYNTAX_REASON)
 
-        return check(env, ctx, expr=n_next, ty=ty)
+        return (yield check(env, ctx, expr=n_next, ty=ty))
 
-    elif isinstance(expr, DefExpr):
+    def visit_def_expr(
+        self, expr: DefExpr, env: Env, ctx: TypingContext, ty: Ty
+    ) -> Trampoline[Tuple[Env, TypingContext, Optional[Reason]]]:
         # The typing rule for let-bindings is
         #
         #     Ψ ⊢ e ⇒ A   Ψ, x:A ⊢ e' ⇐ C
@@ -521,11 +710,11 @@ def check(
         # using the rule for typing lambdas.
         n_name = expr.n_name
         if n_name is None:
-            return (env, ctx, InvalidSyntaxReason())
+            return (env, ctx, INVALID_SYNTAX_REASON)
 
         n_parameter_list = expr.n_parameter_list
         if n_parameter_list is None:
-            return (env, ctx, InvalidSyntaxReason())
+            return (env, ctx, INVALID_SYNTAX_REASON)
 
         parameters = n_parameter_list.parameters
         if parameters is None:
@@ -533,7 +722,7 @@ def check(
                 "TODO(missing): raise error for missing parameters"
             )
 
-        (env, ctx, function_ty) = infer_function_definition(env, ctx, expr)
+        (env, ctx, function_ty) = yield infer_function_definition(env, ctx, expr)
         n_next = expr.n_next
         if n_next is None:
             raise NotImplementedError(
@@ -552,11 +741,16 @@ def check(
 
         assert isinstance(n_name, VariablePattern)
         ctx = ctx.add_pattern_ty(n_name, function_ty)
-        return check(env, ctx, expr=n_next, ty=ty)
-    else:
-        (env, ctx, actual_ty) = infer(env, ctx, expr=expr)
+        return (yield check(env, ctx, expr=n_next, ty=ty))
+
+    def visit_expr(
+        self, expr: Expr, env: Env, ctx: TypingContext, ty: Ty
+    ) -> Trampoline[Tuple[Env, TypingContext, Optional[Reason]]]:
+        (env, ctx, actual_ty) = yield infer(env, ctx, expr=expr)
         (env, ctx, reason) = check_subtype(env, ctx, lhs=actual_ty, rhs=ty)
         if reason is not None:
+            if env.explain_reasons:
+                env = env.add_explanation(Explanation(expr=expr, reason=reason))
             return (env, ctx, reason)
         else:
             env = env.add_error(
@@ -575,14 +769,27 @@ def check(
             return (env, ctx, reason)
 
 
+CHECKER = Checker()
+
+
+def check(
+    env: Env, ctx: TypingContext, expr: Expr, ty: Ty
+) -> MaybeTrampoline[Tuple[Env, TypingContext, Optional[Reason]]]:
+    return CHECKER.visit(expr, env, ctx, ty)
+
+
 def check_subtype(
     env: Env, ctx: TypingContext, lhs: Ty, rhs: Ty
 ) -> Tuple[Env, TypingContext, Optional[Reason]]:
     if tys_equal(lhs, rhs):
-        return (env, ctx, EqualTysReason(lhs=lhs, rhs=rhs))
+        if env.explain_reasons:
+            return (env, ctx, EqualTysReason(lhs=lhs, rhs=rhs))
+        return (env, ctx, UNEXPLAINED_REASON)
     elif isinstance(lhs, UniversalTy):
         # TODO: implement
-        return (env, ctx, TodoReason(todo="UniversalTy"))
+        if env.explain_reasons:
+            return (env, ctx, TodoReason(todo="UniversalTy"))
+        return (env, ctx, UNEXPLAINED_REASON)
     elif isinstance(rhs, UniversalTy):
         judgment = DeclareVarJudgment(variable=rhs.quantifier_ty)
         ctx = ctx.add_judgment(judgment)
@@ -600,19 +807,19 @@ def check_subtype(
         # free variables of the right-hand side.
         return instantiate_rhs_existential(env, ctx, lhs=lhs, rhs=rhs)
     elif isinstance(rhs, TyVar):
-        return (env, ctx, SubtypeOfUnboundedGenericReason())
+        return (env, ctx, SUBTYPE_OF_UNBOUNDED_GENERIC_REASON)
     elif tys_equal(rhs, VOID_TY):
         assert lhs != VOID_TY, "should be checked by parser in tys_equal case"
         (env, ctx, reason) = check_subtype(env, ctx, lhs=lhs, rhs=NONE_TY)
         if reason is not None:
-            return (env, ctx, NoneIsSubtypeOfVoidReason())
+            return (env, ctx, NONE_IS_SUBTYPE_OF_VOID_REASON)
         else:
             return (env, ctx, None)
     elif tys_equal(rhs, OBJECT_TY):
         if tys_equal(lhs, VOID_TY):
             return (env, ctx, None)
         else:
-            return (env, ctx, SubtypeOfObjectReason())
+            return (env, ctx, SUBTYPE_OF_OBJECT_REASON)
     elif isinstance(lhs, BaseTy) and isinstance(rhs, BaseTy):
         assert not tys_equal(lhs, rhs), "should have been handled in tys_equal case"
         return (env, ctx, None)
@@ -638,7 +845,13 @@ def instantiate_lhs_existential(
 ) -> Tuple[Env, TypingContext, Reason]:
     if isinstance(rhs, (MonoTy, ExistentialTyVar)):
         ctx = ctx.instantiate_existential(existential_ty_var=lhs, to=rhs)
-        return (env, ctx, InstantiateExistentialReason(existential_ty_var=lhs, to=rhs))
+        if env.explain_reasons:
+            return (
+                env,
+                ctx,
+                InstantiateExistentialReason(existential_ty_var=lhs, to=rhs),
+            )
+        return (env, ctx, UNEXPLAINED_REASON)
 
     raise NotImplementedError(
         f"TODO: LHS existential instantiation for lhs {lhs!r} and rhs {rhs!r} not implemented"
@@ -650,7 +863,13 @@ def instantiate_rhs_existential(
 ) -> Tuple[Env, TypingContext, Reason]:
     if isinstance(lhs, MonoTy):
         ctx = ctx.instantiate_existential(existential_ty_var=rhs, to=lhs)
-        return (env, ctx, InstantiateExistentialReason(existential_ty_var=rhs, to=lhs))
+        if env.explain_reasons:
+            return (
+                env,
+                ctx,
+                InstantiateExistentialReason(existential_ty_var=rhs, to=lhs),
+            )
+        return (env, ctx, UNEXPLAINED_REASON)
 
     raise NotImplementedError(
         f"TODO: RHS existential instantiation for lhs {lhs!r} and rhs {rhs!r} not implemented"
@@ -662,8 +881,9 @@ def typecheck(
     syntax_tree: SyntaxTree,
     bindation: Bindation,
     global_scope: PMap[str, Ty],
+    explain_reasons: bool = False,
 ) -> Typeation:
-    ctx = TypingContext(judgments=PVector(), inferred_tys=PMap())
+    ctx = TypingContext()
     if syntax_tree.n_expr is None:
         return Typeation(ctx, errors=[])
 
@@ -672,7 +892,12 @@ def typecheck(
         bindation=bindation,
         global_scope=global_scope,
         errors=PVector(),
+        explain_reasons=explain_reasons,
+    )
+    (env, ctx, checks) = run_trampoline(
+        check(env, ctx, expr=syntax_tree.n_expr, ty=TOP_TY)
     )
-    (env, ctx, checks) = check(env, ctx, expr=syntax_tree.n_expr, ty=TOP_TY)
     assert checks, "The program should always check against the top type"
-    return Typeation(ctx=ctx, errors=list(env.errors))
+    return Typeation(
+        ctx=ctx, errors=list(env.errors), explanations=list(env.explanations)
+    )
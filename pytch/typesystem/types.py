@@ -1,37 +1,87 @@
+from typing import Any, cast, Hashable, MutableMapping, Tuple, Type
+import weakref
+
 import attr
 
 from pytch.containers import PVector
 import pytch.typesystem.reason
 
 
-@attr.s(auto_attribs=True, frozen=True)
+class InternedTyMeta(type):
+    """Metaclass for types which are hash-consed.
+
+    Constructing a type which is structurally equal to one that already
+    exists returns the existing type instead. Structural equality then
+    coincides with identity, so types compare and hash in constant time, and
+    repeated types (such as function signatures) share memory.
+
+    The reason for a type isn't part of its structure, so a type which is
+    interned keeps the reason that it was first constructed with.
+
+    Types are interned as long as something else refers to them.
+    """
+
+    def __init__(cls, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        cls._interned_tys: MutableMapping[
+            Tuple[Hashable, ...], Ty
+        ] = weakref.WeakValueDictionary()
+
+    def __call__(cls, *args: Any, **kwargs: Any) -> Any:
+        ty = super().__call__(*args, **kwargs)
+        values = (
+            getattr(ty, field.name)
+            # `attr.fields` can't tell that `cls` is an attrs class.
+            for field in attr.fields(cast(Type[Any], cls))
+            if field.init and field.name != "reason"
+        )
+        key = tuple(
+            tuple(value) if isinstance(value, PVector) else value for value in values
+        )
+        return cls._interned_tys.setdefault(key, ty)
+
+
+@attr.s(auto_attribs=True, frozen=True, cmp=False)
 class Ty:
-    reason: "pytch.typesystem.reason.Reason"
+    """Abstract base class for types.
 
-    def __eq__(self, other: object) -> bool:
-        # TODO: does this work? Do we need to assign types unique IDs instead?
-        return self is other
+    Types are compared by identity. Types which are built from other types
+    are hash-consed (see `InternedTyMeta`), so this is the same as comparing
+    them structurally. Type variables are only equal to themselves.
+    """
 
-    def __neq__(self, other: object) -> bool:
-        return not (self == other)
+    reason: "pytch.typesystem.reason.Reason"
+
+    has_existentials: bool = attr.ib(init=False, repr=False)
+    """Whether any existential type variables appear in this type. If not,
+    then it's unaffected by substitution."""
 
 
 class MonoTy(Ty):
     pass
 
 
-@attr.s(auto_attribs=True, frozen=True)
-class BaseTy(MonoTy):
+@attr.s(auto_attribs=True, frozen=True, cmp=False)
+class BaseTy(MonoTy, metaclass=InternedTyMeta):
     name: str
 
+    def __attrs_post_init__(self) -> None:
+        object.__setattr__(self, "has_existentials", False)
 
-@attr.s(auto_attribs=True, frozen=True)
-class FunctionTy(MonoTy):
+
+@attr.s(auto_attribs=True, frozen=True, cmp=False)
+class FunctionTy(MonoTy, metaclass=InternedTyMeta):
     domain: PVector[Ty]
     codomain: Ty
 
+    def __attrs_post_init__(self) -> None:
+        has_existentials = self.codomain.has_existentials or any(
+            ty.has_existentials for ty in self.domain
+        )
+        object.__setattr__(self, "has_existentials", has_existentials)
+
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, cmp=False)
 class TyVar(MonoTy):
     """Type variable.
 
@@ -45,9 +95,12 @@ class TyVar(MonoTy):
 
     name: str
 
+    def __attrs_post_init__(self) -> None:
+        object.__setattr__(self, "has_existentials", False)
 
-@attr.s(auto_attribs=True, frozen=True)
-class UniversalTy(Ty):
+
+@attr.s(auto_attribs=True, frozen=True, cmp=False)
+class UniversalTy(Ty, metaclass=InternedTyMeta):
     """Universally-quantified type.
 
     For example, the type
@@ -61,8 +114,11 @@ class UniversalTy(Ty):
     quantifier_ty: TyVar
     ty: Ty
 
+    def __attrs_post_init__(self) -> None:
+        object.__setattr__(self, "has_existentials", self.ty.has_existentials)
+
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, cmp=False)
 class ExistentialTyVar(Ty):
     """Existential type variable.
 
@@ -71,3 +127,6 @@ class ExistentialTyVar(Ty):
     """
 
     name: str
+
+    def __attrs_post_init__(self) -> None:
+        object.__setattr__(self, "has_existentials", True)
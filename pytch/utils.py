@@ -1,8 +1,23 @@
-from typing import List
+import bisect
+import itertools
+from types import GeneratorType
+from typing import (
+    Any,
+    Generator,
+    List,
+    Optional,
+    overload,
+    Sequence,
+    TypeVar,
+    Union,
+)
 
 import attr
 
 
+T = TypeVar("T")
+
+
 Offset = int
 """A zero-indexed offset into a file."""
 
@@ -28,14 +43,37 @@ class Range:
     end: Position
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class TextEdit:
+    """A replacement of a range of text in a file with new text."""
+
+    offset_range: OffsetRange
+    """The range of text to replace, in terms of the offsets before the edit."""
+
+    replacement: str
+
+    @property
+    def offset_delta(self) -> int:
+        """The change in the length of the file caused by this edit."""
+        return len(self.replacement) - (self.offset_range.end - self.offset_range.start)
+
+
 @attr.s(auto_attribs=True)
 class FileInfo:
     file_path: str
     source_code: str
     lines: List[str] = attr.ib(init=False)
+    line_start_offsets: List[Offset] = attr.ib(init=False, cmp=False, repr=False)
+    """The offset of the start of each line, including the empty line after
+    a trailing newline, in increasing order."""
 
     def __attrs_post_init__(self) -> None:
         self.lines = splitlines(self.source_code)
+        self.line_start_offsets = list(
+            itertools.accumulate(
+                [0] + [len(line) + 1 for line in self.source_code.split("\n")[:-1]]
+            )
+        )
 
     def get_position_for_offset(self, offset: int) -> Position:
         # 0-based index ranges are inclusive on the left and exclusive on the
@@ -45,19 +83,54 @@ class FileInfo:
             0 <= offset <= len(self.source_code)
         ), f"offset {offset} is not in range [0, {len(self.source_code)}]"
 
-        current_offset = 0
-        current_line = 0
-
-        # Add 1 to the length of the line to account for the removed "\n"
-        # character.
-        while (
-            current_line < len(self.lines)
-            and current_offset + len(self.lines[current_line]) + 1 <= offset
-        ):
-            current_offset += len(self.lines[current_line]) + 1
-            current_line += 1
-        character = offset - current_offset
-        return Position(line=current_line, character=character)
+        line = bisect.bisect_right(self.line_start_offsets, offset) - 1
+        character = offset - self.line_start_offsets[line]
+        return Position(line=line, character=character)
+
+    def get_positions_for_offsets(self, offsets: Sequence[int]) -> List[Position]:
+        """Get the position for each of the given offsets, which must be in
+        increasing order.
+
+        This makes one pass over the lines, rather than a binary search per
+        offset.
+        """
+        positions = []
+        line = 0
+        previous_offset = 0
+        for offset in offsets:
+            assert (
+                previous_offset <= offset <= len(self.source_code)
+            ), f"offset {offset} is not in range [{previous_offset}, {len(self.source_code)}]"
+            while (
+                line + 1 < len(self.line_start_offsets)
+                and self.line_start_offsets[line + 1] <= offset
+            ):
+                line += 1
+            character = offset - self.line_start_offsets[line]
+            positions.append(Position(line=line, character=character))
+            previous_offset = offset
+        return positions
+
+    def get_offset_for_position(self, position: Position) -> int:
+        """Get the offset corresponding to `position`. This is the inverse of
+        `get_position_for_offset`."""
+        assert (
+            0 <= position.line < len(self.line_start_offsets)
+        ), f"line {position.line} is not in range [0, {len(self.line_start_offsets)})"
+        line_start_offset = self.line_start_offsets[position.line]
+        if position.line + 1 < len(self.line_start_offsets):
+            # Don't count the "\n" character at the end of the line.
+            line_end_offset = self.line_start_offsets[position.line + 1] - 1
+        else:
+            line_end_offset = len(self.source_code)
+
+        # As with offsets, the position just past the end of the line is
+        # valid.
+        line_length = line_end_offset - line_start_offset
+        assert (
+            0 <= position.character <= line_length
+        ), f"character {position.character} is not in range [0, {line_length}]"
+        return line_start_offset + position.character
 
     def get_range_from_offset_range(self, offset_range: OffsetRange) -> Range:
         return Range(
@@ -65,6 +138,25 @@ class FileInfo:
             end=self.get_position_for_offset(offset_range.end),
         )
 
+    def get_offset_range_from_range(self, range: Range) -> OffsetRange:
+        return OffsetRange(
+            start=self.get_offset_for_position(range.start),
+            end=self.get_offset_for_position(range.end),
+        )
+
+    def apply_edit(self, edit: TextEdit) -> "FileInfo":
+        """Return the `FileInfo` for this file after applying the given edit."""
+        offset_range = edit.offset_range
+        assert (
+            0 <= offset_range.start <= offset_range.end <= len(self.source_code)
+        ), f"edit range {offset_range} is not in range [0, {len(self.source_code)}]"
+        source_code = (
+            self.source_code[: offset_range.start]
+            + edit.replacement
+            + self.source_code[offset_range.end :]
+        )
+        return FileInfo(file_path=self.file_path, source_code=source_code)
+
 
 def splitlines(s: str) -> List[str]:
     """Don't use `str.splitlines`.
@@ -77,3 +169,79 @@ def splitlines(s: str) -> List[str]:
     if lines[-1] == "":
         lines = lines[:-1]
     return lines
+
+
+Trampoline = Generator[Any, Any, T]
+"""A recursive computation, written as a generator which yields the
+sub-computations that it wants to recurse into and receives their results.
+
+For example, instead of writing
+
+    def depth(node: Node) -> int:
+        return 1 + max((depth(child) for child in node.children), default=0)
+
+write
+
+    def depth(node: Node) -> Trampoline[int]:
+        child_depths = []
+        for child in node.children:
+            child_depth = yield depth(child)
+            child_depths.append(child_depth)
+        return 1 + max(child_depths, default=0)
+
+and call `run_trampoline(depth(node))`. The call stack is then kept on the
+heap, so the recursion depth is only limited by the available memory, rather
+than by Python's recursion limit.
+"""
+
+
+MaybeTrampoline = Union[T, Trampoline[T]]
+"""Either a `Trampoline`, or the result which it would have produced.
+
+This is for functions which dispatch to several computations, some of which
+don't need to recurse, such as a `Visitor` over the syntax tree. The result
+can be passed to `run_trampoline` or yielded from a `Trampoline` either way.
+"""
+
+
+@overload
+def run_trampoline(computation: Trampoline[T]) -> T:
+    pass
+
+
+@overload  # noqa: F811
+def run_trampoline(computation: T) -> T:
+    pass
+
+
+def run_trampoline(computation: Any) -> Any:  # noqa: F811
+    """Run a `Trampoline` to completion and return its result."""
+    if not isinstance(computation, GeneratorType):
+        return computation
+    stack = [computation]
+    value: Any = None
+    exception: Optional[BaseException] = None
+    while True:
+        try:
+            if exception is None:
+                subcomputation = stack[-1].send(value)
+            else:
+                subcomputation = stack[-1].throw(exception)
+        except StopIteration as e:
+            stack.pop()
+            if not stack:
+                return e.value
+            (value, exception) = (e.value, None)
+        except BaseException as e:
+            # Propagate the exception to the caller, as if this were a
+            # normal function call.
+            stack.pop()
+            if not stack:
+                raise
+            (value, exception) = (None, e)
+        else:
+            if isinstance(subcomputation, GeneratorType):
+                stack.append(subcomputation)
+                (value, exception) = (None, None)
+            else:
+                (value, exception) = (subcomputation, None)
@@ -1,4 +1,9 @@
-from pytch.binder import bind, GLOBAL_SCOPE
+from typing import Any, Set
+
+import distance
+
+from pytch import binder
+from pytch.binder import bind, GLOBAL_SCOPE, Scope
 from pytch.cstquery import Query
 from pytch.errors import Error, ErrorCode, Note, Severity
 from pytch.redcst import DefExpr, IdentifierExpr, LetExpr, VariablePattern
@@ -140,3 +145,92 @@ bar
             ],
         ),
     ]
+
+
+def test_scope() -> None:
+    file_info = FileInfo(
+        file_path="<stdin>",
+        source_code="""\
+let foo = 1
+let bar = 2
+let foo = 3
+foo
+""",
+    )
+    (syntax_tree, errors) = get_syntax_tree(file_info)
+    assert not errors
+    [foo1, bar, foo2] = Query(syntax_tree).find_instances(VariablePattern)
+
+    global_scope = Scope.of_mapping({"print": []})
+    scope1 = global_scope.extend({"foo": [foo1]})
+    scope2 = scope1.extend({"bar": [bar]})
+    scope3 = scope2.extend({"foo": [foo2]})
+
+    # Extending a scope doesn't modify the original.
+    assert dict(global_scope) == {"print": []}
+    assert dict(scope1) == {"print": [], "foo": [foo1]}
+    assert dict(scope3) == {"print": [], "foo": [foo2], "bar": [bar]}
+
+    # Shadowing a name keeps its original position.
+    assert list(scope3) == ["print", "foo", "bar"]
+    assert len(scope3) == 3
+    assert scope3.get("baz") is None
+
+
+def test_scope_suggestions() -> None:
+    names = ["foo", "fo", "food", "bar", "baz", "foobar", "oof", "f", "", "xyzzy"]
+    queries = names + ["fob", "ba", "fooo", "abc", "fxo", "xyzy", "zzz"]
+
+    # Add the names in several steps, so that suggestions are looked up both
+    # before and after more names are bound.
+    scopes = [Scope.of_mapping({})]
+    for i in range(0, len(names), 3):
+        scopes.append(scopes[-1].extend({name: [] for name in names[i : i + 3]}))
+    for scope in scopes:
+        for query in queries:
+            expected = [
+                name
+                for name in scope
+                if name != query and distance.levenshtein(query, name) <= 2
+            ]
+            suggestions = [
+                suggestion
+                for suggestion in scope.get_suggestions(query)
+                if suggestion != query
+            ]
+            assert suggestions == expected, query
+
+
+def test_suggestions_from_many_scopes(monkeypatch: Any) -> None:
+    num_defs = 200
+    file_info = FileInfo(
+        file_path="<stdin>",
+        source_code="".join(
+            f"def func{i}(arg{i}) =>\n  ag{i}\n" for i in range(num_defs)
+        ),
+    )
+    (syntax_tree, errors) = get_syntax_tree(file_info)
+    assert not errors
+
+    num_get_deletions_calls = 0
+    get_deletions = binder.get_deletions
+
+    def count_get_deletions(word: str, max_deletions: int) -> Set[str]:
+        nonlocal num_get_deletions_calls
+        num_get_deletions_calls += 1
+        return get_deletions(word, max_deletions)
+
+    monkeypatch.setattr(binder, "get_deletions", count_get_deletions)
+    bindation = bind(
+        file_info=file_info, syntax_tree=syntax_tree, global_scope=GLOBAL_SCOPE
+    )
+    assert len(bindation.errors) == num_defs
+    for (i, error) in enumerate(bindation.errors):
+        assert [note.message for note in error.notes] == [
+            f"Did you mean 'arg{i}', defined here?"
+        ]
+
+    # Each of the function and argument names, and the global names, should be
+    # indexed at most once, even though each function's scope is queried
+    # separately. Then each lookup of a misspelled name takes one more call.
+    assert num_get_deletions_calls <= 3 * num_defs + len(GLOBAL_SCOPE)
@@ -0,0 +1,84 @@
+import os
+from typing import Any
+
+from pytch import cache
+from pytch.repl import run_file
+from pytch.utils import FileInfo
+
+
+def test_cache(capsys: Any, tmp_path: Any, monkeypatch: Any) -> None:
+    file_path = str(tmp_path / "foo.pytch")
+    source_code = 'print("hello")\n'
+    with open(file_path, "w") as f:
+        f.write(source_code)
+    file_info = FileInfo(file_path=file_path, source_code=source_code)
+    assert cache.load_code(file_info) is None
+
+    run_file(file_info, use_cache=True)
+    assert capsys.readouterr().out == "hello\n"
+    cache_path = cache.get_cache_path(file_path)
+    assert cache_path is not None
+    assert os.listdir(os.path.dirname(cache_path)) == [os.path.basename(cache_path)]
+
+    # The second run doesn't compile the file.
+    def compile_file_to_code(*args: Any, **kwargs: Any) -> None:
+        assert False, "should have used the cached code"
+
+    monkeypatch.setattr("pytch.repl.compile_file_to_code", compile_file_to_code)
+    run_file(file_info, use_cache=True)
+    assert capsys.readouterr().out == "hello\n"
+    monkeypatch.undo()
+
+    # Changing the source code invalidates the cache.
+    changed_file_info = FileInfo(file_path=file_path, source_code='print("bye")\n')
+    assert cache.load_code(changed_file_info) is None
+    run_file(changed_file_info, use_cache=True)
+    assert capsys.readouterr().out == "bye\n"
+    assert cache.load_code(file_info) is None
+    assert cache.load_code(changed_file_info) is not None
+
+
+def test_cache_invalid(tmp_path: Any) -> None:
+    file_path = str(tmp_path / "foo.pytch")
+    file_info = FileInfo(file_path=file_path, source_code='print("hello")\n')
+    with open(file_path, "w") as f:
+        f.write(file_info.source_code)
+    cache_path = cache.get_cache_path(file_path)
+    assert cache_path is not None
+
+    os.makedirs(os.path.dirname(cache_path))
+    with open(cache_path, "wb") as f:
+        f.write(cache.get_cache_key(file_info) + b"not marshalled")
+    assert cache.load_code(file_info) is None
+
+    # Files which aren't on disk aren't cached.
+    stdin_file_info = FileInfo(file_path="<stdin>", source_code="")
+    assert cache.get_cache_path(stdin_file_info.file_path) is None
+    assert cache.load_code(stdin_file_info) is None
+
+
+def test_cache_compiler_changed(tmp_path: Any, monkeypatch: Any) -> None:
+    file_path = str(tmp_path / "foo.pytch")
+    file_info = FileInfo(file_path=file_path, source_code='print("hello")\n')
+    with open(file_path, "w") as f:
+        f.write(file_info.source_code)
+    cache.store_code(file_info, compile("", file_path, "exec"))
+    assert cache.load_code(file_info) is not None
+
+    # Changing any of the compiler's source files invalidates the cache.
+    monkeypatch.setattr(cache, "COMPILER_FINGERPRINT", b"different compiler")
+    assert cache.load_code(file_info) is None
+
+
+def test_cache_permissions(tmp_path: Any) -> None:
+    file_path = str(tmp_path / "foo.pytch")
+    file_info = FileInfo(file_path=file_path, source_code='print("hello")\n')
+    with open(file_path, "w") as f:
+        f.write(file_info.source_code)
+
+    for mode in [0o644, 0o660]:
+        os.chmod(file_path, mode)
+        cache.store_code(file_info, compile("", file_path, "exec"))
+        cache_path = cache.get_cache_path(file_path)
+        assert cache_path is not None
+        assert os.stat(cache_path).st_mode & 0o777 == mode
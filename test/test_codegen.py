@@ -1,11 +1,26 @@
-from typing import Any, Iterator, Optional
+import ast
+import io
+from typing import Any, Iterator, List, Optional, Tuple
 
 import pytest
 
 from pytch.__main__ import compile_file
+from pytch.binder import bind, GLOBAL_SCOPE as BINDER_GLOBAL_SCOPE
+from pytch.codegen import codegen, Scope
+from pytch.codegen.py3ast import (
+    Emitter,
+    PyAssignmentStmt,
+    PyFunctionStmt,
+    PyIdentifierExpr,
+    PyIfStmt,
+    PyLiteralExpr,
+    PyParameter,
+)
 from pytch.errors import get_error_lines
+from pytch.typesystem import typecheck
+from pytch.typesystem.builtins import GLOBAL_SCOPE as TYPESYSTEM_GLOBAL_SCOPE
 from pytch.utils import FileInfo
-from .utils import CaseInfo, CaseResult, find_tests, generate
+from .utils import CaseInfo, CaseResult, find_tests, generate, get_syntax_tree
 
 
 def get_codegen_tests() -> Iterator["pytest.mark.structures.ParameterSet[CaseInfo]"]:
@@ -43,3 +58,103 @@ def test_codegen(test_case_info: CaseInfo) -> None:
 @pytest.mark.generate
 def test_generate_codegen_tests() -> None:
     generate(get_codegen_tests(), make_result, capsys=None)
+
+
+def get_statement_positions(module: ast.Module) -> List[Tuple[int, int]]:
+    return [
+        (node.lineno, node.col_offset)
+        for node in ast.walk(module)
+        if isinstance(node, ast.stmt)
+    ]
+
+
+@pytest.mark.parametrize("test_case_info", get_codegen_tests())
+def test_compiled_module(test_case_info: CaseInfo) -> None:
+    file_info = FileInfo(
+        file_path=test_case_info.input_filename, source_code=test_case_info.input
+    )
+    (syntax_tree, errors) = get_syntax_tree(file_info=file_info)
+    bindation = bind(
+        file_info=file_info, syntax_tree=syntax_tree, global_scope=BINDER_GLOBAL_SCOPE
+    )
+    typeation = typecheck(
+        file_info=file_info,
+        syntax_tree=syntax_tree,
+        bindation=bindation,
+        global_scope=TYPESYSTEM_GLOBAL_SCOPE,
+    )
+    codegenation = codegen(
+        syntax_tree=syntax_tree, bindation=bindation, typeation=typeation
+    )
+
+    # Lowering to Python's AST should produce the same AST that Python would
+    # parse from the compiled output, with the statements on the same lines.
+    compiled_module = codegenation.get_compiled_module()
+    expected_module = ast.parse(codegenation.get_compiled_output())
+    assert ast.dump(compiled_module) == ast.dump(expected_module)
+    assert get_statement_positions(compiled_module) == get_statement_positions(
+        expected_module
+    )
+    codegenation.get_compiled_code()
+
+
+def test_emitter() -> None:
+    statement = PyFunctionStmt(
+        name="f",
+        parameters=[PyParameter(name="x")],
+        body_statements=[
+            PyIfStmt(
+                if_expr=PyIdentifierExpr(name="x"),
+                then_statements=[
+                    PyAssignmentStmt(
+                        lhs=PyIdentifierExpr(name="y"), rhs=PyLiteralExpr(value="1")
+                    )
+                ],
+                else_statements=[
+                    PyAssignmentStmt(
+                        lhs=PyIdentifierExpr(name="y"), rhs=PyLiteralExpr(value="2")
+                    )
+                ],
+            )
+        ],
+        return_expr=PyIdentifierExpr(name="y"),
+    )
+    stream = io.StringIO()
+    statement.emit(Emitter(stream))
+    assert (
+        stream.getvalue()
+        == """\
+def f(x):
+    if x:
+        y = 1
+    else:
+        y = 2
+    return y
+"""
+    )
+    assert statement.compile() == stream.getvalue().splitlines()
+
+
+def test_scope_allocate_name() -> None:
+    scope = Scope.empty()
+    names = []
+    for preferred_name in ["x", "x", "x2", "x", "class", "x"]:
+        (scope, name) = scope.allocate_name(preferred_name)
+        names.append(name)
+    assert names == ["x", "x2", "x22", "x3", "class2", "x4"]
+
+    # Scopes are persistent, so allocating a name doesn't affect the old scope.
+    empty_scope = Scope.empty()
+    (_, name) = empty_scope.allocate_name("x")
+    assert name == "x"
+    assert "x" not in empty_scope.used_names
+
+
+def test_lower_literal() -> None:
+    lowered = PyLiteralExpr(value="12").lower(lineno=1, col_offset=0)
+    assert isinstance(lowered, ast.Constant)
+    assert lowered.value == 12
+
+    # Non-ASCII digits aren't valid in Python integer literals.
+    with pytest.raises(SyntaxError):
+        PyLiteralExpr(value="١٢").lower(lineno=1, col_offset=0)
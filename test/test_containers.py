@@ -0,0 +1,85 @@
+import gc
+import random
+from typing import Dict, List, Union
+
+from pytch.containers import PMap, PSet, PVector
+
+
+class CollidingKey:
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CollidingKey) and other.value == self.value
+
+    def __hash__(self) -> int:
+        return self.value % 3
+
+
+def test_pvector_matches_list():
+    rng = random.Random(0)
+    expected: List[int] = []
+    vector: PVector[int] = PVector()
+    for i in range(3000):
+        if expected and rng.random() < 0.3:
+            index = rng.randrange(-len(expected), len(expected))
+            expected[index] = i
+            vector = vector.set(index, i)
+        else:
+            expected.append(i)
+            vector = vector.append(i)
+        if i % 250 == 0:
+            assert list(vector) == expected
+            assert [vector[j] for j in range(len(expected))] == expected
+            assert list(vector[1::7]) == expected[1::7]
+            assert list(PVector(expected)) == expected
+    assert len(vector) == len(expected)
+
+
+def test_pmap_matches_dict():
+    rng = random.Random(0)
+    keys: List[Union[int, str, CollidingKey]] = []
+    keys.extend(range(-100, 1000))
+    keys.extend(str(i) for i in range(100))
+    keys.extend(CollidingKey(i) for i in range(20))
+    expected: Dict[Union[int, str, CollidingKey], int] = {}
+    mapping: PMap[Union[int, str, CollidingKey], int] = PMap()
+    for i in range(5000):
+        key = rng.choice(keys)
+        if rng.random() < 0.3:
+            expected.pop(key, None)
+            mapping = mapping.remove(key)
+        else:
+            expected[key] = i
+            mapping = mapping.set(key, i)
+        if i % 500 == 0:
+            assert dict(mapping.items()) == expected
+            assert all((key in mapping) == (key in expected) for key in keys)
+    assert len(mapping) == len(expected)
+    assert dict(PMap(expected).items()) == expected
+    assert mapping.update({"foo": 1})["foo"] == 1
+    assert "foo" not in mapping
+
+
+def test_pset():
+    pset = PSet([1, 2]).add(3).add(2)
+    assert pset == {1, 2, 3}
+    assert len(pset) == 3
+
+
+def test_updates_share_nodes_with_previous_version():
+    vector: PVector[int] = PVector(range(10000))
+    mapping: PMap[int, int] = PMap({i: i for i in range(10000)})
+    gc.collect()
+    gc.freeze()
+    try:
+        # Only the nodes on the path to the updated element should be new, so
+        # that the garbage collector doesn't traverse the whole container.
+        new_vector = vector.set(5000, 0).append(0)
+        new_mapping = mapping.set(5000, 0).remove(1)
+        young_objects = gc.get_objects(generation=0)
+        assert sum(len(gc.get_referents(x)) for x in young_objects) < 1000
+    finally:
+        gc.unfreeze()
+    assert new_vector[5000] == 0
+    assert new_mapping[5000] == 0
@@ -1,6 +1,15 @@
 from pytch.cstquery import Query
-from pytch.redcst import LetExpr
-from pytch.utils import FileInfo
+from pytch.redcst import (
+    ArgumentList,
+    DefExpr,
+    Expr,
+    IntLiteralExpr,
+    LetExpr,
+    Node,
+    VariablePattern,
+    Visitor,
+)
+from pytch.utils import FileInfo, OffsetRange
 from .utils import get_syntax_tree
 
 
@@ -29,3 +38,152 @@ let foo =
     )
     (syntax_tree, errors) = get_syntax_tree(file_info)
     assert errors
+
+
+def test_visitor() -> None:
+    file_info = FileInfo(
+        file_path="dummy.pytch",
+        source_code="""\
+let foo =
+  let bar = 3
+  bar
+""",
+    )
+    (syntax_tree, errors) = get_syntax_tree(file_info)
+    assert not errors
+
+    class DescribeVisitor(Visitor[str]):
+        def visit_int_literal_expr(self, node: IntLiteralExpr, prefix: str) -> str:
+            return prefix + "int literal"
+
+        def visit_expr(self, node: Expr, prefix: str) -> str:
+            return prefix + "expr"
+
+        def visit_node(self, node: Node, prefix: str) -> str:
+            return prefix + "node"
+
+    visitor = DescribeVisitor()
+    let_exprs = list(Query(syntax_tree).find_instances(LetExpr))
+    int_literal_exprs = list(Query(syntax_tree).find_instances(IntLiteralExpr))
+    assert visitor.visit(syntax_tree, "> ") == "> node"
+    assert visitor.visit(let_exprs[0], "> ") == "> expr"
+    assert visitor.visit(int_literal_exprs[0], "> ") == "> int literal"
+
+
+def test_child_offsets() -> None:
+    file_info = FileInfo(
+        file_path="dummy.pytch",
+        source_code="""\
+def f(a, b) =>
+  a + b
+let foo =
+  let bar = f(1, 2)
+  bar
+""",
+    )
+    (syntax_tree, errors) = get_syntax_tree(file_info)
+    assert not errors
+
+    # Walking down the spine only constructs the nodes which are visited.
+    n_def = syntax_tree.n_expr
+    assert isinstance(n_def, DefExpr)
+    n_let = n_def.n_next
+    assert isinstance(n_let, LetExpr)
+    assert list(n_def.iter_materialized_children()) == [n_let]
+    assert n_let.offset_range == OffsetRange(start=23, end=58)
+
+    for node in Query(syntax_tree).find_instances(Node):
+        offset = node.offset
+        for child in node.children:
+            if isinstance(child, Node):
+                assert child.offset == offset
+            if child is not None:
+                offset += child.full_width
+
+
+def test_find_node_at_offset() -> None:
+    file_info = FileInfo(
+        file_path="dummy.pytch",
+        source_code="""\
+def f(a, b) =>
+  a + b
+let foo =
+  let bar = f(1, 2)
+  bar
+""",
+    )
+    (syntax_tree, errors) = get_syntax_tree(file_info)
+    assert not errors
+
+    offset = file_info.source_code.index("bar")
+    node = syntax_tree.find_node_at_offset(offset)
+    assert isinstance(node, VariablePattern)
+    assert node.text == "bar"
+    token = syntax_tree.find_token_at_offset(offset)
+    assert token is not None
+    assert token.text == "bar"
+
+    # Only the nodes on the path to the result are constructed.
+    n_def = syntax_tree.n_expr
+    assert isinstance(n_def, DefExpr)
+    assert list(n_def.iter_materialized_children()) == [n_def.n_next]
+
+    # Parameters are found inside of their parameter list.
+    offset = file_info.source_code.index("b)")
+    node = syntax_tree.find_node_at_offset(offset)
+    assert isinstance(node, VariablePattern)
+    assert node.text == "b"
+
+    # Offsets in between tokens are part of the trivia of one of them.
+    token = syntax_tree.find_token_at_offset(file_info.source_code.index(" =>"))
+    assert token is not None
+    assert token.text == "=>"
+
+    # Only the element of a sequence which contains the offset is constructed.
+    offset = file_info.source_code.index("2)")
+    node = syntax_tree.find_node_at_offset(offset)
+    assert node is not None
+    assert node.text == "2"
+    argument = node.parent
+    assert argument is not None
+    argument_list = argument.parent
+    assert isinstance(argument_list, ArgumentList)
+    assert list(argument_list.iter_materialized_children()) == [argument]
+    arguments = argument_list.arguments
+    assert arguments is not None
+    assert arguments[1] is argument
+    assert list(argument_list.iter_materialized_children()) == arguments
+
+    assert syntax_tree.find_node_at_offset(-1) is None
+    assert syntax_tree.find_node_at_offset(len(file_info.source_code) + 1) is None
+
+    # Check every offset against a walk of the whole tree.
+    for offset in range(len(file_info.source_code)):
+        innermost_node = None
+        for node in Query(syntax_tree).find_instances(Node):
+            if node.offset <= offset < node.offset + node.full_width:
+                innermost_node = node
+        assert syntax_tree.find_node_at_offset(offset) is innermost_node
+
+
+def test_find_nodes_in_range() -> None:
+    file_info = FileInfo(
+        file_path="dummy.pytch",
+        source_code="""\
+let foo =
+  let bar = f(1, 2)
+  bar
+""",
+    )
+    (syntax_tree, errors) = get_syntax_tree(file_info)
+    assert not errors
+
+    start = file_info.source_code.index("= f")
+    end = file_info.source_code.index(", 2") + len(", 2")
+    nodes = syntax_tree.find_nodes_in_range(OffsetRange(start=start, end=end))
+    assert [node.text for node in nodes] == ["f", "1,", "2"]
+
+    nodes = syntax_tree.find_nodes_in_range(
+        OffsetRange(start=0, end=len(file_info.source_code))
+    )
+    assert nodes == [syntax_tree]
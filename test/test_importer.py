@@ -0,0 +1,59 @@
+import importlib
+import os
+import sys
+from typing import Any, Iterator
+
+import pytest
+
+from pytch import cache, importer
+
+
+@pytest.fixture
+def pytch_path(tmp_path: Any, monkeypatch: Any) -> Iterator[Any]:
+    monkeypatch.syspath_prepend(str(tmp_path))
+    importer.install()
+    try:
+        yield tmp_path
+    finally:
+        importer.uninstall()
+        for module_name in ["pytch_importer_test", "pytch_importer_error_test"]:
+            sys.modules.pop(module_name, None)
+
+
+def test_import(capsys: Any, pytch_path: Any) -> None:
+    file_path = str(pytch_path / "pytch_importer_test.pytch")
+    with open(file_path, "w") as f:
+        f.write(
+            """\
+def add(x, y) =>
+  x + y
+print(add(1, 2))
+"""
+        )
+
+    module = importlib.import_module("pytch_importer_test")
+    assert capsys.readouterr().out == "3\n"
+    assert module.__file__ == file_path
+    assert module.add(3, 4) == 7
+    assert module.add.__code__.co_filename == file_path
+    assert module.__loader__.get_filename("pytch_importer_test") == file_path
+    assert module.__loader__.get_source("pytch_importer_test").startswith("def add")
+
+    cache_path = cache.get_cache_path(file_path)
+    assert cache_path is not None
+    assert os.path.isfile(cache_path)
+
+    # The cached code also records the path of the file.
+    del sys.modules["pytch_importer_test"]
+    module = importlib.import_module("pytch_importer_test")
+    assert capsys.readouterr().out == "3\n"
+    assert module.add.__code__.co_filename == file_path
+
+
+def test_import_error(pytch_path: Any) -> None:
+    with open(pytch_path / "pytch_importer_error_test.pytch", "w") as f:
+        f.write("let foo =\n")
+
+    with pytest.raises(ImportError) as excinfo:
+        importlib.import_module("pytch_importer_error_test")
+    assert "could not compile" in str(excinfo.value)
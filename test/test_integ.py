@@ -1,3 +1,4 @@
+import sys
 from typing import Any, Iterator
 
 import pytest
@@ -29,3 +30,14 @@ def test_integ(capsys: Any, test_case_info: CaseInfo) -> None:
 @pytest.mark.generate
 def test_generate_integ_tests(capsys: Any) -> None:
     generate(get_integ_tests(), make_result, capsys=capsys)
+
+
+def test_deep_program(capsys: Any) -> None:
+    # Each binding nests the rest of the program inside of it, so this would
+    # exceed the recursion limit if any phase recursed on the syntax tree.
+    num_bindings = sys.getrecursionlimit() + 1
+    source_code = "".join(f"let x{i} = {i}\n" for i in range(num_bindings))
+    source_code += f"print(x{num_bindings - 1})\n"
+    result = make_result("deep.pytch", source_code, capsys)
+    assert result.error is None
+    assert result.output == f"{num_bindings - 1}\n"
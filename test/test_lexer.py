@@ -1,11 +1,13 @@
+import pickle
+import random
 from typing import Any, Iterator, List, Optional
 
 import pytest
 
 from pytch.errors import Error, get_error_lines
-from pytch.lexer import lex, Token
+from pytch.lexer import lex, relex, Token
 from pytch.utils import FileInfo
-from .utils import CaseInfo, CaseResult, find_tests, generate
+from .utils import CaseInfo, CaseResult, find_tests, generate, make_random_edit
 
 
 def render_token_stream(tokens: List[Token]) -> str:
@@ -61,3 +63,56 @@ def test_lexer(test_case_info: CaseInfo) -> None:
 @pytest.mark.generate
 def test_generate_lexer_tests() -> None:
     generate(get_lexer_tests(), make_result, capsys=None)
+
+
+def test_token_stream_round_trips() -> None:
+    source_code = """\
+let foo = "bar"  # comment
+  if foo then
+    1
+  else 2
+print(foo)
+"""
+    file_info = FileInfo(file_path="dummy.pytch", source_code=source_code)
+    tokens = lex(file_info=file_info).tokens
+    assert "".join(token.full_text for token in tokens) == source_code
+    for (i, token) in enumerate(tokens):
+        assert tokens.get_kind(i) == token.kind
+        assert tokens.get_full_width(i) == token.full_width
+        assert tokens.get_leading_width(i) == token.leading_width
+        assert tokens.is_followed_by_newline(i) == token.is_followed_by_newline
+
+    unpickled_tokens = pickle.loads(pickle.dumps(tokens))
+    assert list(unpickled_tokens) == list(tokens)
+
+
+@pytest.mark.parametrize("test_case_info", get_lexer_tests())
+def test_relex(test_case_info: CaseInfo) -> None:
+    file_info = FileInfo(
+        file_path=test_case_info.input_filename, source_code=test_case_info.input
+    )
+    lexation = lex(file_info=file_info)
+    rng = random.Random(test_case_info.input_filename)
+    replacements = ["", "x", " ", "\n", "let ", "if", '"', "#", "(", "  foo\n"]
+    for _ in range(20):
+        edit = make_random_edit(rng, file_info.source_code, replacements)
+        old_tokens = lexation.tokens
+        (file_info, lexation) = relex(lexation=lexation, file_info=file_info, edit=edit)
+        expected_lexation = lex(file_info=file_info)
+        assert list(lexation.tokens) == list(expected_lexation.tokens)
+        assert lexation.errors == expected_lexation.errors
+
+        # The tokens outside of the changed range are the same as before.
+        tokens = lexation.tokens
+        changed_tokens = lexation.changed_tokens
+        assert changed_tokens is not None
+        assert 0 <= changed_tokens.start <= changed_tokens.end <= len(tokens)
+        assert tokens.matches(old_tokens, 0, changed_tokens.start, 0)
+        index_delta = len(tokens) - len(old_tokens)
+        assert tokens.matches(
+            old_tokens,
+            changed_tokens.end,
+            len(tokens),
+            changed_tokens.end - index_delta,
+            offset_delta=edit.offset_delta,
+        )
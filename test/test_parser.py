@@ -1,12 +1,15 @@
+import random
+import sys
 from typing import Any, Iterator, List, Optional
 
 import pytest
 
 from pytch.errors import Error, get_error_lines
-from pytch.lexer import lex
-from pytch.parser import dump_syntax_tree, parse
-from pytch.utils import FileInfo
-from .utils import CaseInfo, CaseResult, find_tests, generate
+from pytch.greencst import IfExpr, LetExpr, Node
+from pytch.lexer import lex, relex
+from pytch.parser import dump_syntax_tree, parse, Parser, reparse, walk_tokens
+from pytch.utils import FileInfo, OffsetRange, TextEdit
+from .utils import CaseInfo, CaseResult, find_tests, generate, make_random_edit
 
 
 def get_parser_tests() -> Iterator["pytest.mark.structures.ParameterSet[CaseInfo]"]:
@@ -48,3 +51,176 @@ def test_parser(test_case_info: CaseInfo) -> None:
 @pytest.mark.generate
 def test_generate_parser_tests() -> None:
     generate(get_parser_tests(), make_result, capsys=None)
+
+
+def test_cached_widths() -> None:
+    source_code = "".join(f'let x{i} = f({i}, "s")\n' for i in range(50)) + "x0\n"
+    file_info = FileInfo(file_path="dummy.pytch", source_code=source_code)
+    lexation = lex(file_info=file_info)
+    parsation = parse(file_info=file_info, tokens=lexation.tokens)
+
+    def check(node: Node) -> None:
+        tokens = list(walk_tokens(node))
+        present_tokens = [token for token in tokens if not token.is_dummy]
+        assert node.full_width == sum(token.full_width for token in tokens)
+        if present_tokens:
+            assert node.first_present_child is present_tokens[0]
+            assert node.last_present_child is present_tokens[-1]
+            assert node.leading_width == present_tokens[0].leading_width
+            assert node.trailing_width == present_tokens[-1].trailing_width
+        for child in node.children:
+            if isinstance(child, Node):
+                check(child)
+
+    check(parsation.green_cst)
+    assert parsation.green_cst.full_width == len(source_code)
+
+
+@pytest.mark.parametrize("test_case_info", get_parser_tests())
+def test_reparse(test_case_info: CaseInfo) -> None:
+    file_info = FileInfo(
+        file_path=test_case_info.input_filename, source_code=test_case_info.input
+    )
+    lexation = lex(file_info=file_info)
+    parsation = parse(file_info=file_info, tokens=lexation.tokens)
+    rng = random.Random(test_case_info.input_filename)
+    replacements = ["", "x", "1", " ", "\n", "(", " + 2", "let ", "if", "  foo\n"]
+    for _ in range(20):
+        edit = make_random_edit(rng, file_info.source_code, replacements)
+        old_tokens = lexation.tokens
+        (file_info, lexation) = relex(lexation=lexation, file_info=file_info, edit=edit)
+        expected_parsation = parse(file_info=file_info, tokens=lexation.tokens)
+        expected_tree = dump_syntax_tree(
+            file_info.source_code, expected_parsation.green_cst
+        )
+        for changed_tokens in [None, lexation.changed_tokens]:
+            new_parsation = reparse(
+                parsation=parsation,
+                old_tokens=old_tokens,
+                file_info=file_info,
+                tokens=lexation.tokens,
+                edit=edit,
+                changed_tokens=changed_tokens,
+            )
+            assert (
+                dump_syntax_tree(file_info.source_code, new_parsation.green_cst)
+                == expected_tree
+            )
+            assert new_parsation.errors == expected_parsation.errors
+        parsation = new_parsation
+
+
+def test_reparse_reuses_subtrees() -> None:
+    source_code = """\
+let foo = f(1, 2)
+let bar =
+  if foo then
+    2
+  else
+    3
+print(bar)
+"""
+    file_info = FileInfo(file_path="dummy.pytch", source_code=source_code)
+    lexation = lex(file_info=file_info)
+    parsation = parse(file_info=file_info, tokens=lexation.tokens)
+    assert not parsation.errors
+
+    offset = source_code.index("2\n")
+    edit = TextEdit(
+        offset_range=OffsetRange(start=offset, end=offset + 1), replacement="foo + 4"
+    )
+    (new_file_info, new_lexation) = relex(
+        lexation=lexation, file_info=file_info, edit=edit
+    )
+    new_parsation = reparse(
+        parsation=parsation,
+        old_tokens=lexation.tokens,
+        file_info=new_file_info,
+        tokens=new_lexation.tokens,
+        edit=edit,
+    )
+    expected_parsation = parse(file_info=new_file_info, tokens=new_lexation.tokens)
+    assert dump_syntax_tree(
+        new_file_info.source_code, new_parsation.green_cst
+    ) == dump_syntax_tree(new_file_info.source_code, expected_parsation.green_cst)
+    assert not new_parsation.errors
+
+    old_foo = parsation.green_cst.n_expr
+    new_foo = new_parsation.green_cst.n_expr
+    assert isinstance(old_foo, LetExpr) and isinstance(new_foo, LetExpr)
+    assert new_foo is not old_foo
+    assert new_foo.n_value is old_foo.n_value
+
+    old_bar = old_foo.n_body
+    new_bar = new_foo.n_body
+    assert isinstance(old_bar, LetExpr) and isinstance(new_bar, LetExpr)
+    assert new_bar.n_body is old_bar.n_body
+    assert isinstance(old_bar.n_value, IfExpr) and isinstance(new_bar.n_value, IfExpr)
+    assert new_bar.n_value.n_if_expr is old_bar.n_value.n_if_expr
+    assert new_bar.n_value.n_then_expr is not old_bar.n_value.n_then_expr
+    assert new_bar.n_value.n_else_expr is old_bar.n_value.n_else_expr
+
+
+def test_deep_syntax_tree() -> None:
+    # Each binding nests the rest of the program inside of it, so this would
+    # exceed the recursion limit if parsing recursed on the syntax tree.
+    num_bindings = sys.getrecursionlimit() + 1
+    source_code = "".join(f"let x{i} = {i}\n" for i in range(num_bindings)) + "x0\n"
+    file_info = FileInfo(file_path="dummy.pytch", source_code=source_code)
+    lexation = lex(file_info=file_info)
+    parsation = parse(file_info=file_info, tokens=lexation.tokens)
+    assert not parsation.errors
+
+    assert list(walk_tokens(parsation.green_cst)) == list(lexation.tokens)
+    (offset, rendered_st_lines) = dump_syntax_tree(source_code, parsation.green_cst)
+    assert offset == len(source_code)
+    assert "    " * (num_bindings + 2) + "Token 'x0'" in rendered_st_lines
+
+
+def test_reparse_deep_syntax_tree() -> None:
+    class CountingParser(Parser):
+        num_atoms = 0
+
+        def parse_atom(self, state: Any, allow_naked_bindings: bool) -> Any:
+            self.num_atoms += 1
+            return super().parse_atom(state, allow_naked_bindings)
+
+    # There's a syntax error at the end of the file, but the rest of the file
+    # can still be reparsed incrementally.
+    num_bindings = sys.getrecursionlimit() + 1
+    source_code = (
+        "".join(f"let x{i} = {i}\n" for i in range(num_bindings)) + "x0 + (\n"
+    )
+    file_info = FileInfo(file_path="dummy.pytch", source_code=source_code)
+    lexation = lex(file_info=file_info)
+    full_parser = CountingParser()
+    parsation = full_parser.parse(file_info=file_info, tokens=lexation.tokens)
+    assert parsation.errors
+
+    value = str(num_bindings // 2)
+    offset = source_code.index(f"= {value}\n") + 2
+    edit = TextEdit(
+        offset_range=OffsetRange(start=offset, end=offset + len(value)),
+        replacement="foo(1)",
+    )
+    (new_file_info, new_lexation) = relex(
+        lexation=lexation, file_info=file_info, edit=edit
+    )
+    parser = CountingParser()
+    new_parsation = parser.reparse(
+        parsation=parsation,
+        old_tokens=lexation.tokens,
+        file_info=new_file_info,
+        tokens=new_lexation.tokens,
+        edit=edit,
+        changed_tokens=new_lexation.changed_tokens,
+    )
+    expected_parsation = parse(file_info=new_file_info, tokens=new_lexation.tokens)
+    assert dump_syntax_tree(
+        new_file_info.source_code, new_parsation.green_cst
+    ) == dump_syntax_tree(new_file_info.source_code, expected_parsation.green_cst)
+    assert new_parsation.errors == expected_parsation.errors
+
+    # Only the edited expression was parsed again, rather than the whole file.
+    assert full_parser.num_atoms > num_bindings
+    assert parser.num_atoms < 10
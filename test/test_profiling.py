@@ -0,0 +1,87 @@
+import json
+from typing import List
+
+from click.testing import CliRunner
+
+from pytch.__main__ import cli
+from pytch.profiling import add_profile_hook, Profile, Profiler, remove_profile_hook
+from pytch.repl import compile_file
+from pytch.utils import FileInfo
+
+
+SOURCE_CODE = """\
+def f(x) =>
+  x + 1
+let y = f(2)
+print(y)
+"""
+
+PHASES = ["lex", "preparse", "parse", "bind", "typecheck", "codegen"]
+
+
+def test_profiler_records_phases() -> None:
+    file_info = FileInfo(file_path="dummy.pytch", source_code=SOURCE_CODE)
+    profiler = Profiler(file_path=file_info.file_path, trace_memory=True)
+    (compiled_output, errors) = compile_file(file_info=file_info, profiler=profiler)
+    assert compiled_output is not None
+    assert errors == []
+
+    profile = profiler.finish()
+    assert profile.file_path == "dummy.pytch"
+    assert [phase.phase for phase in profile.phases] == PHASES
+    for phase in profile.phases:
+        assert phase.wall_time >= 0
+        assert phase.cpu_time >= 0
+        assert phase.peak_memory is not None
+        assert phase.counters.get("errors", 0) == 0
+
+    counters = {phase.phase: phase.counters for phase in profile.phases}
+    assert counters["lex"]["tokens"] > 0
+    assert counters["parse"]["green_nodes"] > 0
+    assert counters["bind"]["red_nodes"] > 0
+    assert counters["typecheck"]["judgments"] > 0
+
+    # Make sure that the profile can be serialized.
+    json.dumps(profile.to_json())
+    assert profile.get_table_lines()[0] == "Profile for dummy.pytch:"
+
+
+def test_profile_hook() -> None:
+    profiles: List[Profile] = []
+    add_profile_hook(profiles.append)
+    try:
+        compile_file(FileInfo(file_path="dummy.pytch", source_code=SOURCE_CODE))
+    finally:
+        remove_profile_hook(profiles.append)
+    compile_file(FileInfo(file_path="dummy.pytch", source_code=SOURCE_CODE))
+
+    assert len(profiles) == 1
+    assert [phase.phase for phase in profiles[0].phases] == PHASES
+    # Memory isn't traced unless asked for, since it slows down the compiler.
+    assert all(phase.peak_memory is None for phase in profiles[0].phases)
+
+
+def test_profile_cli() -> None:
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open("dummy.pytch", "w") as f:
+            f.write(SOURCE_CODE)
+        result = runner.invoke(
+            cli,
+            [
+                "run",
+                "--profile-json",
+                "profile.json",
+                "--profile-memory",
+                "dummy.pytch",
+            ],
+        )
+        assert result.exit_code == 0
+        assert result.output == "3\n"
+        with open("profile.json") as f:
+            profiles = json.load(f)
+
+    assert len(profiles) == 1
+    assert profiles[0]["file_path"] == "dummy.pytch"
+    assert [phase["phase"] for phase in profiles[0]["phases"]] == PHASES
+    assert all(phase["peak_memory"] is not None for phase in profiles[0]["phases"])
@@ -1,21 +1,37 @@
 from typing import Any, Iterator, List, Optional
 
+import attr
+from click.testing import CliRunner
 import pytest
 
+from pytch.__main__ import cli
+
 from pytch.binder import bind, GLOBAL_SCOPE as BINDER_GLOBAL_SCOPE
 from pytch.containers import PVector
 from pytch.cstquery import Query
 from pytch.errors import Error, get_error_lines
-from pytch.redcst import Expr, FunctionCallExpr
+from pytch.redcst import Expr, FunctionCallExpr, VariablePattern
 from pytch.typesystem import typecheck
 from pytch.typesystem.builtins import (
     FunctionTy,
     GLOBAL_SCOPE as TYPE_SYSTEM_GLOBAL_SCOPE,
+    INT_TY,
     NONE_TY,
+    STR_TY,
     TyVar,
     UniversalTy,
 )
-from pytch.typesystem.reason import BuiltinReason
+from pytch.typesystem.judgments import DeclareExistentialVarJudgment
+from pytch.typesystem.reason import (
+    BuiltinReason,
+    EqualTysReason,
+    SUBTYPE_OF_OBJECT_REASON,
+    TodoReason,
+    UNEXPLAINED_REASON,
+)
+from pytch.typesystem.solver import ExistentialSolver
+from pytch.typesystem.typecheck import check_subtype, Env, TypingContext
+from pytch.typesystem.types import BaseTy, ExistentialTyVar
 from pytch.utils import FileInfo
 from .utils import CaseInfo, CaseResult, find_tests, generate, get_syntax_tree
 
@@ -118,3 +134,149 @@ def test_typesystem(test_case_info: CaseInfo) -> None:
 @pytest.mark.generate
 def test_generate_typesystem_tests() -> None:
     generate(get_typesystem_tests(), make_result, capsys=None)
+
+
+def test_typing_context() -> None:
+    file_info = FileInfo(file_path="<stdin>", source_code="let foo = 1\nlet bar = 2\n")
+    (syntax_tree, errors) = get_syntax_tree(file_info=file_info)
+    assert not errors
+    [foo, bar] = Query(syntax_tree=syntax_tree).find_instances(VariablePattern)
+
+    existential_ty_var = ExistentialTyVar(name="foo", reason=TodoReason(todo="foo"))
+    declaration = DeclareExistentialVarJudgment(existential_ty_var=existential_ty_var)
+    ctx = TypingContext()
+    ctx = ctx.add_pattern_ty(pattern=foo, ty=INT_TY)
+    ctx = ctx.add_judgment(declaration)
+    ctx = ctx.add_pattern_ty(pattern=bar, ty=STR_TY)
+    assert ctx.get_pattern_ty(foo) is INT_TY
+    assert ctx.get_pattern_ty(bar) is STR_TY
+    assert ctx.apply_as_substitution(existential_ty_var) is existential_ty_var
+
+    solved_ctx = ctx.instantiate_existential(existential_ty_var, to=INT_TY)
+    assert solved_ctx.apply_as_substitution(existential_ty_var) is INT_TY
+    assert ctx.apply_as_substitution(existential_ty_var) is existential_ty_var
+
+    # The solution goes out of scope along with the declaration.
+    for original_ctx in [ctx, solved_ctx]:
+        truncated_ctx = original_ctx.take_until_before_judgment(declaration)
+        assert truncated_ctx.num_judgments == 1
+        assert truncated_ctx.get_pattern_ty(foo) is INT_TY
+        assert truncated_ctx.get_pattern_ty(bar) is None
+        assert truncated_ctx.apply_as_substitution(existential_ty_var) is (
+            existential_ty_var
+        )
+
+        # Judgments added after truncating replace the ones which were removed.
+        readded_ctx = truncated_ctx.add_pattern_ty(pattern=bar, ty=INT_TY)
+        assert readded_ctx.get_pattern_ty(bar) is INT_TY
+        assert original_ctx.get_pattern_ty(bar) is STR_TY
+
+
+def test_typing_context_existential_solutions() -> None:
+    [foo, bar, baz] = [
+        ExistentialTyVar(name=name, reason=TodoReason(todo=name))
+        for name in ["foo", "bar", "baz"]
+    ]
+    ctx = TypingContext()
+    for existential_ty_var in [foo, bar, baz]:
+        ctx = ctx.add_judgment(
+            DeclareExistentialVarJudgment(existential_ty_var=existential_ty_var)
+        )
+
+    ctx = ctx.instantiate_existential(baz, to=bar)
+    assert ctx.apply_as_substitution(baz) is bar
+    ctx = ctx.instantiate_existential(bar, to=foo)
+    assert ctx.apply_as_substitution(baz) is foo
+    ctx = ctx.instantiate_existential(foo, to=INT_TY)
+    for existential_ty_var in [foo, bar, baz]:
+        assert ctx.apply_as_substitution(existential_ty_var) is INT_TY
+
+    # Solutions are only recorded for the first instantiation.
+    ctx = ctx.instantiate_existential(baz, to=STR_TY)
+    assert ctx.apply_as_substitution(baz) is INT_TY
+
+    # Redeclaring an existential type variable after it's gone out of scope
+    # discards its old solution.
+    ctx = ctx.take_until_before_judgment(
+        DeclareExistentialVarJudgment(existential_ty_var=bar)
+    )
+    assert ctx.apply_as_substitution(baz) is baz
+    ctx = ctx.add_judgment(DeclareExistentialVarJudgment(existential_ty_var=baz))
+    assert ctx.apply_as_substitution(foo) is INT_TY
+    assert ctx.apply_as_substitution(baz) is baz
+
+
+def test_existential_solver() -> None:
+    solver = ExistentialSolver()
+    for (child, parent) in [(1, 0), (2, 1), (3, 2)]:
+        solver = solver.union(child, parent)
+    assert solver.find(3) == 0
+
+    (compressed_solver, root) = solver.compress(3)
+    assert root == 0
+    assert compressed_solver.parents[3] == 0
+    assert compressed_solver.parents[2] == 0
+
+    # The solution for a set is kept when it's merged into an earlier set.
+    solver = ExistentialSolver().solve(5, INT_TY).union(5, 4)
+    assert solver.get_solution(4) is INT_TY
+    assert solver.declare(4).get_solution(4) is None
+
+
+def test_interned_tys() -> None:
+    assert BaseTy(name="int", reason=BuiltinReason(name="int")) is INT_TY
+    assert BaseTy(name="int", reason=BuiltinReason(name="other")) is INT_TY
+    assert BaseTy(name="other", reason=BuiltinReason(name="int")) is not INT_TY
+
+    reason = TodoReason(todo="function")
+    function_ty = FunctionTy(domain=PVector([INT_TY]), codomain=STR_TY, reason=reason)
+    assert (
+        FunctionTy(domain=PVector([INT_TY]), codomain=STR_TY, reason=reason)
+        is function_ty
+    )
+    assert (
+        FunctionTy(
+            domain=PVector([INT_TY]),
+            codomain=STR_TY,
+            reason=TodoReason(todo="other function"),
+        )
+        is function_ty
+    )
+    assert not function_ty.has_existentials
+    assert TypingContext().apply_as_substitution(function_ty) is function_ty
+
+    existential_ty_var = ExistentialTyVar(name="foo", reason=reason)
+    assert existential_ty_var != ExistentialTyVar(name="foo", reason=reason)
+    assert FunctionTy(
+        domain=PVector([existential_ty_var]), codomain=STR_TY, reason=reason
+    ).has_existentials
+
+
+def test_explain_reasons() -> None:
+    file_info = FileInfo(file_path="<stdin>", source_code="")
+    env = Env(
+        file_info=file_info,
+        bindation=bind(
+            file_info=file_info,
+            syntax_tree=get_syntax_tree(file_info=file_info)[0],
+            global_scope=BINDER_GLOBAL_SCOPE,
+        ),
+        global_scope=TYPE_SYSTEM_GLOBAL_SCOPE,
+        errors=PVector(),
+    )
+    (_env, _ctx, reason) = check_subtype(env, TypingContext(), lhs=INT_TY, rhs=INT_TY)
+    assert reason is UNEXPLAINED_REASON
+
+    env = attr.evolve(env, explain_reasons=True)
+    (_env, _ctx, reason) = check_subtype(env, TypingContext(), lhs=INT_TY, rhs=INT_TY)
+    assert reason == EqualTysReason(lhs=INT_TY, rhs=INT_TY)
+
+
+def test_explain_reasons_cli() -> None:
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open("dummy.pytch", "w") as f:
+            f.write("let x = 1\nprint(x)\n")
+        result = runner.invoke(cli, ["compile", "--explain-reasons", "dummy.pytch"])
+    assert result.exit_code == 0
+    assert f"dummy.pytch:2:7: {SUBTYPE_OF_OBJECT_REASON}\n" in result.output
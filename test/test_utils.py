@@ -1,4 +1,11 @@
-from pytch.utils import FileInfo, OffsetRange, Position, Range
+from pytch.utils import (
+    FileInfo,
+    MaybeTrampoline,
+    OffsetRange,
+    Position,
+    Range,
+    run_trampoline,
+)
 
 
 def slower_get_position_for_offset(source_code: str, offset: int) -> Position:
@@ -71,3 +78,48 @@ qux
     assert range == Range(
         start=Position(line=0, character=0), end=Position(line=3, character=0)
     )
+
+
+def test_fileinfo_get_positions_for_offsets():
+    source_code = """foo
+
+barbaz
+qux
+"""
+    file_info = FileInfo(file_path="dummy", source_code=source_code)
+
+    offsets = [0, 0, 2, 3, 4, 5, 8, 12, 15, len(source_code)]
+    assert file_info.get_positions_for_offsets(offsets) == [
+        slower_get_position_for_offset(source_code=source_code, offset=offset)
+        for offset in offsets
+    ]
+
+
+def test_fileinfo_get_offset_for_position():
+    for source_code in ["", "\n", "foo", "foo\n\nbarbaz\nqux", "foo\n\nbarbaz\nqux\n"]:
+        file_info = FileInfo(file_path="dummy", source_code=source_code)
+        for offset in range(len(source_code) + 1):
+            position = file_info.get_position_for_offset(offset)
+            assert position == slower_get_position_for_offset(
+                source_code=source_code, offset=offset
+            )
+            assert file_info.get_offset_for_position(position) == offset
+
+    file_info = FileInfo(file_path="dummy", source_code="foo\nbar\n")
+    assert file_info.get_offset_range_from_range(
+        Range(start=Position(line=0, character=3), end=Position(line=2, character=0))
+    ) == OffsetRange(start=3, end=8)
+
+
+def test_run_trampoline_plain_results():
+    def count_down(n: int) -> MaybeTrampoline[int]:
+        if n == 0:
+            return 0
+        return count_down_generator(n)
+
+    def count_down_generator(n: int):
+        result = yield count_down(n - 1)
+        return result + 1
+
+    assert run_trampoline(count_down(0)) == 0
+    assert run_trampoline(count_down(10000)) == 10000
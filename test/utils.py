@@ -1,4 +1,5 @@
 import os.path
+import random
 from typing import Any, Callable, Iterator, List, Optional, Tuple
 
 import pytest
@@ -7,7 +8,7 @@ from pytch.errors import Error
 from pytch.lexer import lex
 from pytch.parser import parse
 from pytch.redcst import SyntaxTree
-from pytch.utils import FileInfo
+from pytch.utils import FileInfo, OffsetRange, TextEdit
 
 
 # Note that we can't call this `TestCaseInfo` because then it would be
@@ -160,3 +161,16 @@ def get_syntax_tree(file_info: FileInfo) -> Tuple[SyntaxTree, List[Error]]:
     syntax_tree = SyntaxTree(parent=None, origin=parsation.green_cst, offset=0)
     errors = lexation.errors + parsation.errors
     return (syntax_tree, errors)
+
+
+def make_random_edit(
+    rng: random.Random, source_code: str, replacements: List[str]
+) -> TextEdit:
+    """Make an edit which replaces a short random span of `source_code` with one
+    of `replacements`, for testing incremental relexing and reparsing."""
+    start = rng.randint(0, len(source_code))
+    end = rng.randint(start, min(start + 5, len(source_code)))
+    return TextEdit(
+        offset_range=OffsetRange(start=start, end=end),
+        replacement=rng.choice(replacements),
+    )